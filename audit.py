@@ -0,0 +1,141 @@
+from db import get_conn, read_conn, audit_row_hash, AUDIT_HASH_ARGS
+from metrics import timed, rows_processed
+from payroll import now_iso
+
+# Цепочка хешей financial_audit: row_hash каждой строки считается триггером от её полей
+# и row_hash предыдущей строки. Проверка идёт от последней контрольной точки
+# (audit_checkpoints), поэтому перехешируются только строки, добавленные после неё.
+
+def _last_checkpoint(cur):
+    cur.execute("SELECT audit_id, row_hash FROM audit_checkpoints ORDER BY id DESC LIMIT 1")
+    return cur.fetchone()
+
+@timed
+def verify_audit_chain(full=False, batch_size=10000, checkpoint=True):
+    # {"ok", "checked", "from_id", "last_id", "broken": (id записи, причина) | None};
+    # full=True - проверка с первой строки, без контрольных точек
+    cols = ", ".join(AUDIT_HASH_ARGS)
+    with get_conn(readonly=True) as conn:
+        cur = conn.cursor()
+        cur.execute("BEGIN")
+        start = None if full else _last_checkpoint(cur)
+        prev = None
+        from_id = 0
+        broken = None
+        checked = 0
+
+        if start:
+            from_id, start_hash = start
+            # сама точка тоже сверяется: её строка на месте и не изменена
+            cur.execute(f"SELECT prev_hash, row_hash, {cols} FROM financial_audit WHERE id=?", (from_id,))
+            row = cur.fetchone()
+            if row is None:
+                broken = (from_id, "запись контрольной точки удалена")
+            elif row[1] != start_hash or audit_row_hash(row[0], *row[2:]) != start_hash:
+                broken = (from_id, "запись контрольной точки изменена")
+            prev = start_hash
+
+        last_id = from_id
+        if broken is None:
+            cur.execute(f"""
+                SELECT prev_hash, row_hash, {cols}
+                FROM financial_audit
+                WHERE id > ?
+                ORDER BY id
+            """, (from_id,))
+            while broken is None:
+                rows = cur.fetchmany(batch_size)
+                if not rows:
+                    break
+                for prev_hash, row_hash, *fields in rows:
+                    audit_id = fields[0]
+                    if row_hash is None:
+                        broken = (audit_id, "запись без хеша (добавлена в обход цепочки)")
+                    elif prev_hash != prev:
+                        broken = (audit_id, "нарушена связь с предыдущей записью (удаление или вставка)")
+                    elif audit_row_hash(prev_hash, *fields) != row_hash:
+                        broken = (audit_id, "содержимое записи не совпадает с хешем")
+                    if broken:
+                        break
+                    prev = row_hash
+                    last_id = audit_id
+                    checked += 1
+        conn.commit()
+
+    rows_processed("verify_audit_chain", checked)
+    if broken is None and checkpoint and last_id > from_id:
+        with get_conn() as conn:
+            cur = conn.cursor()
+            cur.execute("""
+                INSERT INTO audit_checkpoints(audit_id, row_hash, rows_verified, verified_at)
+                VALUES (?, ?, ?, ?)
+            """, (last_id, prev, checked, now_iso()))
+            conn.commit()
+
+    return {"ok": broken is None, "checked": checked, "from_id": from_id,
+            "last_id": last_id, "broken": broken}
+
+@timed
+def fetch_audit_checkpoints(limit=20):
+    with get_conn() as conn:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT id, audit_id, row_hash, rows_verified, verified_at
+            FROM audit_checkpoints
+            ORDER BY id DESC
+            LIMIT ?
+        """, (limit,))
+        return cur.fetchall()
+
+# -------- queries --------
+# Отбор по типизированным столбцам (allowance_type, amount, date_from, date_to - см. миграцию
+# _m013_audit_structured) идёт условиями SQL по индексам, без разбора details в Python.
+
+AUDIT_COLUMNS = ("id", "action_type", "entity_id", "worker_id", "period_year", "period_month",
+                 "accountant_login", "action_time", "allowance_type", "amount", "date_from", "date_to",
+                 "details")
+
+@timed
+def query_audit(action_type=None, worker_id=None, year=None, month=None, allowance_type=None,
+                min_amount=None, max_amount=None, sick_from=None, sick_to=None, login=None, limit=1000):
+    # строки AUDIT_COLUMNS, новые первыми; sick_from/sick_to - больничные, пересекающие диапазон дат
+    conditions, params = [], []
+    for column, value in (("action_type", action_type), ("worker_id", worker_id),
+                          ("period_year", year), ("period_month", month),
+                          ("allowance_type", allowance_type), ("accountant_login", login)):
+        if value is not None:
+            conditions.append(f"{column} = ?")
+            params.append(value)
+    if min_amount is not None:
+        conditions.append("amount >= ?")
+        params.append(min_amount)
+    if max_amount is not None:
+        conditions.append("amount <= ?")
+        params.append(max_amount)
+    if sick_from is not None:
+        conditions.append("date_to >= ?")
+        params.append(sick_from.isoformat())
+    if sick_to is not None:
+        conditions.append("date_from <= ?")
+        params.append(sick_to.isoformat())
+    if month is not None and not 1 <= month <= 12:
+        raise ValueError("Месяц 1..12.")
+
+    # с фильтром "+id": иначе ради ORDER BY ... LIMIT планировщик идёт по всей таблице в порядке id
+    # вместо индекса фильтра; без фильтра - обратный проход по первичному ключу
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    order = "+id" if conditions else "id"
+    # целые суммы индекс отдаёт как INTEGER
+    columns = ", ".join("CAST(amount AS REAL)" if c == "amount" else c for c in AUDIT_COLUMNS)
+    with read_conn() as conn:
+        cur = conn.cursor()
+        cur.execute(f"""
+            SELECT {columns}
+            FROM financial_audit
+            {where}
+            ORDER BY {order} DESC
+            LIMIT ?
+        """, (*params, limit))
+        rows = cur.fetchall()
+    rows_processed("query_audit", len(rows))
+    return rows
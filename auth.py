@@ -1,5 +1,7 @@
 from db import get_conn
+from metrics import timed
 
+@timed
 def auth_accountant(login, password):
     with get_conn() as conn:
         cur = conn.cursor()
@@ -7,6 +9,7 @@ def auth_accountant(login, password):
         row = cur.fetchone()
         return row[0] if row else None
 
+@timed
 def auth_worker(tab_number, password):
     with get_conn() as conn:
         cur = conn.cursor()
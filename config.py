@@ -1,3 +1,37 @@
-DB_NAME = "payroll_roles.db"
+import os
+
+# PAYROLL_DB - другой файл БД (нагрузочный тест, отдельные стенды)
+DB_NAME = os.environ.get("PAYROLL_DB", "payroll_roles.db")
 TAX_RATE = 0.13
 ALLOWANCE_TYPES = ("Премия", "Стаж", "Квалификация")
+
+# диапазон лет, на который генерируется таблица calendar_days
+CALENDAR_YEARS = (2015, 2035)
+# нерабочие праздничные дни (месяц, день)
+HOLIDAYS = (
+    (1, 1), (1, 2), (1, 3), (1, 4), (1, 5), (1, 6), (1, 7), (1, 8),
+    (2, 23), (3, 8), (5, 1), (5, 9), (6, 12), (11, 4),
+)
+
+# метрики Prometheus: textfile для node_exporter и/или локальный HTTP-эндпоинт /metrics
+METRICS_ENABLED = False
+METRICS_TEXTFILE = None
+METRICS_INTERVAL = 15
+METRICS_PORT = None
+
+# резервные копии и обслуживание БД
+BACKUP_DIR = "backups"
+BACKUP_KEEP = 7
+BACKUP_PAGES = 256
+MAINTENANCE_INTERVAL_HOURS = 24
+
+# период опроса PRAGMA data_version в окне бухгалтера, мс
+CHANGE_POLL_MS = 3000
+
+# реплика БД в памяти для сессии бухгалтера: чтения отчётов из памяти, запись - на диск
+READ_REPLICA = False
+
+# предрасчёт ведомости текущего и следующего месяца: пауза после ввода пользователя (GUI, мс)
+# и период пересчёта в headless-режиме (с)
+PRECOMPUTE_QUIET_MS = 1500
+PRECOMPUTE_INTERVAL = 60
@@ -1,12 +1,200 @@
 import sqlite3
-from config import DB_NAME
+import calendar
+import hashlib
+import os
+import threading
+from datetime import date
+from pathlib import Path
 
-def get_conn():
-    return sqlite3.connect(DB_NAME)
+from config import DB_NAME, CALENDAR_YEARS, HOLIDAYS, TAX_RATE
+
+def audit_row_hash(prev_hash, audit_id, action_type, entity_id, worker_id, year, month,
+                   login, action_time, details):
+    # звено цепочки financial_audit: хеш строки вместе с хешем предыдущей строки
+    fields = (prev_hash or "", audit_id, action_type, entity_id, worker_id, year, month,
+              login, action_time, "" if details is None else details)
+    return hashlib.sha256("\x1f".join(map(str, fields)).encode("utf-8")).hexdigest()
+
+_sql_trace = None
+
+def set_sql_trace(callback):
+    # callback(sql) для каждого оператора на соединениях, открытых после вызова; None - выключить
+    global _sql_trace
+    _sql_trace = callback
+
+def _register_functions(conn):
+    # нужна триггеру trg_financial_audit_chain: без неё запись в аудит невозможна
+    conn.create_function("audit_hash", 10, audit_row_hash, deterministic=True)
+    if _sql_trace is not None:
+        conn.set_trace_callback(_sql_trace)
+    return conn
+
+def get_conn(readonly=False, check_same_thread=True):
+    if readonly:
+        # mode=ro: SQLite сам отклонит любую запись через это соединение
+        return _register_functions(
+            sqlite3.connect(f"{Path(DB_NAME).absolute().as_uri()}?mode=ro", uri=True,
+                            check_same_thread=check_same_thread))
+    if _replica is not None:
+        return _register_functions(sqlite3.connect(DB_NAME, factory=_ReplicatedConnection))
+    return _register_functions(sqlite3.connect(DB_NAME))
+
+def read_conn():
+    # соединение для чтения: реплика в памяти, если она включена, иначе файл БД только на чтение
+    if _replica is None:
+        return get_conn(readonly=True)
+    return _replica.reader()
+
+# -------- read replica --------
+# Копия БД в памяти (shared cache), загружаемая backup API. Запись всегда идёт в файл:
+# изменяющие операторы соединения get_conn() запоминаются и после commit повторяются на реплике
+# в том же вызове. Внешние изменения замечаются по PRAGMA data_version; тогда отпечатки
+# файла и реплики сверяются и при расхождении реплика загружается заново.
+
+_replica = None
+_WRITE_VERBS = ("INSERT", "UPDATE", "DELETE", "REPLACE", "CREATE", "DROP", "ALTER")
+
+class _RecordingCursor(sqlite3.Cursor):
+    def execute(self, sql, parameters=()):
+        result = super().execute(sql, parameters)
+        self.connection._record(sql, (parameters,))
+        return result
+
+    def executemany(self, sql, seq_of_parameters):
+        seq_of_parameters = list(seq_of_parameters)
+        result = super().executemany(sql, seq_of_parameters)
+        self.connection._record(sql, seq_of_parameters)
+        return result
+
+
+class _ReplicatedConnection(sqlite3.Connection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._changes = []
+
+    def cursor(self, factory=_RecordingCursor):
+        return super().cursor(factory)
+
+    # Connection.execute создаёт обычный курсор в обход cursor(), поэтому запись идёт явно
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def _record(self, sql, params):
+        if sql.lstrip()[:7].upper().startswith(_WRITE_VERBS):
+            self._changes.append((sql, params))
+
+    def commit(self):
+        super().commit()
+        changes, self._changes = self._changes, []
+        replica = _replica
+        if changes and replica is not None:
+            replica.apply(changes)
+
+    def rollback(self):
+        super().rollback()
+        self._changes = []
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.rollback()
+        return False
+
+
+_FINGERPRINT_SQL = """
+    SELECT (SELECT group_concat(version) FROM (SELECT version FROM table_versions ORDER BY table_name)),
+           (SELECT MAX(id) FROM financial_audit),
+           (SELECT MAX(rowid) FROM ytd_totals),
+           (SELECT MAX(id) FROM tax_rules),
+           (SELECT MAX(ordinal) FROM calendar_days)
+"""
+
+def data_fingerprint(conn):
+    # меняется при любом изменении данных, от которых зависят расчёты ведомости
+    return conn.execute(_FINGERPRINT_SQL).fetchone()
+
+class _Replica:
+    def __init__(self):
+        self.uri = f"file:payroll_replica_{os.getpid()}?mode=memory&cache=shared"
+        self.lock = threading.RLock()
+        # пока открыто хоть одно соединение, БД в памяти существует; через него же идёт применение записей
+        self.anchor = self.connect()
+        # sync() вызывается из read_conn() любого потока; доступ к watch идёт под self.lock
+        self.watch = get_conn(readonly=True, check_same_thread=False)
+        self.version = None
+        self.loads = 0
+        self.load()
+
+    def connect(self):
+        return _register_functions(sqlite3.connect(self.uri, uri=True, check_same_thread=False))
+
+    def load(self):
+        with self.lock:
+            self.version = self.watch.execute("PRAGMA data_version").fetchone()[0]
+            src = get_conn(readonly=True)
+            try:
+                src.backup(self.anchor)
+            finally:
+                src.close()
+            self.loads += 1
+
+    def sync(self):
+        # True, если реплика загружена заново
+        with self.lock:
+            version = self.watch.execute("PRAGMA data_version").fetchone()[0]
+            if version == self.version:
+                return False
+            self.version = version
+            if data_fingerprint(self.watch) == data_fingerprint(self.anchor):
+                return False
+            self.load()
+            return True
+
+    def apply(self, changes):
+        with self.lock:
+            try:
+                with self.anchor:
+                    for sql, params in changes:
+                        if len(params) == 1:
+                            self.anchor.execute(sql, params[0])
+                        else:
+                            self.anchor.executemany(sql, params)
+            except sqlite3.Error:
+                self.load()
+                return
+            # между commit и повтором мог записать кто-то ещё - это покажет сверка отпечатков
+            self.sync()
+
+    def reader(self):
+        self.sync()
+        return self.connect()
+
+    def close(self):
+        self.watch.close()
+        self.anchor.close()
+
+
+def enable_replica():
+    global _replica
+    if _replica is None:
+        _replica = _Replica()
+    return _replica
+
+def disable_replica():
+    global _replica
+    replica, _replica = _replica, None
+    if replica is not None:
+        replica.close()
 
 def init_db():
     with get_conn() as conn:
         cur = conn.cursor()
+        # действует только для новой (пустой) БД; старые переводятся через maintenance
+        cur.execute("PRAGMA auto_vacuum = INCREMENTAL")
 
         cur.execute("""
         CREATE TABLE IF NOT EXISTS accountants (
@@ -93,4 +281,611 @@ def init_db():
         if cur.fetchone()[0] == 0:
             cur.execute("INSERT INTO accountants(login, password) VALUES(?, ?)", ("admin", "admin"))
 
+        migrate(cur)
+        ensure_calendar(cur)
+
         conn.commit()
+
+# -------- migrations --------
+
+def _m001_calendar_days(cur):
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS calendar_days (
+        ordinal INTEGER PRIMARY KEY,
+        iso_date TEXT NOT NULL UNIQUE,
+        year INTEGER NOT NULL,
+        month INTEGER NOT NULL,
+        day INTEGER NOT NULL,
+        day_of_week INTEGER NOT NULL,
+        days_in_month INTEGER NOT NULL,
+        is_holiday INTEGER NOT NULL DEFAULT 0,
+        is_working_day INTEGER NOT NULL
+    )
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_calendar_days_ym ON calendar_days(year, month, iso_date)")
+
+def _m002_tax_rules(cur):
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS tax_rules (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        effective_from TEXT NOT NULL,
+        kind TEXT NOT NULL CHECK(kind IN ('BRACKET', 'CHILD_DEDUCTION', 'DEDUCTION_LIMIT', 'MARITAL_FACTOR')),
+        threshold REAL NOT NULL DEFAULT 0,
+        value REAL NOT NULL,
+        match_value TEXT
+    )
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_tax_rules_effective ON tax_rules(effective_from)")
+
+    # до 2025 года - прежняя плоская ставка из config.TAX_RATE без вычетов
+    rules = [("2000-01-01", "BRACKET", 0, TAX_RATE, None)]
+    # с 2025 года: прогрессивная шкала и стандартные вычеты на детей (ст. 218, 224 НК РФ)
+    rules += [("2025-01-01", "BRACKET", t, r, None) for t, r in (
+        (0, 0.13), (2_400_000, 0.15), (5_000_000, 0.18), (20_000_000, 0.20), (50_000_000, 0.22))]
+    rules += [("2025-01-01", "CHILD_DEDUCTION", n, a, None) for n, a in ((1, 1400), (2, 2800), (3, 6000))]
+    rules += [
+        ("2025-01-01", "DEDUCTION_LIMIT", 0, 450_000, None),
+        ("2025-01-01", "MARITAL_FACTOR", 0, 2, "Единственный родитель"),
+    ]
+    cur.executemany("""
+        INSERT INTO tax_rules(effective_from, kind, threshold, value, match_value)
+        VALUES (?, ?, ?, ?, ?)
+    """, rules)
+
+def _m003_ytd_totals(cur):
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS ytd_totals (
+        worker_id INTEGER NOT NULL,
+        year INTEGER NOT NULL,
+        month INTEGER NOT NULL,
+        gross REAL NOT NULL,
+        base REAL NOT NULL,
+        tax REAL NOT NULL,
+        ytd_gross REAL NOT NULL,
+        ytd_base REAL NOT NULL,
+        ytd_tax REAL NOT NULL,
+        computed_at TEXT NOT NULL,
+        PRIMARY KEY(worker_id, year, month),
+        FOREIGN KEY(worker_id) REFERENCES workers(id)
+    )
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_ytd_totals_period ON ytd_totals(year, month)")
+
+    # изменение начислений месяца делает недействительными итоги этого и следующих месяцев
+    for table in ("allowances", "sick_leaves"):
+        for event, refs in (("INSERT", ("NEW",)), ("UPDATE", ("OLD", "NEW")), ("DELETE", ("OLD",))):
+            body = "".join(f"""
+                DELETE FROM ytd_totals
+                WHERE worker_id={ref}.worker_id AND year={ref}.period_year AND month>={ref}.period_month;"""
+                for ref in refs)
+            cur.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_{event.lower()}_ytd
+            AFTER {event} ON {table}
+            BEGIN{body}
+            END
+            """)
+
+CLOSED_PERIOD_TABLES = ("allowances", "sick_leaves")
+ROW_EVENTS = (("INSERT", ("NEW",)), ("UPDATE", ("OLD", "NEW")), ("DELETE", ("OLD",)))
+
+def drop_closed_period_triggers(cur):
+    for table in CLOSED_PERIOD_TABLES:
+        for event, _ in ROW_EVENTS:
+            cur.execute(f"DROP TRIGGER IF EXISTS trg_{table}_{event.lower()}_closed")
+
+def create_closed_period_triggers(cur):
+    closed = """
+        SELECT RAISE(ABORT, 'Период закрыт: изменения запрещены.')
+        WHERE EXISTS (SELECT 1 FROM period_closures
+                      WHERE year={ref}.period_year AND month={ref}.period_month AND status='CLOSED');"""
+    drop_closed_period_triggers(cur)
+    for table in CLOSED_PERIOD_TABLES:
+        for event, refs in ROW_EVENTS:
+            body = "".join(closed.format(ref=ref) for ref in refs)
+            cur.execute(f"""
+            CREATE TRIGGER trg_{table}_{event.lower()}_closed
+            BEFORE {event} ON {table}
+            BEGIN{body}
+            END
+            """)
+
+def _m004_period_close(cur):
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS period_closures (
+        year INTEGER NOT NULL,
+        month INTEGER NOT NULL,
+        status TEXT NOT NULL CHECK(status IN ('CLOSED', 'REOPENED')),
+        closed_by TEXT NOT NULL,
+        closed_at TEXT NOT NULL,
+        content_hash TEXT NOT NULL,
+        line_count INTEGER NOT NULL,
+        total_gross REAL NOT NULL,
+        total_tax REAL NOT NULL,
+        total_net REAL NOT NULL,
+        reopened_by TEXT,
+        reopened_at TEXT,
+        reopen_reason TEXT,
+        PRIMARY KEY(year, month),
+        FOREIGN KEY(closed_by) REFERENCES accountants(login),
+        FOREIGN KEY(reopened_by) REFERENCES accountants(login)
+    )
+    """)
+
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS payroll_snapshot_lines (
+        year INTEGER NOT NULL,
+        month INTEGER NOT NULL,
+        line_no INTEGER NOT NULL,
+        worker_id INTEGER NOT NULL,
+        tab_number TEXT NOT NULL,
+        full_name TEXT NOT NULL,
+        position TEXT NOT NULL,
+        sick_days INTEGER NOT NULL,
+        base REAL NOT NULL,
+        allowances REAL NOT NULL,
+        gross REAL NOT NULL,
+        tax REAL NOT NULL,
+        net REAL NOT NULL,
+        PRIMARY KEY(year, month, line_no),
+        FOREIGN KEY(worker_id) REFERENCES workers(id)
+    )
+    """)
+    cur.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_snapshot_lines_worker
+        ON payroll_snapshot_lines(worker_id, year, month)
+    """)
+
+    create_closed_period_triggers(cur)
+
+    # снимок закрытого периода неизменяем
+    cur.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_snapshot_lines_update
+    BEFORE UPDATE ON payroll_snapshot_lines
+    BEGIN
+        SELECT RAISE(ABORT, 'Снимок ведомости неизменяем.');
+    END
+    """)
+    cur.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_snapshot_lines_delete
+    BEFORE DELETE ON payroll_snapshot_lines
+    WHEN EXISTS (SELECT 1 FROM period_closures
+                 WHERE year=OLD.year AND month=OLD.month AND status='CLOSED')
+    BEGIN
+        SELECT RAISE(ABORT, 'Снимок ведомости неизменяем.');
+    END
+    """)
+    cur.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_period_closures_update
+    BEFORE UPDATE ON period_closures
+    WHEN OLD.status='CLOSED' AND NEW.status='CLOSED'
+    BEGIN
+        SELECT RAISE(ABORT, 'Снимок ведомости неизменяем.');
+    END
+    """)
+    cur.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_period_closures_delete
+    BEFORE DELETE ON period_closures
+    WHEN OLD.status='CLOSED'
+    BEGIN
+        SELECT RAISE(ABORT, 'Снимок ведомости неизменяем.');
+    END
+    """)
+
+def _m005_request_history(cur):
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS idx_requests_worker
+        ON personal_change_requests(worker_id, request_date)
+    """)
+
+def _m006_maintenance_log(cur):
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS maintenance_log (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        kind TEXT NOT NULL,
+        started_at TEXT NOT NULL,
+        seconds REAL NOT NULL,
+        bytes_before INTEGER,
+        bytes_after INTEGER,
+        details TEXT
+    )
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_maintenance_log_kind ON maintenance_log(kind, started_at)")
+
+# столбцы, попадающие в outbox; пароль работника наружу не отдаём. Триггеры берут из списка только
+# уже существующие столбцы: миграция, добавляющая столбец, пересоздаёт триггеры своей таблицы
+OUTBOX_COLUMNS = {
+    "workers": ("id", "tab_number", "full_name", "position", "salary", "marital_status", "children_count"),
+    "sick_leaves": ("id", "worker_id", "date_start", "date_end", "period_year", "period_month",
+                    "days", "leave_id", "created_by_accountant", "created_at"),
+    "allowances": ("id", "worker_id", "allowance_type", "amount", "period_year", "period_month",
+                   "created_by_accountant", "created_at", "recurring_id"),
+    "personal_change_requests": ("id", "worker_id", "field_name", "new_value", "request_date",
+                                 "status", "processed_by", "processed_at"),
+}
+
+def create_outbox_triggers(cur, table):
+    existing = {row[1] for row in cur.execute(f"PRAGMA table_info({table})").fetchall()}
+    cols = [c for c in OUTBOX_COLUMNS[table] if c in existing]
+    for event, op, ref in (("INSERT", "I", "NEW"), ("UPDATE", "U", "NEW"), ("DELETE", "D", "OLD")):
+        if op == "D":
+            payload = f"json_object('id', OLD.id)"
+        else:
+            payload = "json_object(" + ", ".join(f"'{c}', NEW.{c}" for c in cols) + ")"
+        cur.execute(f"DROP TRIGGER IF EXISTS trg_{table}_{event.lower()}_outbox")
+        cur.execute(f"""
+        CREATE TRIGGER trg_{table}_{event.lower()}_outbox
+        AFTER {event} ON {table}
+        BEGIN
+            INSERT INTO outbox(table_name, op, row_id, payload)
+            VALUES ('{table}', '{op}', {ref}.id, {payload});
+        END
+        """)
+
+def _m007_outbox(cur):
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS outbox (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        table_name TEXT NOT NULL,
+        op TEXT NOT NULL CHECK(op IN ('I', 'U', 'D')),
+        row_id INTEGER NOT NULL,
+        payload TEXT NOT NULL,
+        changed_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%S', 'now', 'localtime'))
+    )
+    """)
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS outbox_consumers (
+        name TEXT PRIMARY KEY,
+        last_seq INTEGER NOT NULL DEFAULT 0,
+        updated_at TEXT
+    )
+    """)
+    for table in OUTBOX_COLUMNS:
+        create_outbox_triggers(cur, table)
+
+VERSIONED_TABLES = ("workers", "sick_leaves", "allowances", "personal_change_requests", "period_closures")
+
+def _m008_table_versions(cur):
+    # счётчики изменений по таблицам: опрос окна бухгалтера читает их только после смены data_version
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS table_versions (
+        table_name TEXT PRIMARY KEY,
+        version INTEGER NOT NULL DEFAULT 0
+    )
+    """)
+    for table in VERSIONED_TABLES:
+        create_version_triggers(cur, table)
+
+def create_version_triggers(cur, table):
+    cur.execute("INSERT OR IGNORE INTO table_versions(table_name) VALUES (?)", (table,))
+    for event in ("INSERT", "UPDATE", "DELETE"):
+        cur.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_{table}_{event.lower()}_version
+        AFTER {event} ON {table}
+        BEGIN
+            UPDATE table_versions SET version = version + 1 WHERE table_name = '{table}';
+        END
+        """)
+
+def sick_leave_segments(cur, d_start, d_end):
+    # [(год, месяц, начало, конец, дней)] - больничный, разрезанный по календарным месяцам
+    years = (int(d_start[:4]), int(d_end[:4]))
+    ensure_calendar(cur, *years)
+    cur.execute("""
+        SELECT year, month, MIN(iso_date), MAX(iso_date), COUNT(*)
+        FROM calendar_days
+        WHERE iso_date BETWEEN ? AND ?
+        GROUP BY year, month
+        ORDER BY year, month
+    """, (d_start, d_end))
+    return cur.fetchall()
+
+def _m009_sick_leave_segments(cur):
+    # outbox-триггеры sick_leaves из _m007 ещё без days и leave_id; после ALTER TABLE
+    # они создаются заново ниже
+    cur.execute("ALTER TABLE sick_leaves ADD COLUMN days INTEGER NOT NULL DEFAULT 0")
+    cur.execute("ALTER TABLE sick_leaves ADD COLUMN leave_id INTEGER")
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS idx_sick_leaves_period
+        ON sick_leaves(period_year, period_month, worker_id, days)
+    """)
+
+    # существующие записи режем по месяцам; снимки закрытых периодов уже заморожены,
+    # поэтому запрет изменений закрытых периодов на время миграции снимается
+    drop_closed_period_triggers(cur)
+    cur.execute("""
+        SELECT id, worker_id, date_start, date_end, created_by_accountant, created_at
+        FROM sick_leaves ORDER BY id
+    """)
+    for sick_id, worker_id, ds, de, created_by, created_at in cur.fetchall():
+        segments = sick_leave_segments(cur, ds, de)
+        if not segments:
+            continue
+        (y, m, s1, s2, days), rest = segments[0], segments[1:]
+        cur.execute("""
+            UPDATE sick_leaves
+            SET date_start=?, date_end=?, period_year=?, period_month=?, days=?, leave_id=?
+            WHERE id=?
+        """, (s1, s2, y, m, days, sick_id, sick_id))
+        cur.executemany("""
+            INSERT INTO sick_leaves(worker_id, date_start, date_end, period_year, period_month,
+                                    days, leave_id, created_by_accountant, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, [(worker_id, s1, s2, y, m, days, sick_id, created_by, created_at)
+              for y, m, s1, s2, days in rest])
+    create_closed_period_triggers(cur)
+    create_outbox_triggers(cur, "sick_leaves")
+
+AUDIT_HASH_ARGS = ("id", "action_type", "entity_id", "worker_id", "period_year", "period_month",
+                   "accountant_login", "action_time", "details")
+
+def _m010_audit_chain(cur):
+    cur.execute("ALTER TABLE financial_audit ADD COLUMN prev_hash TEXT")
+    cur.execute("ALTER TABLE financial_audit ADD COLUMN row_hash TEXT")
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS audit_checkpoints (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        audit_id INTEGER NOT NULL,
+        row_hash TEXT NOT NULL,
+        rows_verified INTEGER NOT NULL,
+        verified_at TEXT NOT NULL
+    )
+    """)
+
+    # существующие строки сцепляются по порядку id
+    prev = None
+    cur.execute(f"SELECT {', '.join(AUDIT_HASH_ARGS)} FROM financial_audit ORDER BY id")
+    chained = []
+    for row in cur.fetchall():
+        prev_hash, prev = prev, audit_row_hash(prev, *row)
+        chained.append((prev_hash, prev, row[0]))
+    cur.executemany("UPDATE financial_audit SET prev_hash=?, row_hash=? WHERE id=?", chained)
+
+    # каждая новая строка, любым путём записи (в т.ч. INSERT ... SELECT), получает звено цепочки
+    args = ", ".join(f"NEW.{c}" for c in AUDIT_HASH_ARGS)
+    cur.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS trg_financial_audit_chain
+    AFTER INSERT ON financial_audit
+    BEGIN
+        UPDATE financial_audit
+        SET prev_hash = (SELECT row_hash FROM financial_audit WHERE id < NEW.id ORDER BY id DESC LIMIT 1),
+            row_hash = audit_hash(
+                (SELECT row_hash FROM financial_audit WHERE id < NEW.id ORDER BY id DESC LIMIT 1), {args})
+        WHERE id = NEW.id;
+    END
+    """)
+    cur.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_financial_audit_update
+    BEFORE UPDATE ON financial_audit
+    WHEN OLD.row_hash IS NOT NULL
+    BEGIN
+        SELECT RAISE(ABORT, 'Журнал аудита неизменяем.');
+    END
+    """)
+    cur.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_financial_audit_delete
+    BEFORE DELETE ON financial_audit
+    BEGIN
+        SELECT RAISE(ABORT, 'Журнал аудита неизменяем.');
+    END
+    """)
+
+def _m011_allowances_period_index(cur):
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS idx_allowances_period
+        ON allowances(period_year, period_month, worker_id, amount)
+    """)
+
+def _m012_recurring_allowances(cur):
+    # постоянная надбавка работнику (worker_id) или всей должности (position) на диапазон дат;
+    # valid_to - последний день действия включительно, NULL - бессрочно
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS recurring_allowances (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        worker_id INTEGER,
+        position TEXT,
+        allowance_type TEXT NOT NULL,
+        amount REAL NOT NULL CHECK(amount >= 0),
+        valid_from TEXT NOT NULL,
+        valid_to TEXT,
+        created_by_accountant TEXT NOT NULL,
+        created_at TEXT NOT NULL,
+        CHECK((worker_id IS NULL) <> (position IS NULL)),
+        CHECK(valid_to IS NULL OR valid_to >= valid_from),
+        FOREIGN KEY(worker_id) REFERENCES workers(id),
+        FOREIGN KEY(created_by_accountant) REFERENCES accountants(login)
+    )
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_recurring_worker ON recurring_allowances(worker_id, allowance_type)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_recurring_position ON recurring_allowances(position, allowance_type)")
+
+    # из какого шаблона начислена надбавка; не больше одной строки на шаблон, период и работника
+    cur.execute("ALTER TABLE allowances ADD COLUMN recurring_id INTEGER")
+    cur.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_allowances_recurring
+        ON allowances(recurring_id, period_year, period_month, worker_id)
+        WHERE recurring_id IS NOT NULL
+    """)
+    create_outbox_triggers(cur, "allowances")
+
+def _m013_audit_structured(cur):
+    # типизированные поля аудита - виртуальные столбцы, вычисляемые из details:
+    # ADD_ALLOW пишет "<тип>: <сумма>", ADD_SICK - "<начало>..<конец>" (даты ISO).
+    # Хешированные строки не переписываются, а значения по-прежнему покрыты цепочкой хешей;
+    # для старых строк значения попадают в индексы при их построении
+    for column, decl in (
+        ("allowance_type", "TEXT GENERATED ALWAYS AS (CASE WHEN action_type = 'ADD_ALLOW' "
+                           "THEN substr(details, 1, instr(details, ': ') - 1) END) VIRTUAL"),
+        ("amount", "REAL GENERATED ALWAYS AS (CASE WHEN action_type = 'ADD_ALLOW' "
+                   "THEN CAST(substr(details, instr(details, ': ') + 2) AS REAL) END) VIRTUAL"),
+        ("date_from", "TEXT GENERATED ALWAYS AS (CASE WHEN action_type = 'ADD_SICK' "
+                      "THEN substr(details, 1, instr(details, '..') - 1) END) VIRTUAL"),
+        ("date_to", "TEXT GENERATED ALWAYS AS (CASE WHEN action_type = 'ADD_SICK' "
+                    "THEN substr(details, instr(details, '..') + 2) END) VIRTUAL"),
+    ):
+        cur.execute(f"ALTER TABLE financial_audit ADD COLUMN {column} {decl}")
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS idx_audit_allowance
+        ON financial_audit(allowance_type, period_year, amount)
+        WHERE allowance_type IS NOT NULL
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_audit_amount ON financial_audit(amount) WHERE amount IS NOT NULL")
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS idx_audit_sick_dates
+        ON financial_audit(date_from, date_to)
+        WHERE date_from IS NOT NULL
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_audit_worker ON financial_audit(worker_id, period_year, period_month)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_audit_period ON financial_audit(period_year, period_month, action_type)")
+
+def _m014_ytd_invalidation(cur):
+    # правило налога действует с effective_from: итоги этого и следующих месяцев недействительны
+    for event, refs in ROW_EVENTS:
+        body = "".join(f"""
+            DELETE FROM ytd_totals
+            WHERE (year, month) >= (CAST(substr({ref}.effective_from, 1, 4) AS INTEGER),
+                                    CAST(substr({ref}.effective_from, 6, 2) AS INTEGER));"""
+            for ref in refs)
+        cur.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_tax_rules_{event.lower()}_ytd
+        AFTER {event} ON tax_rules
+        BEGIN{body}
+        END
+        """)
+    # карточка работника не версионируется: любой месяц пересчитывается по текущим данным,
+    # поэтому сбрасываются все сохраненные итоги работника
+    cur.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_workers_update_ytd
+    AFTER UPDATE OF salary, marital_status, children_count ON workers
+    WHEN OLD.salary IS NOT NEW.salary
+      OR OLD.marital_status IS NOT NEW.marital_status
+      OR OLD.children_count IS NOT NEW.children_count
+    BEGIN
+        DELETE FROM ytd_totals WHERE worker_id = NEW.id;
+    END
+    """)
+
+def _m015_snapshot_insert_guard(cur):
+    # close_period пишет строки до перевода периода в CLOSED, так что запрет их не задевает
+    cur.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_snapshot_lines_insert
+    BEFORE INSERT ON payroll_snapshot_lines
+    WHEN EXISTS (SELECT 1 FROM period_closures
+                 WHERE year=NEW.year AND month=NEW.month AND status='CLOSED')
+    BEGIN
+        SELECT RAISE(ABORT, 'Снимок ведомости неизменяем.');
+    END
+    """)
+
+def _m016_snapshot_archive(cur):
+    # снимки, снятые повторным открытием периода; revision - номер снятого закрытия периода,
+    # closed_at и content_hash - его данные (хеш совпадает с записанным в аудит REOPEN_PERIOD)
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS payroll_snapshot_archive (
+        year INTEGER NOT NULL,
+        month INTEGER NOT NULL,
+        revision INTEGER NOT NULL,
+        closed_at TEXT NOT NULL,
+        line_no INTEGER NOT NULL,
+        worker_id INTEGER NOT NULL,
+        tab_number TEXT NOT NULL,
+        full_name TEXT NOT NULL,
+        position TEXT NOT NULL,
+        sick_days INTEGER NOT NULL,
+        base REAL NOT NULL,
+        allowances REAL NOT NULL,
+        gross REAL NOT NULL,
+        tax REAL NOT NULL,
+        net REAL NOT NULL,
+        content_hash TEXT NOT NULL,
+        archived_at TEXT NOT NULL,
+        PRIMARY KEY(year, month, revision, line_no),
+        FOREIGN KEY(worker_id) REFERENCES workers(id)
+    )
+    """)
+    for event in ("UPDATE", "DELETE"):
+        cur.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_snapshot_archive_{event.lower()}
+        BEFORE {event} ON payroll_snapshot_archive
+        BEGIN
+            SELECT RAISE(ABORT, 'Снимок ведомости неизменяем.');
+        END
+        """)
+
+def _m017_recurring_versions(cur):
+    # шаблоны надбавок меняются и закрываются (UPDATE valid_to): счётчик попадает в отпечаток данных
+    create_version_triggers(cur, "recurring_allowances")
+
+# порядок важен: номер миграции = позиция в списке (PRAGMA user_version)
+MIGRATIONS = [
+    _m001_calendar_days,
+    _m002_tax_rules,
+    _m003_ytd_totals,
+    _m004_period_close,
+    _m005_request_history,
+    _m006_maintenance_log,
+    _m007_outbox,
+    _m008_table_versions,
+    _m009_sick_leave_segments,
+    _m010_audit_chain,
+    _m011_allowances_period_index,
+    _m012_recurring_allowances,
+    _m013_audit_structured,
+    _m014_ytd_invalidation,
+    _m015_snapshot_insert_guard,
+    _m016_snapshot_archive,
+    _m017_recurring_versions,
+]
+
+def migrate(cur):
+    version = cur.execute("PRAGMA user_version").fetchone()[0]
+    for target, step in enumerate(MIGRATIONS, start=1):
+        if version < target:
+            step(cur)
+            cur.execute(f"PRAGMA user_version = {target}")
+
+# -------- calendar --------
+
+def fill_calendar(cur, first_year, last_year):
+    holidays = set(HOLIDAYS)
+    rows = []
+    for year in range(first_year, last_year + 1):
+        for month in range(1, 13):
+            days = calendar.monthrange(year, month)[1]
+            for day in range(1, days + 1):
+                d = date(year, month, day)
+                dow = d.weekday()
+                holiday = (month, day) in holidays
+                rows.append((d.toordinal(), d.isoformat(), year, month, day, dow, days,
+                             int(holiday), int(dow < 5 and not holiday)))
+    cur.executemany("""
+        INSERT OR IGNORE INTO calendar_days(ordinal, iso_date, year, month, day, day_of_week,
+                                            days_in_month, is_holiday, is_working_day)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, rows)
+
+def ensure_calendar(cur, *years):
+    # без аргументов: CALENDAR_YEARS плюс все даты больничных (init_db);
+    # с аргументами: дозаполнить только недостающие годы (путь записи)
+    if years:
+        first, last = min(years), max(years)
+        cur.execute("SELECT COUNT(DISTINCT year) FROM calendar_days WHERE year BETWEEN ? AND ?",
+                    (first, last))
+        if cur.fetchone()[0] == last - first + 1:
+            return
+        fill_calendar(cur, first, last)
+        return
+
+    first, last = CALENDAR_YEARS
+    cur.execute("SELECT MIN(substr(date_start, 1, 4)), MAX(substr(date_end, 1, 4)) FROM sick_leaves")
+    lo, hi = cur.fetchone()
+    if lo is not None:
+        first = min(first, int(lo))
+        last = max(last, int(hi))
+
+    cur.execute("SELECT MIN(year), MAX(year), COUNT(*) FROM calendar_days")
+    have_first, have_last, n = cur.fetchone()
+    if n and have_first <= first and have_last >= last:
+        expected = date(have_last, 12, 31).toordinal() - date(have_first, 1, 1).toordinal() + 1
+        if n == expected:
+            return
+    fill_calendar(cur, first, last)
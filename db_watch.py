@@ -0,0 +1,28 @@
+from db import get_conn
+
+# Дешёвое обнаружение изменений: PRAGMA data_version на постоянном соединении меняется
+# только после коммитов других соединений; лишь тогда читаем счётчики table_versions.
+
+class ChangeWatcher:
+    def __init__(self):
+        self.conn = get_conn(readonly=True)
+        self.data_version = None
+        self.versions = {}
+        self.poll()
+
+    def poll(self):
+        # множество таблиц, изменившихся с прошлого опроса
+        cur = self.conn.cursor()
+        data_version = cur.execute("PRAGMA data_version").fetchone()[0]
+        if data_version == self.data_version:
+            return set()
+        self.data_version = data_version
+
+        cur.execute("SELECT table_name, version FROM table_versions")
+        versions = dict(cur.fetchall())
+        changed = {t for t, v in versions.items() if self.versions.get(t) != v}
+        self.versions = versions
+        return changed
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,84 @@
+import csv
+import os
+
+from metrics import timed
+from payroll import period_summary, range_report, period_diff, diff_percent, DIFF_COLUMNS, DIFF_STATUS
+
+# Потоковая выгрузка отчётов в CSV: строки пишутся по мере генерации, без сборки
+# всего файла в памяти. Разделитель ";" и BOM - чтобы Excel с русской локалью открыл файл как есть.
+# Файл пишется во временный .part и подменяется целиком только после успешной записи.
+
+LINE_HEADER = ("Таб. №", "Ф.И.О.", "Должность", "Бол. дни", "База", "Надбавки",
+               "Начислено", "НДФЛ", "К выдаче")
+
+def _money(values):
+    return [f"{v:.2f}" for v in values]
+
+def write_csv(path, header, rows):
+    tmp = f"{path}.part"
+    count = 0
+    try:
+        with open(tmp, "w", encoding="utf-8-sig", newline="") as f:
+            writer = csv.writer(f, delimiter=";")
+            writer.writerow(header)
+            for row in rows:
+                writer.writerow(row)
+                count += 1
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    return count
+
+DIFF_LABELS = ("Бол. дни", "База", "Надбавки", "Начислено", "НДФЛ", "К выдаче")
+DIFF_HEADER = ("Таб. №", "Ф.И.О.", "Должность", "Статус",
+               *(f"{label} {part}" for label in DIFF_LABELS for part in ("было", "стало", "разница")),
+               "К выдаче, %")
+
+def period_report_rows(summary):
+    for _, tab, name, pos, sick, *amounts in summary["lines"]:
+        yield (tab, name, pos, sick, *_money(amounts))
+    for pos, count, sick, *amounts in summary["groups"]:
+        yield ("", f"Итого: {pos} ({count})", pos, sick, *_money(amounts))
+    yield ("", "Итого", "", "", "", "", *_money(summary["totals"]))
+
+def range_report_rows(report):
+    for _, year, month, tab, name, pos, sick, *amounts in report["lines"]:
+        yield (f"{year}-{month:02d}", tab, name, pos, sick, *_money(amounts))
+    for _, tab, name, pos, sick, *amounts in report["workers"]:
+        yield ("Итого", tab, name, pos, sick, *_money(amounts))
+    sick, *amounts = report["totals"]
+    yield ("Итого", "", "Всего", "", sick, *_money(amounts))
+
+@timed
+def export_period_report(year, month, path):
+    return write_csv(path, LINE_HEADER, period_report_rows(period_summary(year, month)))
+
+@timed
+def export_range_report(year_from, month_from, year_to, month_to, path):
+    report = range_report(year_from, month_from, year_to, month_to)
+    return write_csv(path, ("Период", *LINE_HEADER), range_report_rows(report))
+
+def period_diff_rows(diff, include_same=False):
+    # сначала новые и выбывшие, затем изменённые по убыванию модуля изменения суммы к выдаче
+    order = {"new": 0, "gone": 1, "changed": 2, "same": 3}
+    net = DIFF_COLUMNS.index("net")
+    rows = sorted((r for r in diff["rows"] if include_same or r[4] != "same"),
+                  key=lambda r: (order[r[4]], -abs(r[7][net])))
+    for row in rows:
+        _, tab, name, pos, status, prev, after, delta = row
+        cells = []
+        for i in range(len(DIFF_COLUMNS)):
+            values = ("" if prev is None else prev[i], "" if after is None else after[i], delta[i])
+            cells.extend(values if i == 0 else ("" if v == "" else f"{v:.2f}" for v in values))
+        pct = diff_percent(row, net)
+        yield (tab, name, pos, DIFF_STATUS[status], *cells, "" if pct is None else f"{pct:.2f}")
+    before, after, delta = diff["totals"]
+    cells = [f"{v:.2f}" for values in zip(before, after, delta) for v in values]
+    yield ("", "Итого", "", "", *[""] * 9, *cells, "")
+
+@timed
+def export_period_diff(year_from, month_from, year_to, month_to, path, include_same=False):
+    diff = period_diff(year_from, month_from, year_to, month_to)
+    return write_csv(path, DIFF_HEADER, period_diff_rows(diff, include_same))
@@ -0,0 +1,232 @@
+import multiprocessing
+import os
+import random
+import shutil
+import sqlite3
+import tempfile
+import time
+from datetime import date
+
+# Нагрузочный тест общего файла БД: N процессов одновременно выполняют смесь операций
+# (вход работника, запрос на изменение данных, надбавка, одобрение запроса, полная ведомость)
+# на синтетической БД - отдельно для rollback journal (DELETE) и WAL.
+# Каждый процесс - как отдельный бухгалтер или работник: свои соединения через db.get_conn,
+# commit на каждый вызов. Файл БД передаётся процессам через PAYROLL_DB: переменная
+# выставляется до запуска (spawn), т.к. config читает её при первом импорте.
+
+JOURNAL_MODES = ("delete", "wal")
+
+DEFAULT_MIX = {
+    "auth_worker": 40,
+    "create_personal_request": 25,
+    "add_allowance": 20,
+    "approve_request": 10,
+    "report": 5,
+}
+
+POSITIONS = ("Бухгалтер", "Инженер", "Техник", "Менеджер")
+
+def _is_lock_error(exc):
+    text = str(exc).lower()
+    return "locked" in text or "busy" in text
+
+# -------- synthetic database --------
+
+def seed_database(workers, journal_mode=None, history_months=0, closed_months=1):
+    # БД по текущему db.DB_NAME: workers работников; history_months > 0 - ещё надбавки,
+    # больничные и запросы за последние месяцы, closed_months самых ранних из них закрыты
+    from db import init_db, get_conn
+    from payroll import save_financial_batch, close_period, now_iso
+    init_db()
+    rnd = random.Random(1)
+    with get_conn() as conn:
+        cur = conn.cursor()
+        cur.executemany("""
+            INSERT INTO workers(tab_number, full_name, position, salary, marital_status, children_count, password)
+            VALUES (?, ?, ?, ?, ?, ?, '1234')
+        """, [(f"T{i:06d}", f"Работник {i}", POSITIONS[i % len(POSITIONS)],
+               float(rnd.randrange(30_000, 200_000, 500)), "Женат" if i % 3 else "Холост", i % 4)
+              for i in range(workers)])
+        cur.executemany("""
+            INSERT INTO personal_change_requests(worker_id, field_name, new_value, request_date)
+            VALUES (?, 'children_count', ?, ?)
+        """, [(wid, str(rnd.randrange(5)), now_iso())
+              for wid in range(1, workers + 1) if history_months and wid % 20 == 0])
+        conn.commit()
+        if journal_mode:
+            cur.execute(f"PRAGMA journal_mode = {journal_mode}")
+
+    today = date.today()
+    periods = []
+    for back in range(history_months, 0, -1):
+        y, m = divmod(today.year * 12 + today.month - 1 - back, 12)
+        periods.append((y, m + 1))
+    for y, m in periods:
+        allowances = [(wid, "Премия", float(rnd.randrange(1000, 20_000)))
+                      for wid in range(1, workers + 1) if rnd.random() < 0.5]
+        sick = []
+        for wid in range(1, workers + 1):
+            if rnd.random() < 0.1:
+                start = date(y, m, rnd.randrange(1, 25))
+                sick.append((wid, start, date.fromordinal(start.toordinal() + rnd.randrange(1, 10))))
+        save_financial_batch(y, m, allowances, sick, "admin")
+    for y, m in periods[:closed_months]:
+        close_period(y, m, "admin")
+
+def _seed(workers, journal_mode):
+    seed_database(workers, journal_mode)
+
+# -------- worker process --------
+
+def _run_ops(mix, duration, seed, workers, barrier, results):
+    from auth import auth_worker
+    from db import read_conn
+    from payroll import create_personal_request, add_allowance, approve_request, period_summary
+
+    rnd = random.Random(seed)
+    today = date.today()
+
+    def pending_request():
+        with read_conn() as conn:
+            row = conn.execute("""
+                SELECT id FROM personal_change_requests WHERE status='PENDING'
+                ORDER BY id LIMIT 1 OFFSET ?
+            """, (rnd.randrange(20),)).fetchone()
+        return row[0] if row else None
+
+    def op_auth_worker():
+        auth_worker(f"T{rnd.randrange(workers):06d}", "1234")
+
+    def op_create_personal_request():
+        create_personal_request(rnd.randrange(1, workers + 1), "children_count", rnd.randrange(5))
+
+    def op_add_allowance():
+        add_allowance(rnd.randrange(1, workers + 1), "Премия", float(rnd.randrange(1000, 50_000)),
+                      today.year, today.month, "admin")
+
+    def op_approve_request():
+        rid = pending_request()
+        if rid is None:
+            return False
+        try:
+            approve_request(rid, "admin")
+        except ValueError:
+            # другой процесс успел обработать этот же запрос
+            return False
+
+    def op_report():
+        period_summary(today.year, today.month)
+
+    ops = {
+        "auth_worker": op_auth_worker,
+        "create_personal_request": op_create_personal_request,
+        "add_allowance": op_add_allowance,
+        "approve_request": op_approve_request,
+        "report": op_report,
+    }
+    names = list(mix)
+    weights = [mix[n] for n in names]
+    stats = {name: {"latencies": [], "lock_errors": 0, "errors": 0, "skipped": 0} for name in names}
+
+    barrier.wait()
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        name = rnd.choices(names, weights)[0]
+        s = stats[name]
+        started = time.perf_counter()
+        try:
+            if ops[name]() is False:
+                s["skipped"] += 1
+                continue
+        except sqlite3.OperationalError as e:
+            s["lock_errors" if _is_lock_error(e) else "errors"] += 1
+            continue
+        except Exception:
+            s["errors"] += 1
+            continue
+        s["latencies"].append(time.perf_counter() - started)
+    results.put(stats)
+
+# -------- driver --------
+
+def _percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+def run_load_test(processes=8, duration=10.0, workers=2000, journal_modes=JOURNAL_MODES,
+                  mix=None, work_dir=None):
+    # {режим: {операция: {"ok", "per_sec", "p50_ms", "p99_ms", "lock_errors", "errors", "skipped"}}}
+    mix = dict(mix or DEFAULT_MIX)
+    unknown = set(mix) - set(DEFAULT_MIX)
+    if unknown:
+        raise ValueError(f"Неизвестные операции: {', '.join(sorted(unknown))}")
+
+    bad_modes = set(journal_modes) - {"delete", "truncate", "persist", "wal"}
+    if bad_modes:
+        raise ValueError(f"Неизвестный режим журнала: {', '.join(sorted(bad_modes))}")
+
+    ctx = multiprocessing.get_context("spawn")
+    tmp = work_dir or tempfile.mkdtemp(prefix="payroll_load_")
+    saved_db = os.environ.get("PAYROLL_DB")
+    report = {}
+    try:
+        for mode in journal_modes:
+            path = os.path.join(tmp, f"load_{mode}.db")
+            for suffix in ("", "-wal", "-shm", "-journal"):
+                if os.path.exists(path + suffix):
+                    os.remove(path + suffix)
+            os.environ["PAYROLL_DB"] = path
+            seeder = ctx.Process(target=_seed, args=(workers, mode))
+            seeder.start()
+            seeder.join()
+            if seeder.exitcode:
+                raise RuntimeError(f"Не удалось подготовить БД ({mode}).")
+
+            barrier = ctx.Barrier(processes)
+            results = ctx.Queue()
+            procs = [ctx.Process(target=_run_ops,
+                                 args=(mix, duration, 1000 + i, workers, barrier, results))
+                     for i in range(processes)]
+            for p in procs:
+                p.start()
+            collected = [results.get() for _ in procs]
+            for p in procs:
+                p.join()
+
+            mode_report = {}
+            for name in mix:
+                latencies = sorted(l for stats in collected for l in stats[name]["latencies"])
+                mode_report[name] = {
+                    "ok": len(latencies),
+                    "per_sec": len(latencies) / duration,
+                    "p50_ms": _percentile(latencies, 0.50) * 1000,
+                    "p99_ms": _percentile(latencies, 0.99) * 1000,
+                    "lock_errors": sum(stats[name]["lock_errors"] for stats in collected),
+                    "errors": sum(stats[name]["errors"] for stats in collected),
+                    "skipped": sum(stats[name]["skipped"] for stats in collected),
+                }
+            report[mode] = mode_report
+    finally:
+        if saved_db is None:
+            os.environ.pop("PAYROLL_DB", None)
+        else:
+            os.environ["PAYROLL_DB"] = saved_db
+        if work_dir is None:
+            shutil.rmtree(tmp, ignore_errors=True)
+    return report
+
+def format_report(report):
+    lines = []
+    for mode, ops in report.items():
+        lines.append(f"journal_mode={mode}")
+        lines.append(f"  {'операция':<26}{'успешно':>9}{'в сек':>9}{'p50, мс':>10}{'p99, мс':>10}"
+                     f"{'блокировки':>12}{'ошибки':>8}")
+        total_ok = total_locks = 0
+        for name, r in ops.items():
+            lines.append(f"  {name:<26}{r['ok']:>9}{r['per_sec']:>9.1f}{r['p50_ms']:>10.1f}{r['p99_ms']:>10.1f}"
+                         f"{r['lock_errors']:>12}{r['errors']:>8}")
+            total_ok += r["ok"]
+            total_locks += r["lock_errors"]
+        lines.append(f"  всего успешно: {total_ok}, ошибок блокировки: {total_locks}")
+    return "\n".join(lines)
@@ -1,8 +1,244 @@
+import argparse
+import threading
+
+from config import METRICS_TEXTFILE, METRICS_INTERVAL, METRICS_PORT
 from db import init_db
-from ui_role import RoleChoice
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Расчёт заработной платы")
+    parser.add_argument("--metrics-file", default=METRICS_TEXTFILE,
+                        help="периодически записывать метрики Prometheus в этот файл")
+    parser.add_argument("--metrics-port", type=int, default=METRICS_PORT,
+                        help="отдавать метрики на http://127.0.0.1:PORT/metrics")
+    parser.add_argument("--replica", action="store_true",
+                        help="чтения из копии БД в памяти (загружается при входе бухгалтера)")
+    sub = parser.add_subparsers(dest="command")
+
+    p = sub.add_parser("ytd-finalize", help="зафиксировать итоги месяца в ytd_totals")
+    p.add_argument("year", type=int)
+    p.add_argument("month", type=int)
+
+    p = sub.add_parser("ytd-rebuild", help="пересобрать ytd_totals за год полным пересчётом")
+    p.add_argument("year", type=int)
+    p.add_argument("--through", type=int, help="последний месяц (по умолчанию - последний закрытый)")
+
+    p = sub.add_parser("ytd-check", help="сверить ytd_totals с полным пересчётом года")
+    p.add_argument("year", type=int)
+
+    sub.add_parser("backup", help="онлайн-копия БД с ротацией")
+
+    p = sub.add_parser("maintain", help="ANALYZE, PRAGMA optimize, incremental vacuum (+ копия)")
+    p.add_argument("--no-backup", action="store_true", help="без резервной копии")
+    p.add_argument("--convert-auto-vacuum", action="store_true",
+                   help="однократно перевести БД в auto_vacuum=INCREMENTAL (полный VACUUM)")
+
+    p = sub.add_parser("serve-metrics", help="headless-режим: только эндпоинт метрик (нужен --metrics-port)")
+    p.add_argument("--precompute", action="store_true",
+                   help="пересчитывать ведомость текущего и следующего месяца по таймеру")
+
+    p = sub.add_parser("payslips", help="сформировать расчётные листки за период в zip-архив")
+    p.add_argument("year", type=int)
+    p.add_argument("month", type=int)
+    p.add_argument("out", help="путь к zip-архиву")
+    p.add_argument("--processes", type=int, help="число процессов (по умолчанию - число CPU)")
+
+    p = sub.add_parser("range-report", help="ведомость за диапазон месяцев (квартал, год) в CSV")
+    p.add_argument("year_from", type=int)
+    p.add_argument("month_from", type=int)
+    p.add_argument("year_to", type=int)
+    p.add_argument("month_to", type=int)
+    p.add_argument("out", help="путь к CSV-файлу")
+
+    p = sub.add_parser("period-diff", help="сравнить ведомость периода с другим периодом")
+    p.add_argument("year_from", type=int)
+    p.add_argument("month_from", type=int)
+    p.add_argument("year_to", type=int)
+    p.add_argument("month_to", type=int)
+    p.add_argument("--column", default="net", help="столбец для выбросов: sick, base, add, gross, tax, net")
+    p.add_argument("--top", type=int, default=10, help="сколько наибольших изменений показать")
+    p.add_argument("--out", help="выгрузить сравнение в CSV")
+
+    p = sub.add_parser("period-open", help="начислить постоянные надбавки за период (повторный запуск безопасен)")
+    p.add_argument("year", type=int)
+    p.add_argument("month", type=int)
+    p.add_argument("--login", required=True, help="логин бухгалтера для аудита")
+
+    p = sub.add_parser("recurring-add", help="добавить постоянную надбавку работнику или должности")
+    target = p.add_mutually_exclusive_group(required=True)
+    target.add_argument("--worker", type=int, help="id работника")
+    target.add_argument("--position", help="должность")
+    p.add_argument("type", help="тип надбавки")
+    p.add_argument("amount", type=float)
+    p.add_argument("valid_from", help="действует с (YYYY-MM-DD)")
+    p.add_argument("--to", help="действует по (YYYY-MM-DD) включительно")
+    p.add_argument("--login", required=True, help="логин бухгалтера")
+
+    sub.add_parser("recurring-list", help="список постоянных надбавок")
+
+    p = sub.add_parser("loadtest", help="нагрузочный тест: N процессов на синтетической БД, journal DELETE и WAL")
+    p.add_argument("--processes", type=int, default=8)
+    p.add_argument("--duration", type=float, default=10.0, help="секунд на каждый режим")
+    p.add_argument("--workers", type=int, default=2000, help="работников в синтетической БД")
+    p.add_argument("--modes", default="delete,wal", help="режимы журнала через запятую")
+    p.add_argument("--mix", help="веса операций, например 'auth_worker=50; report=1'")
+    p.add_argument("--dir", help="каталог для БД теста (по умолчанию временный, удаляется)")
+
+    p = sub.add_parser("plan-check", help="EXPLAIN QUERY PLAN всех запросов на синтетической БД")
+    p.add_argument("--workers", type=int, default=20_000, help="работников в синтетической БД")
+    p.add_argument("--min-rows", type=int, default=1000, help="порог размера таблицы для полного прохода")
+    p.add_argument("--no-analyze", action="store_true", help="без статистики ANALYZE (планы новой БД)")
+    p.add_argument("--verbose", action="store_true", help="печатать планы всех операторов")
+
+    p = sub.add_parser("audit-query", help="отбор записей журнала аудита по полям")
+    p.add_argument("--action", help="тип действия: ADD_ALLOW, ADD_SICK, CLOSE_PERIOD, REOPEN_PERIOD")
+    p.add_argument("--worker", type=int, help="id работника")
+    p.add_argument("--year", type=int)
+    p.add_argument("--month", type=int)
+    p.add_argument("--type", help="тип надбавки")
+    p.add_argument("--min-amount", type=float)
+    p.add_argument("--max-amount", type=float)
+    p.add_argument("--sick-from", help="больничные, пересекающие диапазон с этой даты (ГГГГ-ММ-ДД)")
+    p.add_argument("--sick-to", help="больничные, пересекающие диапазон по эту дату (ГГГГ-ММ-ДД)")
+    p.add_argument("--login", help="логин бухгалтера")
+    p.add_argument("--limit", type=int, default=100)
+
+    p = sub.add_parser("audit-verify", help="проверить цепочку хешей журнала аудита")
+    p.add_argument("--full", action="store_true", help="с первой записи, без контрольных точек")
+
+    return parser
+
+def run_command(args):
+    from payroll import finalize_ytd, rebuild_ytd, check_ytd
+
+    if args.command == "ytd-finalize":
+        print(f"Сохранено строк: {finalize_ytd(args.year, args.month)}")
+    elif args.command == "ytd-rebuild":
+        print(f"Сохранено строк: {rebuild_ytd(args.year, args.through)}")
+    elif args.command == "ytd-check":
+        problems = check_ytd(args.year)
+        for wid, month, field, saved, replayed in problems:
+            print(f"worker {wid}, месяц {month}: {field} = {saved:.2f}, пересчёт {replayed:.2f}")
+        print("Расхождений нет." if not problems else f"Расхождений: {len(problems)}")
+        return 1 if problems else 0
+    elif args.command == "backup":
+        from maintenance import backup
+        r = backup()
+        print(f"Копия: {r['path']} ({r['bytes']} байт, {r['seconds']:.2f} с), удалено старых: {len(r['removed'])}")
+    elif args.command == "maintain":
+        from maintenance import backup, optimize
+        if not args.no_backup:
+            r = backup()
+            print(f"Копия: {r['path']} ({r['bytes']} байт, {r['seconds']:.2f} с)")
+        r = optimize(convert_auto_vacuum=args.convert_auto_vacuum)
+        print(f"{', '.join(r['steps'])}: {r['seconds']:.2f} с, "
+              f"размер {r['bytes_before']} -> {r['bytes_after']} байт (освобождено {r['reclaimed']})")
+    elif args.command == "serve-metrics":
+        if not args.metrics_port:
+            print("Укажите --metrics-port.")
+            return 2
+        print(f"Метрики: http://127.0.0.1:{args.metrics_port}/metrics (Ctrl+C - выход)")
+        if args.precompute:
+            from precompute import start_background
+            start_background()
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
+    elif args.command == "payslips":
+        from payslips import generate_payslips
+        count = generate_payslips(args.year, args.month, args.out, args.processes)
+        print(f"Расчётных листков: {count}")
+    elif args.command == "range-report":
+        from export import export_range_report
+        count = export_range_report(args.year_from, args.month_from, args.year_to, args.month_to, args.out)
+        print(f"Строк: {count}")
+    elif args.command == "period-diff":
+        from payroll import period_diff, diff_percent, DIFF_COLUMNS
+        diff = period_diff(args.year_from, args.month_from, args.year_to, args.month_to, args.column, args.top)
+        i = DIFF_COLUMNS.index(args.column)
+        changed = sum(1 for r in diff["rows"] if r[4] == "changed")
+        print(f"Новых: {len(diff['new'])}, выбывших: {len(diff['gone'])}, изменилось: {changed}")
+        before, after, delta = diff["totals"]
+        print(f"К выдаче: {before[2]:.2f} -> {after[2]:.2f} ({delta[2]:+.2f})")
+        for title, rows in (("по сумме", diff["by_abs"]), ("в процентах", diff["by_pct"])):
+            print(f"Наибольшие изменения {args.column} {title}:")
+            for row in rows:
+                pct = diff_percent(row, i)
+                print(f"  {row[1]} {row[2]}: {row[5][i]:.2f} -> {row[6][i]:.2f} ({row[7][i]:+.2f}"
+                      + (f", {pct:+.2f}%)" if pct is not None else ")"))
+        if args.out:
+            from export import write_csv, period_diff_rows, DIFF_HEADER
+            print(f"Строк: {write_csv(args.out, DIFF_HEADER, period_diff_rows(diff))}")
+    elif args.command == "period-open":
+        from recurring import materialize_recurring
+        print(f"Начислено постоянных надбавок: {materialize_recurring(args.year, args.month, args.login)}")
+    elif args.command == "recurring-add":
+        from payroll import parse_date
+        from recurring import add_recurring_allowance
+        rid = add_recurring_allowance(args.type, args.amount, parse_date(args.valid_from), args.login,
+                                      worker_id=args.worker, position=args.position,
+                                      valid_to=parse_date(args.to) if args.to else None)
+        print(f"Шаблон надбавки #{rid}")
+    elif args.command == "recurring-list":
+        from recurring import fetch_recurring_allowances
+        for rid, wid, pos, a_type, amount, d1, d2 in fetch_recurring_allowances():
+            target = f"работник {wid}" if wid is not None else f"должность {pos}"
+            print(f"#{rid}: {target}, {a_type} {amount:.2f}, {d1}..{d2 or ''}")
+    elif args.command == "loadtest":
+        from loadtest import run_load_test, format_report, DEFAULT_MIX
+        mix = DEFAULT_MIX
+        if args.mix:
+            from simulation import parse_mapping
+            mix = {name: int(weight) for name, weight in parse_mapping(args.mix).items()}
+        report = run_load_test(args.processes, args.duration, args.workers,
+                               tuple(m.strip() for m in args.modes.split(",") if m.strip()),
+                               mix, args.dir)
+        print(format_report(report))
+    elif args.command == "plan-check":
+        from plancheck import check_plans, format_results
+        results = check_plans(args.workers, args.min_rows, analyze=not args.no_analyze)
+        print(format_results(results, args.verbose))
+        return 1 if any(r["problems"] for r in results) else 0
+    elif args.command == "audit-query":
+        from audit import query_audit
+        from payroll import parse_date
+        rows = query_audit(args.action, args.worker, args.year, args.month, args.type,
+                           args.min_amount, args.max_amount,
+                           parse_date(args.sick_from) if args.sick_from else None,
+                           parse_date(args.sick_to) if args.sick_to else None,
+                           args.login, args.limit)
+        for audit_id, action, entity_id, wid, year, month, login, when, *_, details in rows:
+            print(f"#{audit_id} {when} {login} {action} {year}-{month:02d} работник {wid}: {details}")
+        print(f"Записей: {len(rows)}")
+    elif args.command == "audit-verify":
+        from audit import verify_audit_chain
+        r = verify_audit_chain(full=args.full)
+        if r["broken"]:
+            audit_id, reason = r["broken"]
+            print(f"Цепочка нарушена на записи #{audit_id}: {reason} "
+                  f"(проверено до неё: {r['checked']}, начиная после #{r['from_id']})")
+            return 1
+        print(f"Цепочка цела: проверено {r['checked']} записей после #{r['from_id']}, последняя #{r['last_id']}.")
+    return 0
+
+def start_metrics(args):
+    import metrics
+    if args.metrics_file:
+        metrics.start_textfile_writer(args.metrics_file, METRICS_INTERVAL)
+    if args.metrics_port:
+        metrics.start_http_server(args.metrics_port)
 
 def main():
+    args = build_parser().parse_args()
+    start_metrics(args)
     init_db()
+    if args.replica:
+        import config
+        config.READ_REPLICA = True
+    if args.command:
+        raise SystemExit(run_command(args))
+
+    from ui_role import RoleChoice
     RoleChoice().mainloop()
 
 if __name__ == "__main__":
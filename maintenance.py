@@ -0,0 +1,156 @@
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from config import DB_NAME, BACKUP_DIR, BACKUP_KEEP, BACKUP_PAGES, MAINTENANCE_INTERVAL_HOURS
+from db import get_conn
+from payroll import now_iso
+
+# -------- helpers --------
+
+def _db_bytes(cur):
+    page_size = cur.execute("PRAGMA page_size").fetchone()[0]
+    pages = cur.execute("PRAGMA page_count").fetchone()[0]
+    free = cur.execute("PRAGMA freelist_count").fetchone()[0]
+    return pages * page_size, free * page_size
+
+def _log(kind, started_at, seconds, bytes_before=None, bytes_after=None, details=None):
+    with get_conn() as conn:
+        conn.execute("""
+            INSERT INTO maintenance_log(kind, started_at, seconds, bytes_before, bytes_after, details)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, (kind, started_at, seconds, bytes_before, bytes_after, details))
+        conn.commit()
+
+# -------- online backup --------
+
+def rotate_backups(backup_dir=BACKUP_DIR, keep=BACKUP_KEEP):
+    stem = Path(DB_NAME).stem
+    files = sorted(Path(backup_dir).glob(f"{stem}-*.db"))
+    removed = []
+    for path in files[:-keep] if keep > 0 else []:
+        path.unlink()
+        removed.append(path)
+    return removed
+
+def backup(backup_dir=BACKUP_DIR, pages=BACKUP_PAGES, keep=BACKUP_KEEP, progress=None):
+    # копирование порциями по pages страниц: между шагами блокировка чтения отпускается,
+    # остальные соединения продолжают работать. Запись в источник перезапускает копирование.
+    started_at = now_iso()
+    t0 = time.perf_counter()
+
+    Path(backup_dir).mkdir(parents=True, exist_ok=True)
+    target = Path(backup_dir) / f"{Path(DB_NAME).stem}-{datetime.now():%Y%m%d-%H%M%S}.db"
+    part = target.with_suffix(".db.part")
+
+    src = get_conn(readonly=True)
+    dst = sqlite3.connect(part)
+    try:
+        src.backup(dst, pages=pages, progress=progress)
+    finally:
+        dst.close()
+        src.close()
+    os.replace(part, target)
+
+    seconds = time.perf_counter() - t0
+    size = target.stat().st_size
+    removed = rotate_backups(backup_dir, keep)
+    _log("BACKUP", started_at, seconds, None, size, str(target))
+    return {"path": str(target), "bytes": size, "seconds": seconds, "removed": [str(p) for p in removed]}
+
+# -------- optimize / analyze / vacuum --------
+
+def optimize(convert_auto_vacuum=False):
+    # convert_auto_vacuum: однократный перевод старой БД в auto_vacuum=INCREMENTAL полным VACUUM
+    # (монопольная блокировка на всё время - только из CLI, когда никто не работает)
+    started_at = now_iso()
+    t0 = time.perf_counter()
+    conn = get_conn()
+    conn.isolation_level = None
+    try:
+        cur = conn.cursor()
+        bytes_before, free_before = _db_bytes(cur)
+        steps = []
+
+        mode = cur.execute("PRAGMA auto_vacuum").fetchone()[0]
+        if mode != 2 and convert_auto_vacuum:
+            cur.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            cur.execute("VACUUM")
+            steps.append("VACUUM (auto_vacuum=INCREMENTAL)")
+            mode = 2
+
+        cur.execute("ANALYZE")
+        steps.append("ANALYZE")
+        cur.execute("PRAGMA optimize")
+        steps.append("optimize")
+        if mode == 2:
+            cur.execute("PRAGMA incremental_vacuum")
+            steps.append("incremental_vacuum")
+        else:
+            steps.append("incremental_vacuum пропущен: auto_vacuum выключен")
+
+        bytes_after, free_after = _db_bytes(cur)
+    finally:
+        conn.close()
+
+    seconds = time.perf_counter() - t0
+    _log("OPTIMIZE", started_at, seconds, bytes_before, bytes_after, "; ".join(steps))
+    return {
+        "seconds": seconds,
+        "bytes_before": bytes_before,
+        "bytes_after": bytes_after,
+        "reclaimed": bytes_before - bytes_after,
+        "free_before": free_before,
+        "free_after": free_after,
+        "steps": steps,
+    }
+
+# -------- schedule --------
+
+def maintenance_due(interval_hours=MAINTENANCE_INTERVAL_HOURS):
+    with get_conn() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT MAX(started_at) FROM maintenance_log WHERE kind='OPTIMIZE'")
+        last = cur.fetchone()[0]
+    if last is None:
+        return True
+    return datetime.fromisoformat(last) <= datetime.now() - timedelta(hours=interval_hours)
+
+def run_maintenance(with_backup=True):
+    result = {}
+    if with_backup:
+        result["backup"] = backup()
+    result["optimize"] = optimize()
+    return result
+
+_running = threading.Lock()
+
+def run_if_due_in_background(on_done=None, on_error=None):
+    # для GUI: обслуживание в отдельном потоке, не чаще MAINTENANCE_INTERVAL_HOURS
+    if not _running.acquire(blocking=False):
+        return False
+    try:
+        due = maintenance_due()
+    except Exception:
+        _running.release()
+        raise
+    if not due:
+        _running.release()
+        return False
+
+    def work():
+        try:
+            result = run_maintenance()
+            if on_done:
+                on_done(result)
+        except Exception as e:
+            if on_error:
+                on_error(e)
+        finally:
+            _running.release()
+
+    threading.Thread(target=work, name="maintenance", daemon=True).start()
+    return True
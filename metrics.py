@@ -0,0 +1,187 @@
+import functools
+import os
+import sqlite3
+import threading
+import time
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from config import METRICS_ENABLED
+
+# Реестр метрик в формате Prometheus (text exposition 0.0.4).
+# При выключенном реестре декоратор timed стоит одну проверку флага на вызов.
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+def _labels_text(labels):
+    if not labels:
+        return ""
+    parts = []
+    for k, v in labels:
+        v = str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        parts.append(f'{k}="{v}"')
+    return "{" + ",".join(parts) + "}"
+
+
+class Counter:
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self):
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            for key, value in sorted(self.values.items()):
+                out.append(f"{self.name}{_labels_text(key)} {value}")
+        return out
+
+
+class Histogram:
+    def __init__(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        self.series = {}  # labels -> [counts по корзинам..., +Inf, sum]
+        self.lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        i = bisect_left(self.buckets, value)
+        with self.lock:
+            data = self.series.get(key)
+            if data is None:
+                data = self.series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            data[i] += 1
+            data[-1] += value
+
+    def render(self):
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            for key, data in sorted(self.series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, data):
+                    cumulative += count
+                    out.append(f"{self.name}_bucket{_labels_text(key + (('le', f'{bound:g}'),))} {cumulative}")
+                cumulative += data[len(self.buckets)]
+                out.append(f"{self.name}_bucket{_labels_text(key + (('le', '+Inf'),))} {cumulative}")
+                out.append(f"{self.name}_sum{_labels_text(key)} {data[-1]:.6f}")
+                out.append(f"{self.name}_count{_labels_text(key)} {cumulative}")
+        return out
+
+
+class Registry:
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.metrics = {}
+
+    def counter(self, name, help_text):
+        return self.metrics.setdefault(name, Counter(name, help_text))
+
+    def histogram(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        return self.metrics.setdefault(name, Histogram(name, help_text, buckets))
+
+    def render(self):
+        lines = []
+        for metric in self.metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry(METRICS_ENABLED)
+
+OPERATION_SECONDS = REGISTRY.histogram("payroll_operation_seconds", "Длительность операций payroll/auth")
+OPERATIONS = REGISTRY.counter("payroll_operations_total", "Число операций по результату")
+DB_BUSY = REGISTRY.counter("payroll_db_busy_total", "Операции, завершившиеся ошибкой SQLITE_BUSY/LOCKED")
+ROWS = REGISTRY.counter("payroll_rows_processed_total", "Обработано строк")
+CACHE = REGISTRY.counter("payroll_cache_requests_total", "Обращения к кешам (result=hit|miss)")
+
+def _is_busy(exc):
+    text = str(exc).lower()
+    return "locked" in text or "busy" in text
+
+def timed(fn):
+    op = fn.__name__
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        if not REGISTRY.enabled:
+            return fn(*args, **kwargs)
+        started = time.perf_counter()
+        status = "ok"
+        try:
+            return fn(*args, **kwargs)
+        except sqlite3.OperationalError as e:
+            status = "error"
+            if _is_busy(e):
+                DB_BUSY.inc(op=op)
+            raise
+        except Exception:
+            status = "error"
+            raise
+        finally:
+            OPERATION_SECONDS.observe(time.perf_counter() - started, op=op)
+            OPERATIONS.inc(op=op, status=status)
+
+    return wrapper
+
+def rows_processed(op, count):
+    if REGISTRY.enabled:
+        ROWS.inc(count, op=op)
+
+def cache_lookup(cache, hit):
+    if REGISTRY.enabled:
+        CACHE.inc(cache=cache, result="hit" if hit else "miss")
+
+# -------- export --------
+
+def write_textfile(path):
+    # атомарная замена: node_exporter не увидит наполовину записанный файл
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(REGISTRY.render())
+    os.replace(tmp, path)
+
+def start_textfile_writer(path, interval=15.0):
+    REGISTRY.enabled = True
+    stop = threading.Event()
+
+    def loop():
+        while not stop.wait(interval):
+            try:
+                write_textfile(path)
+            except OSError:
+                pass
+        write_textfile(path)
+
+    threading.Thread(target=loop, name="metrics-textfile", daemon=True).start()
+    return stop
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = REGISTRY.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_http_server(port, host="127.0.0.1"):
+    REGISTRY.enabled = True
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
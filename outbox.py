@@ -0,0 +1,80 @@
+import json
+
+from db import get_conn
+from metrics import timed
+from payroll import now_iso
+
+# Change-data-capture: триггеры пишут каждое изменение workers, sick_leaves, allowances
+# и personal_change_requests в outbox с возрастающим seq. Потребитель читает пачками
+# начиная со своей отметки и подтверждает обработанное через ack.
+
+@timed
+def register_consumer(name, from_start=True):
+    # from_start=False: начать с текущего конца очереди, без истории
+    with get_conn() as conn:
+        cur = conn.cursor()
+        start = 0
+        if not from_start:
+            cur.execute("SELECT COALESCE(MAX(seq), 0) FROM outbox")
+            start = cur.fetchone()[0]
+        cur.execute("""
+            INSERT OR IGNORE INTO outbox_consumers(name, last_seq, updated_at)
+            VALUES (?, ?, ?)
+        """, (name, start, now_iso()))
+        conn.commit()
+
+@timed
+def read_changes(consumer, limit=500):
+    # [(seq, таблица, операция I/U/D, id строки, payload, время)] после отметки потребителя
+    with get_conn() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT last_seq FROM outbox_consumers WHERE name=?", (consumer,))
+        row = cur.fetchone()
+        if not row:
+            raise ValueError(f"Потребитель не зарегистрирован: {consumer}")
+        cur.execute("""
+            SELECT seq, table_name, op, row_id, payload, changed_at
+            FROM outbox
+            WHERE seq > ?
+            ORDER BY seq
+            LIMIT ?
+        """, (row[0], limit))
+        return [(seq, table, op, row_id, json.loads(payload), changed_at)
+                for seq, table, op, row_id, payload, changed_at in cur.fetchall()]
+
+@timed
+def ack(consumer, seq):
+    with get_conn() as conn:
+        cur = conn.cursor()
+        cur.execute("""
+            UPDATE outbox_consumers
+            SET last_seq=MAX(last_seq, ?), updated_at=?
+            WHERE name=?
+        """, (seq, now_iso(), consumer))
+        if cur.rowcount == 0:
+            raise ValueError(f"Потребитель не зарегистрирован: {consumer}")
+        conn.commit()
+
+def consume(consumer, handler, batch_size=500):
+    # handler(batch) вызывается для каждой пачки; отметка сдвигается только после его успеха
+    total = 0
+    while True:
+        batch = read_changes(consumer, batch_size)
+        if not batch:
+            return total
+        handler(batch)
+        ack(consumer, batch[-1][0])
+        total += len(batch)
+
+@timed
+def purge_outbox():
+    # удаляет записи, уже подтверждённые всеми потребителями
+    with get_conn() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT MIN(last_seq) FROM outbox_consumers")
+        low = cur.fetchone()[0]
+        if low is None:
+            return 0
+        cur.execute("DELETE FROM outbox WHERE seq <= ?", (low,))
+        conn.commit()
+        return cur.rowcount
@@ -1,8 +1,14 @@
 from datetime import date, datetime
 import calendar
+import hashlib
+import heapq
+import json
 
-from config import TAX_RATE, ALLOWANCE_TYPES
-from db import get_conn
+from config import ALLOWANCE_TYPES
+from db import get_conn, read_conn, sick_leave_segments
+from metrics import timed, rows_processed
+from tax_rules import rules_for_period
+from worker_table import WorkerTable
 
 # -------- time / date helpers --------
 
@@ -27,19 +33,23 @@ def overlap_days(a_start: date, a_end: date, b_start: date, b_end: date) -> int:
 
 # -------- workers --------
 
+def _fetch_workers(cur):
+    cur.execute("""
+        SELECT id, tab_number, full_name, position, salary, 
+               COALESCE(marital_status,''), COALESCE(children_count,0)
+        FROM workers
+        ORDER BY full_name
+    """)
+    return WorkerTable.from_rows(cur)
+
+@timed
 def fetch_workers():
-    with get_conn() as conn:
-        cur = conn.cursor()
-        cur.execute("""
-            SELECT id, tab_number, full_name, position, salary, 
-                   COALESCE(marital_status,''), COALESCE(children_count,0)
-            FROM workers
-            ORDER BY full_name
-        """)
-        return cur.fetchall()
+    with read_conn() as conn:
+        return _fetch_workers(conn.cursor())
 
+@timed
 def fetch_worker(worker_id):
-    with get_conn() as conn:
+    with read_conn() as conn:
         cur = conn.cursor()
         cur.execute("""
             SELECT id, tab_number, full_name, position, salary, 
@@ -48,6 +58,7 @@ def fetch_worker(worker_id):
         """, (worker_id,))
         return cur.fetchone()
 
+@timed
 def insert_worker(tab, name, pos, salary, marital, children, password="1234"):
     with get_conn() as conn:
         cur = conn.cursor()
@@ -57,6 +68,7 @@ def insert_worker(tab, name, pos, salary, marital, children, password="1234"):
         """, (tab, name, pos, salary, marital, children, password))
         conn.commit()
 
+@timed
 def update_worker_field(worker_id, field_name, new_value):
     allowed = {"full_name", "position", "marital_status", "children_count"}
     if field_name not in allowed:
@@ -68,6 +80,7 @@ def update_worker_field(worker_id, field_name, new_value):
 
 # -------- personal change requests --------
 
+@timed
 def create_personal_request(worker_id, field_name, new_value):
     with get_conn() as conn:
         cur = conn.cursor()
@@ -77,8 +90,9 @@ def create_personal_request(worker_id, field_name, new_value):
         """, (worker_id, field_name, str(new_value), now_iso()))
         conn.commit()
 
+@timed
 def fetch_pending_requests():
-    with get_conn() as conn:
+    with read_conn() as conn:
         cur = conn.cursor()
         cur.execute("""
             SELECT r.id, w.full_name, w.tab_number, r.field_name, r.new_value, r.request_date
@@ -89,6 +103,7 @@ def fetch_pending_requests():
         """)
         return cur.fetchall()
 
+@timed
 def approve_request(req_id, accountant_login):
     with get_conn() as conn:
         cur = conn.cursor()
@@ -115,6 +130,7 @@ def approve_request(req_id, accountant_login):
 
         conn.commit()
 
+@timed
 def reject_request(req_id, accountant_login):
     with get_conn() as conn:
         cur = conn.cursor()
@@ -127,76 +143,152 @@ def reject_request(req_id, accountant_login):
             raise ValueError("Запрос не найден или уже обработан.")
         conn.commit()
 
+@timed
+def fetch_worker_requests(worker_id, limit=50):
+    with read_conn() as conn:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT id, field_name, new_value, request_date, status, processed_at
+            FROM personal_change_requests
+            WHERE worker_id=?
+            ORDER BY request_date DESC, id DESC
+            LIMIT ?
+        """, (worker_id, limit))
+        return cur.fetchall()
+
 # -------- financial operations + audit --------
 
-def add_sick_leave(worker_id, d_start, d_end, year, month, accountant_login):
+def _insert_sick_leave(cur, worker_id, d_start, d_end, accountant_login):
+    # больничный режется по календарным месяцам: каждый месяц - отдельная строка
+    # со своим периодом и готовым числом дней
     if d_end < d_start:
         raise ValueError("Дата выздоровления раньше даты заболевания.")
 
-    with get_conn() as conn:
-        cur = conn.cursor()
+    segments = sick_leave_segments(cur, d_start.isoformat(), d_end.isoformat())
+    leave_id = None
+    for year, month, s1, s2, days in segments:
         cur.execute("""
-            INSERT INTO sick_leaves(worker_id, date_start, date_end, period_year, period_month, 
-                                    created_by_accountant, created_at)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        """, (worker_id, d_start.isoformat(), d_end.isoformat(), year, month, accountant_login, now_iso()))
+            INSERT INTO sick_leaves(worker_id, date_start, date_end, period_year, period_month,
+                                    days, leave_id, created_by_accountant, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (worker_id, s1, s2, year, month, days, leave_id, accountant_login, now_iso()))
         sick_id = cur.lastrowid
+        if leave_id is None:
+            leave_id = sick_id
+            cur.execute("UPDATE sick_leaves SET leave_id=? WHERE id=?", (leave_id, sick_id))
 
         cur.execute("""
             INSERT INTO financial_audit(action_type, entity_id, worker_id, period_year, period_month,
                                         accountant_login, action_time, details)
             VALUES ('ADD_SICK', ?, ?, ?, ?, ?, ?, ?)
-        """, (sick_id, worker_id, year, month, accountant_login, now_iso(),
-              f"{d_start.isoformat()}..{d_end.isoformat()}"))
-
-        conn.commit()
+        """, (sick_id, worker_id, year, month, accountant_login, now_iso(), f"{s1}..{s2}"))
+    return leave_id
 
-def add_allowance(worker_id, a_type, amount, year, month, accountant_login):
+def check_allowance(a_type, amount):
     if a_type not in ALLOWANCE_TYPES:
         raise ValueError("Неизвестный тип надбавки.")
     if amount < 0:
         raise ValueError("Сумма не может быть отрицательной.")
 
+def _insert_allowance(cur, worker_id, a_type, amount, year, month, accountant_login):
+    cur.execute("""
+        INSERT INTO allowances(worker_id, allowance_type, amount, period_year, period_month, 
+                               created_by_accountant, created_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """, (worker_id, a_type, amount, year, month, accountant_login, now_iso()))
+    allow_id = cur.lastrowid
+
+    cur.execute("""
+        INSERT INTO financial_audit(action_type, entity_id, worker_id, period_year, period_month,
+                                    accountant_login, action_time, details)
+        VALUES ('ADD_ALLOW', ?, ?, ?, ?, ?, ?, ?)
+    """, (allow_id, worker_id, year, month, accountant_login, now_iso(),
+          f"{a_type}: {amount}"))
+    return allow_id
+
+@timed
+def add_sick_leave(worker_id, d_start, d_end, accountant_login):
     with get_conn() as conn:
         cur = conn.cursor()
-        cur.execute("""
-            INSERT INTO allowances(worker_id, allowance_type, amount, period_year, period_month, 
-                                   created_by_accountant, created_at)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        """, (worker_id, a_type, amount, year, month, accountant_login, now_iso()))
-        allow_id = cur.lastrowid
+        leave_id = _insert_sick_leave(cur, worker_id, d_start, d_end, accountant_login)
+        conn.commit()
+        return leave_id
 
-        cur.execute("""
-            INSERT INTO financial_audit(action_type, entity_id, worker_id, period_year, period_month,
-                                        accountant_login, action_time, details)
-            VALUES ('ADD_ALLOW', ?, ?, ?, ?, ?, ?, ?)
-        """, (allow_id, worker_id, year, month, accountant_login, now_iso(),
-              f"{a_type}: {amount}"))
+@timed
+def add_allowance(worker_id, a_type, amount, year, month, accountant_login):
+    check_allowance(a_type, amount)
 
+    with get_conn() as conn:
+        cur = conn.cursor()
+        _insert_allowance(cur, worker_id, a_type, amount, year, month, accountant_login)
         conn.commit()
 
-def sick_days_in_month(worker_id, year, month):
-    m_start, m_end, days_in_month = month_bounds(year, month)
+@timed
+def save_financial_batch(year, month, allowances, sick_leaves, accountant_login):
+    # allowances: [(worker_id, тип, сумма)] за период, sick_leaves: [(worker_id, начало, конец)];
+    # всё вместе со строками аудита - одна транзакция: либо сохраняется всё, либо ничего
+    for _, a_type, amount in allowances:
+        check_allowance(a_type, amount)
+    for _, d_start, d_end in sick_leaves:
+        if d_end < d_start:
+            raise ValueError("Дата выздоровления раньше даты заболевания.")
 
     with get_conn() as conn:
+        cur = conn.cursor()
+        cur.execute("BEGIN IMMEDIATE")
+        for worker_id, a_type, amount in allowances:
+            _insert_allowance(cur, worker_id, a_type, amount, year, month, accountant_login)
+        for worker_id, d_start, d_end in sick_leaves:
+            _insert_sick_leave(cur, worker_id, d_start, d_end, accountant_login)
+        conn.commit()
+    rows_processed("save_financial_batch", len(allowances) + len(sick_leaves))
+    return len(allowances), len(sick_leaves)
+
+@timed
+def sick_days_in_month(worker_id, year, month):
+    _, _, days_in_month = month_bounds(year, month)
+
+    with read_conn() as conn:
         cur = conn.cursor()
         cur.execute("""
-            SELECT date_start, date_end
+            SELECT COALESCE(SUM(days), 0)
             FROM sick_leaves
             WHERE worker_id=? AND period_year=? AND period_month=?
         """, (worker_id, year, month))
-        rows = cur.fetchall()
-
-    total = 0
-    for ds, de in rows:
-        s = parse_date(ds)
-        e = parse_date(de)
-        total += overlap_days(s, e, m_start, m_end)
+        total = cur.fetchone()[0]
 
     return max(0, min(total, days_in_month))
 
+# {worker_id: больничные дни} для всех работников периода одним запросом
+def _sick_days_for_period(cur, year, month):
+    _, _, days_in_month = month_bounds(year, month)
+    cur.execute("""
+        SELECT worker_id, SUM(days)
+        FROM sick_leaves
+        WHERE period_year=? AND period_month=?
+        GROUP BY worker_id
+    """, (year, month))
+    return {wid: min(n, days_in_month) for wid, n in cur.fetchall()}
+
+@timed
+def sick_days_for_period(year, month):
+    with read_conn() as conn:
+        return _sick_days_for_period(conn.cursor(), year, month)
+
+@timed
+def working_days_in_month(year, month):
+    with read_conn() as conn:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT COALESCE(SUM(is_working_day), 0)
+            FROM calendar_days
+            WHERE year=? AND month=?
+        """, (year, month))
+        return cur.fetchone()[0]
+
+@timed
 def allowances_sum(worker_id, year, month):
-    with get_conn() as conn:
+    with read_conn() as conn:
         cur = conn.cursor()
         cur.execute("""
             SELECT COALESCE(SUM(amount), 0)
@@ -205,22 +297,680 @@ def allowances_sum(worker_id, year, month):
         """, (worker_id, year, month))
         return float(cur.fetchone()[0] or 0.0)
 
+def _allowances_for_period(cur, year, month):
+    cur.execute("""
+        SELECT worker_id, SUM(amount)
+        FROM allowances
+        WHERE period_year=? AND period_month=?
+        GROUP BY worker_id
+    """, (year, month))
+    return {wid: float(total or 0.0) for wid, total in cur.fetchall()}
+
+@timed
+def allowances_for_period(year, month):
+    with read_conn() as conn:
+        return _allowances_for_period(conn.cursor(), year, month)
+
 # -------- salary calculation --------
 
-def calc_salary_row(worker_row, year, month):
-    worker_id, tab, name, pos, salary, marital, children = worker_row
-    _, _, days_in_month = month_bounds(year, month)
+YTD_ZERO = (0.0, 0.0, 0.0)  # (доход, налоговая база, налог) с начала года
 
-    sick = sick_days_in_month(worker_id, year, month)
+# should_stop() в длинных расчётах проверяется между месяцами и каждые STOP_CHECK_EVERY работников:
+# предрасчёт в простое так уступает место действиям пользователя
+STOP_CHECK_EVERY = 500
+
+class Cancelled(Exception):
+    pass
+
+def _check_stop(should_stop):
+    if should_stop is not None and should_stop():
+        raise Cancelled()
+
+def salary_amounts(worker_row, days_in_month, sick, add, tax_fn, ytd=YTD_ZERO):
+    # неокруглённые (база по окладу, начислено, налог, налоговая база)
+    salary, marital, children = worker_row.salary, worker_row.marital_status, worker_row.children_count
     worked = days_in_month - sick
 
     base = salary * (worked + 0.5 * sick) / days_in_month
-    add = allowances_sum(worker_id, year, month)
     gross = base + add
 
-    tax = gross * TAX_RATE
+    tax, tax_base = tax_fn(gross, children, marital, *ytd)
+    return base, gross, tax, tax_base
+
+def salary_line(worker_row, days_in_month, sick, add, tax_fn, ytd=YTD_ZERO):
+    base, gross, tax, _ = salary_amounts(worker_row, days_in_month, sick, add, tax_fn, ytd)
     net = gross - tax
 
-    return (tab, name, pos, sick,
+    return (worker_row.tab_number, worker_row.full_name, worker_row.position, sick,
             round(base, 2), round(add, 2),
             round(gross, 2), round(tax, 2), round(net, 2))
+
+@timed
+def calc_salary_row(worker_row, year, month):
+    # worker_row - строка fetch_worker (кортеж) или WorkerRow
+    workers = WorkerTable.from_rows([worker_row])
+    worker, worker_id = workers[0], workers.ids[0]
+    _, _, days_in_month = month_bounds(year, month)
+
+    sick = sick_days_in_month(worker_id, year, month)
+    add = allowances_sum(worker_id, year, month)
+    with read_conn() as conn:
+        cur = conn.cursor()
+        tax_fn = rules_for_period(cur, year, month)
+        ytd = _ytd_state(cur, workers, year, month).get(worker_id, YTD_ZERO)
+    return salary_line(worker, days_in_month, sick, add, tax_fn, ytd)
+
+def _period_inputs(cur, year, month, store_ytd=False, should_stop=None):
+    workers = _fetch_workers(cur)
+    sick = _sick_days_for_period(cur, year, month)
+    allow = _allowances_for_period(cur, year, month)
+    tax_fn = rules_for_period(cur, year, month)
+    ytd = _ytd_state(cur, workers, year, month, store=store_ytd, should_stop=should_stop)
+    return workers, sick, allow, tax_fn, ytd
+
+# все входные данные периода одним чтением (read-only, единый снимок БД)
+@timed
+def fetch_period_inputs(year, month, should_stop=None):
+    with read_conn() as conn:
+        cur = conn.cursor()
+        cur.execute("BEGIN")
+        try:
+            inputs = _period_inputs(cur, year, month, should_stop=should_stop)
+        finally:
+            cur.execute("COMMIT")
+    return inputs
+
+@timed
+def compute_lines(inputs, year, month, tax_fn=None, should_stop=None):
+    # tax_fn подменяет действующие правила НДФЛ (моделирование)
+    workers, sick, allow, period_tax_fn, ytd = inputs
+    if tax_fn is None:
+        tax_fn = period_tax_fn
+    else:
+        # налог прошлых месяцев - по тем же подменённым правилам: с реальным ytd_tax нарастающий
+        # итог доначислил бы разницу ставок за все предыдущие месяцы года
+        ytd = {wid: (y_gross, y_base, tax_fn(y_base, 0, "")[0]) for wid, (y_gross, y_base, _) in ytd.items()}
+    _, _, days_in_month = month_bounds(year, month)
+    rows_processed("compute_lines", len(workers))
+    lines = {}
+    for i, w in enumerate(workers):
+        if i % STOP_CHECK_EVERY == 0:
+            _check_stop(should_stop)
+        lines[w.id] = salary_line(w, days_in_month, sick.get(w.id, 0), allow.get(w.id, 0.0), tax_fn,
+                                  ytd.get(w.id, YTD_ZERO))
+    return lines
+
+@timed
+def calc_payroll(year, month):
+    return list(compute_lines(fetch_period_inputs(year, month), year, month).values())
+
+# -------- year-to-date totals --------
+# ytd_totals(worker_id, year, month) хранит итоги закрытого (finalize_ytd) месяца и нарастающие
+# итоги на его конец. Триггеры на allowances/sick_leaves удаляют строки изменённого месяца
+# и всех следующих, поэтому у каждого работника в таблице лежит непрерывный префикс месяцев.
+
+def _replay_months(cur, workers, year, first_month, last_month, state, should_stop=None):
+    # state: {worker_id: (последний учтённый месяц, ytd)}; досчитывает месяцы first..last в памяти,
+    # возвращает строки для ytd_totals
+    rows = []
+    for month in range(first_month, last_month + 1):
+        _check_stop(should_stop)
+        _, _, days_in_month = month_bounds(year, month)
+        sick = _sick_days_for_period(cur, year, month)
+        allow = _allowances_for_period(cur, year, month)
+        tax_fn = rules_for_period(cur, year, month)
+        for w in workers:
+            wid = w.id
+            done, ytd = state.get(wid, (0, YTD_ZERO))
+            if done >= month:
+                continue
+            _, gross, tax, tax_base = salary_amounts(w, days_in_month, sick.get(wid, 0),
+                                                     allow.get(wid, 0.0), tax_fn, ytd)
+            ytd = (ytd[0] + gross, ytd[1] + tax_base, ytd[2] + tax)
+            state[wid] = (month, ytd)
+            rows.append((wid, year, month, gross, tax_base, tax, *ytd))
+    return rows
+
+def _ytd_state(cur, workers, year, month, store=False, should_stop=None):
+    # {worker_id: ytd} на конец месяца month-1
+    if month <= 1:
+        return {}
+
+    cur.execute("""
+        SELECT worker_id, ytd_gross, ytd_base, ytd_tax
+        FROM ytd_totals
+        WHERE year=? AND month=?
+    """, (year, month - 1))
+    ytd = {wid: (g, b, t) for wid, g, b, t in cur.fetchall()}
+    missing = [w for w in workers if w.id not in ytd]
+    if not missing:
+        return ytd
+
+    # у части работников предыдущий месяц не закрыт: продолжаем с последнего сохранённого
+    cur.execute("""
+        SELECT t.worker_id, t.month, t.ytd_gross, t.ytd_base, t.ytd_tax
+        FROM ytd_totals t
+        WHERE t.year=? AND t.month = (
+            SELECT MAX(month) FROM ytd_totals
+            WHERE worker_id=t.worker_id AND year=t.year AND month<?
+        )
+    """, (year, month))
+    state = {wid: (m, (g, b, t)) for wid, m, g, b, t in cur.fetchall()}
+    first = min(state.get(w.id, (0,))[0] for w in missing) + 1
+    rows = _replay_months(cur, missing, year, first, month - 1, state, should_stop)
+    if store:
+        _store_ytd(cur, rows)
+
+    for w in missing:
+        ytd[w.id] = state[w.id][1]
+    return ytd
+
+def _store_ytd(cur, rows):
+    cur.executemany("""
+        INSERT OR REPLACE INTO ytd_totals(worker_id, year, month, gross, base, tax,
+                                          ytd_gross, ytd_base, ytd_tax, computed_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, [(*r, now_iso()) for r in rows])
+
+def _finalize_ytd(cur, workers, year, month):
+    ytd = _ytd_state(cur, workers, year, month, store=True)
+    state = {wid: (month - 1, v) for wid, v in ytd.items()}
+    rows = _replay_months(cur, workers, year, month, month, state)
+    _store_ytd(cur, rows)
+    return len(rows)
+
+@timed
+def finalize_ytd(year, month):
+    # фиксирует итоги месяца (и недостающих предыдущих месяцев года) в ytd_totals
+    with get_conn() as conn:
+        cur = conn.cursor()
+        count = _finalize_ytd(cur, _fetch_workers(cur), year, month)
+        conn.commit()
+        return count
+
+@timed
+def invalidate_ytd(year, month, worker_id=None):
+    with get_conn() as conn:
+        cur = conn.cursor()
+        if worker_id is None:
+            cur.execute("DELETE FROM ytd_totals WHERE year=? AND month>=?", (year, month))
+        else:
+            cur.execute("DELETE FROM ytd_totals WHERE worker_id=? AND year=? AND month>=?",
+                        (worker_id, year, month))
+        conn.commit()
+
+@timed
+def fetch_ytd(worker_id, year, month):
+    with read_conn() as conn:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT ytd_gross, ytd_base, ytd_tax
+            FROM ytd_totals
+            WHERE worker_id=? AND year=? AND month=?
+        """, (worker_id, year, month))
+        return cur.fetchone()
+
+@timed
+def rebuild_ytd(year, through_month=None):
+    with get_conn() as conn:
+        cur = conn.cursor()
+        if through_month is None:
+            cur.execute("SELECT MAX(month) FROM ytd_totals WHERE year=?", (year,))
+            through_month = cur.fetchone()[0]
+            if through_month is None:
+                raise ValueError("Нет закрытых месяцев: укажите месяц, до которого пересобрать.")
+        workers = _fetch_workers(cur)
+        cur.execute("DELETE FROM ytd_totals WHERE year=?", (year,))
+        rows = _replay_months(cur, workers, year, 1, through_month, {})
+        _store_ytd(cur, rows)
+        conn.commit()
+        return len(rows)
+
+@timed
+def check_ytd(year, tolerance=0.005):
+    # полный пересчёт года с января в памяти и сверка с ytd_totals;
+    # возвращает [(worker_id, month, поле, сохранено, пересчитано)]
+    with read_conn() as conn:
+        cur = conn.cursor()
+        cur.execute("BEGIN")
+        cur.execute("""
+            SELECT worker_id, month, gross, base, tax, ytd_gross, ytd_base, ytd_tax
+            FROM ytd_totals WHERE year=?
+        """, (year,))
+        stored = {(r[0], r[1]): r[2:] for r in cur.fetchall()}
+        if not stored:
+            cur.execute("COMMIT")
+            return []
+        through = max(m for _, m in stored)
+        replayed = _replay_months(cur, _fetch_workers(cur), year, 1, through, {})
+        cur.execute("COMMIT")
+
+    fields = ("gross", "base", "tax", "ytd_gross", "ytd_base", "ytd_tax")
+    problems = []
+    for wid, _, month, *values in replayed:
+        saved = stored.get((wid, month))
+        if saved is None:
+            continue
+        for name, a, b in zip(fields, saved, values):
+            if abs(a - b) > tolerance:
+                problems.append((wid, month, name, a, b))
+    return problems
+
+# -------- period close --------
+# Закрытие периода замораживает строки ведомости в payroll_snapshot_lines и итоги с хешем
+# содержимого в period_closures. Триггеры БД запрещают изменять начисления закрытого периода
+# и сами снимки; повторное открытие - только через reopen_period с указанием причины,
+# прежний снимок при этом переносится в payroll_snapshot_archive.
+
+def _snapshot_hash(lines):
+    payload = json.dumps(lines, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def _line_totals(lines):
+    # суммы по округлённым строкам, как в ведомости
+    gross = tax = net = 0.0
+    for line in lines:
+        gross += line[-3]
+        tax += line[-2]
+        net += line[-1]
+    return round(gross, 2), round(tax, 2), round(net, 2)
+
+@timed
+def period_status(year, month):
+    with read_conn() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT status FROM period_closures WHERE year=? AND month=?", (year, month))
+        row = cur.fetchone()
+        return row[0] if row else "OPEN"
+
+@timed
+def close_period(year, month, accountant_login):
+    with get_conn() as conn:
+        cur = conn.cursor()
+        # IMMEDIATE: никто не допишет начисления между расчётом и фиксацией снимка
+        cur.execute("BEGIN IMMEDIATE")
+        cur.execute("SELECT status FROM period_closures WHERE year=? AND month=?", (year, month))
+        row = cur.fetchone()
+        if row and row[0] == "CLOSED":
+            raise ValueError("Период уже закрыт.")
+
+        workers = _fetch_workers(cur)
+        _finalize_ytd(cur, workers, year, month)
+        inputs = _period_inputs(cur, year, month)
+        lines = [(wid, *line) for wid, line in compute_lines(inputs, year, month).items()]
+        total_g, total_t, total_n = _line_totals(lines)
+        content_hash = _snapshot_hash(lines)
+
+        cur.executemany("""
+            INSERT INTO payroll_snapshot_lines(year, month, line_no, worker_id, tab_number, full_name,
+                                               position, sick_days, base, allowances, gross, tax, net)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, [(year, month, i, *line) for i, line in enumerate(lines)])
+
+        now = now_iso()
+        cur.execute("""
+            INSERT INTO period_closures(year, month, status, closed_by, closed_at, content_hash,
+                                        line_count, total_gross, total_tax, total_net)
+            VALUES (?, ?, 'CLOSED', ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(year, month) DO UPDATE SET
+                status='CLOSED', closed_by=excluded.closed_by, closed_at=excluded.closed_at,
+                content_hash=excluded.content_hash, line_count=excluded.line_count,
+                total_gross=excluded.total_gross, total_tax=excluded.total_tax,
+                total_net=excluded.total_net
+        """, (year, month, accountant_login, now, content_hash, len(lines), total_g, total_t, total_n))
+
+        cur.execute("""
+            INSERT INTO financial_audit(action_type, entity_id, worker_id, period_year, period_month,
+                                        accountant_login, action_time, details)
+            VALUES ('CLOSE_PERIOD', 0, 0, ?, ?, ?, ?, ?)
+        """, (year, month, accountant_login, now, content_hash))
+
+        conn.commit()
+        return content_hash
+
+@timed
+def reopen_period(year, month, accountant_login, reason):
+    if not reason or not reason.strip():
+        raise ValueError("Укажите причину повторного открытия периода.")
+
+    with get_conn() as conn:
+        cur = conn.cursor()
+        cur.execute("BEGIN IMMEDIATE")
+        cur.execute("""
+            SELECT content_hash FROM period_closures
+            WHERE year=? AND month=? AND status='CLOSED'
+        """, (year, month))
+        row = cur.fetchone()
+        if not row:
+            raise ValueError("Период не закрыт.")
+
+        now = now_iso()
+        cur.execute("""
+            UPDATE period_closures
+            SET status='REOPENED', reopened_by=?, reopened_at=?, reopen_reason=?
+            WHERE year=? AND month=?
+        """, (accountant_login, now, reason.strip(), year, month))
+        # выплаченное по закрытию остаётся в архиве, рабочий снимок освобождается для нового закрытия
+        cur.execute("SELECT COALESCE(MAX(revision), 0) + 1 FROM payroll_snapshot_archive WHERE year=? AND month=?",
+                    (year, month))
+        revision = cur.fetchone()[0]
+        cur.execute("""
+            INSERT INTO payroll_snapshot_archive(year, month, revision, closed_at, line_no, worker_id,
+                                                 tab_number, full_name, position, sick_days, base,
+                                                 allowances, gross, tax, net, content_hash, archived_at)
+            SELECT s.year, s.month, ?, c.closed_at, s.line_no, s.worker_id, s.tab_number,
+                   s.full_name, s.position, s.sick_days, s.base, s.allowances,
+                   s.gross, s.tax, s.net, c.content_hash, ?
+            FROM payroll_snapshot_lines s
+            JOIN period_closures c ON c.year = s.year AND c.month = s.month
+            WHERE s.year=? AND s.month=?
+        """, (revision, now, year, month))
+        cur.execute("DELETE FROM payroll_snapshot_lines WHERE year=? AND month=?", (year, month))
+        cur.execute("DELETE FROM ytd_totals WHERE year=? AND month>=?", (year, month))
+
+        cur.execute("""
+            INSERT INTO financial_audit(action_type, entity_id, worker_id, period_year, period_month,
+                                        accountant_login, action_time, details)
+            VALUES ('REOPEN_PERIOD', 0, 0, ?, ?, ?, ?, ?)
+        """, (year, month, accountant_login, now, f"{row[0]}: {reason.strip()}"))
+
+        conn.commit()
+
+def _snapshot_lines(cur, year, month):
+    cur.execute("""
+        SELECT worker_id, tab_number, full_name, position, sick_days, base, allowances, gross, tax, net
+        FROM payroll_snapshot_lines
+        WHERE year=? AND month=?
+        ORDER BY line_no
+    """, (year, month))
+    return cur.fetchall()
+
+@timed
+def period_lines(year, month):
+    # ([(worker_id, *строка ведомости)], (начислено, НДФЛ, к выдаче), закрыт ли период);
+    # для закрытого периода всё читается из снимка без пересчёта
+    with read_conn() as conn:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT total_gross, total_tax, total_net
+            FROM period_closures
+            WHERE year=? AND month=? AND status='CLOSED'
+        """, (year, month))
+        totals = cur.fetchone()
+        if totals:
+            return _snapshot_lines(cur, year, month), totals, True
+
+    lines = [(wid, *line) for wid, line in compute_lines(fetch_period_inputs(year, month), year, month).items()]
+    return lines, _line_totals(lines), False
+
+@timed
+def period_report(year, month):
+    lines, totals, closed = period_lines(year, month)
+    return [line[1:] for line in lines], totals, closed
+
+# -------- totals and rollups --------
+
+# столбец строки ведомости (с worker_id в начале) для группировки
+GROUP_COLUMNS = {"position": 3}
+
+def summarize_lines(lines, group_by="position"):
+    # за один проход: итоги (начислено, НДФЛ, к выдаче) и подытоги групп
+    # [(группа, человек, бол. дни, база, надбавки, начислено, НДФЛ, к выдаче)] по округлённым строкам
+    col = GROUP_COLUMNS[group_by]
+    groups = {}
+    for line in lines:
+        acc = groups.get(line[col])
+        if acc is None:
+            acc = groups[line[col]] = [0, 0, 0.0, 0.0, 0.0, 0.0, 0.0]
+        acc[0] += 1
+        for i in range(1, 7):
+            acc[i] += line[i + 3]
+
+    rollup = [(g, n, sick, *(round(v, 2) for v in sums))
+              for g, (n, sick, *sums) in sorted(groups.items())]
+    totals = tuple(round(sum(acc[i] for acc in groups.values()), 2) for i in (4, 5, 6))
+    return totals, rollup
+
+def _snapshot_rollup(cur, year, month, group_by):
+    column = {"position": "position"}[group_by]
+    cur.execute(f"""
+        SELECT {column}, COUNT(*), SUM(sick_days), ROUND(SUM(base), 2), ROUND(SUM(allowances), 2),
+               ROUND(SUM(gross), 2), ROUND(SUM(tax), 2), ROUND(SUM(net), 2)
+        FROM payroll_snapshot_lines
+        WHERE year=? AND month=?
+        GROUP BY {column}
+        ORDER BY {column}
+    """, (year, month))
+    return cur.fetchall()
+
+@timed
+def period_summary(year, month, group_by="position", should_stop=None):
+    # {"lines": [(worker_id, *строка)], "totals": (...), "groups": [...], "closed": bool};
+    # should_stop() == True прерывает расчёт открытого периода исключением Cancelled
+    with read_conn() as conn:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT total_gross, total_tax, total_net
+            FROM period_closures
+            WHERE year=? AND month=? AND status='CLOSED'
+        """, (year, month))
+        totals = cur.fetchone()
+        if totals:
+            return {
+                "lines": _snapshot_lines(cur, year, month),
+                "totals": totals,
+                "groups": _snapshot_rollup(cur, year, month, group_by),
+                "closed": True,
+            }
+
+    inputs = fetch_period_inputs(year, month, should_stop)
+    lines = [(wid, *line) for wid, line in compute_lines(inputs, year, month, should_stop=should_stop).items()]
+    totals, groups = summarize_lines(lines, group_by)
+    return {"lines": lines, "totals": totals, "groups": groups, "closed": False}
+
+# -------- range reports --------
+
+def range_months(year_from, month_from, year_to, month_to):
+    if not (1 <= month_from <= 12 and 1 <= month_to <= 12):
+        raise ValueError("Месяц 1..12.")
+    first, last = year_from * 12 + month_from - 1, year_to * 12 + month_to - 1
+    if first > last:
+        raise ValueError("Начало диапазона позже конца.")
+    return [divmod(i, 12) for i in range(first, last + 1)]
+
+def _range_scan(cur, sql, bounds):
+    # {(год, месяц): {worker_id: значение}} за диапазон одним проходом по индексу периода
+    cur.execute(sql, bounds)
+    result = {}
+    for year, month, wid, *values in cur.fetchall():
+        result.setdefault((year, month), {})[wid] = values[0] if len(values) == 1 else tuple(values)
+    return result
+
+@timed
+def range_report(year_from, month_from, year_to, month_to):
+    # {"months": [(год, месяц)], "lines": [(worker_id, год, месяц, *строка)],
+    #  "workers": [(worker_id, таб.№, ФИО, должность, бол., база, надб., начисл., НДФЛ, к выдаче)],
+    #  "totals": (бол., база, надб., начисл., НДФЛ, к выдаче), "closed": [(год, месяц)]}
+    months = [(y, m + 1) for y, m in range_months(year_from, month_from, year_to, month_to)]
+    bounds = (*months[0], *months[-1])
+    period = "(period_year, period_month) BETWEEN (?, ?) AND (?, ?)"
+
+    with read_conn() as conn:
+        cur = conn.cursor()
+        cur.execute("BEGIN")
+        workers = _fetch_workers(cur)
+        sick = _range_scan(cur, f"""
+            SELECT period_year, period_month, worker_id, SUM(days)
+            FROM sick_leaves WHERE {period}
+            GROUP BY period_year, period_month, worker_id
+        """, bounds)
+        allow = _range_scan(cur, f"""
+            SELECT period_year, period_month, worker_id, SUM(amount)
+            FROM allowances WHERE {period}
+            GROUP BY period_year, period_month, worker_id
+        """, bounds)
+        stored_ytd = _range_scan(cur, """
+            SELECT year, month, worker_id, ytd_gross, ytd_base, ytd_tax
+            FROM ytd_totals WHERE (year, month) BETWEEN (?, ?) AND (?, ?)
+        """, bounds)
+        cur.execute("""
+            SELECT year, month FROM period_closures
+            WHERE status='CLOSED' AND (year, month) BETWEEN (?, ?) AND (?, ?)
+        """, bounds)
+        closed = set(cur.fetchall())
+        snapshots = {}
+        if closed:
+            cur.execute("""
+                SELECT year, month, worker_id, tab_number, full_name, position,
+                       sick_days, base, allowances, gross, tax, net
+                FROM payroll_snapshot_lines
+                WHERE (year, month) BETWEEN (?, ?) AND (?, ?)
+                ORDER BY year, month, line_no
+            """, bounds)
+            for year, month, *line in cur.fetchall():
+                snapshots.setdefault((year, month), []).append(tuple(line))
+        tax_fns = {ym: rules_for_period(cur, *ym) for ym in months}
+        ytd = _ytd_state(cur, workers, *months[0])
+        cur.execute("COMMIT")
+
+    lines = []
+    per_worker = {}
+    for year, month in months:
+        if month == 1:
+            ytd = {}
+        _, _, days_in_month = month_bounds(year, month)
+        m_sick, m_allow = sick.get((year, month), {}), allow.get((year, month), {})
+        m_ytd = stored_ytd.get((year, month), {})
+        tax_fn = tax_fns[(year, month)]
+        is_open = (year, month) not in closed
+        computed = {}
+        # нарастающие итоги считаются всегда: от них зависит НДФЛ следующих месяцев
+        for w in workers:
+            wid = w.id
+            days, add = min(m_sick.get(wid, 0), days_in_month), float(m_allow.get(wid, 0.0))
+            prev = ytd.get(wid, YTD_ZERO)
+            base, gross, tax, tax_base = salary_amounts(w, days_in_month, days, add, tax_fn, prev)
+            if is_open:
+                computed[wid] = (w.tab_number, w.full_name, w.position, days,
+                                 round(base, 2), round(add, 2),
+                                 round(gross, 2), round(tax, 2), round(gross - tax, 2))
+            stored = m_ytd.get(wid)
+            ytd[wid] = stored if stored is not None else (prev[0] + gross, prev[1] + tax_base, prev[2] + tax)
+
+        if is_open:
+            month_lines = [(wid, *line) for wid, line in computed.items()]
+        else:
+            month_lines = snapshots.get((year, month), [])
+        rows_processed("range_report", len(month_lines))
+
+        for wid, tab, name, pos, *amounts in month_lines:
+            lines.append((wid, year, month, tab, name, pos, *amounts))
+            acc = per_worker.get(wid)
+            if acc is None:
+                per_worker[wid] = [tab, name, pos, *amounts]
+            else:
+                acc[0:3] = tab, name, pos
+                for i, v in enumerate(amounts, start=3):
+                    acc[i] += v
+
+    worker_totals = [(wid, tab, name, pos, sick_days, *(round(v, 2) for v in sums))
+                     for wid, (tab, name, pos, sick_days, *sums) in per_worker.items()]
+    totals = tuple(round(sum(w[i] for w in worker_totals), 2) for i in range(4, 10))
+    return {"months": months, "lines": lines, "workers": worker_totals, "totals": totals,
+            "closed": sorted(closed)}
+
+@timed
+def fetch_worker_pay_history(worker_id, limit=12):
+    # последние limit закрытых периодов работника из снимков, по индексу (worker_id, year, month)
+    with read_conn() as conn:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT year, month, sick_days, base, allowances, gross, tax, net
+            FROM payroll_snapshot_lines
+            WHERE worker_id=?
+            ORDER BY year DESC, month DESC
+            LIMIT ?
+        """, (worker_id, limit))
+        return cur.fetchall()
+
+@timed
+def verify_snapshot(year, month):
+    with read_conn() as conn:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT content_hash FROM period_closures
+            WHERE year=? AND month=? AND status='CLOSED'
+        """, (year, month))
+        row = cur.fetchone()
+        if not row:
+            raise ValueError("Период не закрыт.")
+        lines = [tuple(line) for line in _snapshot_lines(cur, year, month)]
+    return _snapshot_hash(lines) == row[0]
+
+# -------- period diff --------
+# Сравнение двух ведомостей: строки обоих периодов (снимок для закрытого, иначе расчёт или
+# готовый результат предрасчёта) соединяются по worker_id за один проход.
+
+DIFF_COLUMNS = ("sick", "base", "add", "gross", "tax", "net")
+DIFF_STATUS = {"new": "Новый", "gone": "Выбыл", "changed": "Изменён", "same": "Без изменений"}
+
+def diff_lines(lines_before, lines_after):
+    # [(worker_id, таб.№, ФИО, должность, статус, было | None, стало | None, разница)],
+    # было/стало/разница - кортежи по DIFF_COLUMNS
+    before = {line[0]: line for line in lines_before}
+    pop = before.pop
+    rows = []
+    for line in lines_after:
+        after = tuple(line[4:])
+        old = pop(line[0], None)
+        if old is None:
+            rows.append((*line[:4], "new", None, after, after))
+            continue
+        prev = tuple(old[4:])
+        if prev == after:
+            rows.append((*line[:4], "same", prev, after, (0,) * len(after)))
+            continue
+        delta = tuple(round(a - b, 2) for a, b in zip(after, prev))
+        rows.append((*line[:4], "changed" if any(delta) else "same", prev, after, delta))
+    for line in before.values():
+        prev = tuple(line[4:])
+        rows.append((*line[:4], "gone", prev, None, tuple(-v for v in prev)))
+    return rows
+
+def diff_percent(row, i):
+    # изменение столбца i в процентах от прежнего значения; None - было 0 или строки не было
+    prev = row[5]
+    if not prev or not prev[i]:
+        return None
+    return round(row[7][i] / prev[i] * 100, 2)
+
+@timed
+def period_diff(year_from, month_from, year_to, month_to, column="net", top=20, summary=None):
+    # ведомость (year_to, month_to) против (year_from, month_from):
+    # {"rows": diff_lines(...), "new": [...], "gone": [...], "by_abs": [...], "by_pct": [...],
+    #  "totals": (было, стало, разница) по (начислено, НДФЛ, к выдаче), "closed": (bool, bool)}
+    # by_abs/by_pct - top изменённых строк по модулю изменения column и по модулю изменения в %;
+    # summary(год, месяц) - источник строк, по умолчанию period_summary (GUI передаёт кэш предрасчёта)
+    if column not in DIFF_COLUMNS:
+        raise ValueError(f"Неизвестный столбец: {column}.")
+    if not (1 <= month_from <= 12 and 1 <= month_to <= 12):
+        raise ValueError("Месяц 1..12.")
+    summary = summary or period_summary
+    before, after = summary(year_from, month_from), summary(year_to, month_to)
+    rows = diff_lines(before["lines"], after["lines"])
+    rows_processed("period_diff", len(rows))
+
+    i = DIFF_COLUMNS.index(column)
+    changed = [r for r in rows if r[4] == "changed"]
+    by_pct = [(abs(p), r) for r in changed if (p := diff_percent(r, i)) is not None]
+    totals = (before["totals"], after["totals"],
+              tuple(round(a - b, 2) for a, b in zip(after["totals"], before["totals"])))
+    return {
+        "rows": rows,
+        "new": [r for r in rows if r[4] == "new"],
+        "gone": [r for r in rows if r[4] == "gone"],
+        "by_abs": heapq.nlargest(top, changed, key=lambda r: abs(r[7][i])),
+        "by_pct": [r for _, r in heapq.nlargest(top, by_pct, key=lambda item: item[0])],
+        "totals": totals,
+        "closed": (before["closed"], after["closed"]),
+    }
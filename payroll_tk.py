@@ -4,107 +4,21 @@ import calendar
 import tkinter as tk
 from tkinter import ttk, messagebox
 
-DB_NAME = "payroll_roles.db"
+import db
+from db import get_conn
+# больничные разбиваются по месяцам с посчитанными днями (sick_leaves.days), запись в financial_audit
+# идёт через цепочку хешей - только через payroll
+from payroll import add_sick_leave, add_allowance, sick_days_in_month
+
 TAX_RATE = 0.13
 ALLOWANCE_TYPES = ("Премия", "Стаж", "Квалификация")
 
 
 # -------------------- DB --------------------
 
-def get_conn():
-    return sqlite3.connect(DB_NAME)
-
-
 def init_db():
-    with get_conn() as conn:
-        cur = conn.cursor()
-
-        cur.execute("""
-        CREATE TABLE IF NOT EXISTS accountants (
-            login TEXT PRIMARY KEY,
-            password TEXT NOT NULL
-        )
-        """)
-
-        cur.execute("""
-        CREATE TABLE IF NOT EXISTS workers (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            tab_number TEXT UNIQUE NOT NULL,   -- табельный номер
-            full_name TEXT NOT NULL,
-            position TEXT NOT NULL,
-            salary REAL NOT NULL CHECK(salary >= 0),
-            marital_status TEXT,
-            children_count INTEGER DEFAULT 0 CHECK(children_count >= 0),
-            password TEXT NOT NULL DEFAULT '1234'
-        )
-        """)
-
-        cur.execute("""
-        CREATE TABLE IF NOT EXISTS sick_leaves (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            worker_id INTEGER NOT NULL,
-            date_start TEXT NOT NULL,
-            date_end TEXT NOT NULL,
-            period_year INTEGER NOT NULL,
-            period_month INTEGER NOT NULL,
-            created_by_accountant TEXT NOT NULL,
-            created_at TEXT NOT NULL,
-            FOREIGN KEY(worker_id) REFERENCES workers(id),
-            FOREIGN KEY(created_by_accountant) REFERENCES accountants(login)
-        )
-        """)
-
-        cur.execute("""
-        CREATE TABLE IF NOT EXISTS allowances (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            worker_id INTEGER NOT NULL,
-            allowance_type TEXT NOT NULL,
-            amount REAL NOT NULL CHECK(amount >= 0),
-            period_year INTEGER NOT NULL,
-            period_month INTEGER NOT NULL,
-            created_by_accountant TEXT NOT NULL,
-            created_at TEXT NOT NULL,
-            FOREIGN KEY(worker_id) REFERENCES workers(id),
-            FOREIGN KEY(created_by_accountant) REFERENCES accountants(login)
-        )
-        """)
-
-        cur.execute("""
-        CREATE TABLE IF NOT EXISTS personal_change_requests (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            worker_id INTEGER NOT NULL,
-            field_name TEXT NOT NULL,
-            new_value TEXT NOT NULL,
-            request_date TEXT NOT NULL,
-            status TEXT NOT NULL DEFAULT 'PENDING', -- PENDING/APPROVED/REJECTED
-            processed_by TEXT,
-            processed_at TEXT,
-            FOREIGN KEY(worker_id) REFERENCES workers(id),
-            FOREIGN KEY(processed_by) REFERENCES accountants(login)
-        )
-        """)
-
-        cur.execute("""
-        CREATE TABLE IF NOT EXISTS financial_audit (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            action_type TEXT NOT NULL, -- ADD_SICK / ADD_ALLOW
-            entity_id INTEGER NOT NULL,
-            worker_id INTEGER NOT NULL,
-            period_year INTEGER NOT NULL,
-            period_month INTEGER NOT NULL,
-            accountant_login TEXT NOT NULL,
-            action_time TEXT NOT NULL,
-            details TEXT,
-            FOREIGN KEY(accountant_login) REFERENCES accountants(login)
-        )
-        """)
-
-        # тестовый бухгалтер
-        cur.execute("SELECT COUNT(*) FROM accountants")
-        if cur.fetchone()[0] == 0:
-            cur.execute("INSERT INTO accountants(login, password) VALUES(?, ?)", ("admin", "admin"))
-
-        conn.commit()
+    # схема и миграции общие с основным приложением: файл БД у них один
+    db.init_db()
 
 
 # -------------------- Helpers --------------------
@@ -124,14 +38,6 @@ def month_bounds(year: int, month: int):
     return start, end, days
 
 
-def overlap_days(a_start: date, a_end: date, b_start: date, b_end: date) -> int:
-    start = max(a_start, b_start)
-    end = min(a_end, b_end)
-    if start > end:
-        return 0
-    return (end - start).days + 1
-
-
 # -------------------- Data access --------------------
 
 def auth_accountant(login, password):
@@ -259,75 +165,6 @@ def reject_request(req_id, accountant_login):
         conn.commit()
 
 
-def add_sick_leave(worker_id, d_start, d_end, year, month, accountant_login):
-    if d_end < d_start:
-        raise ValueError("Дата выздоровления раньше даты заболевания.")
-
-    with get_conn() as conn:
-        cur = conn.cursor()
-        cur.execute("""
-            INSERT INTO sick_leaves(worker_id, date_start, date_end, period_year, period_month, 
-                                    created_by_accountant, created_at)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        """, (worker_id, d_start.isoformat(), d_end.isoformat(), year, month, accountant_login, now_iso()))
-        sick_id = cur.lastrowid
-
-        cur.execute("""
-            INSERT INTO financial_audit(action_type, entity_id, worker_id, period_year, period_month,
-                                        accountant_login, action_time, details)
-            VALUES ('ADD_SICK', ?, ?, ?, ?, ?, ?, ?)
-        """, (sick_id, worker_id, year, month, accountant_login, now_iso(),
-              f"{d_start.isoformat()}..{d_end.isoformat()}"))
-
-        conn.commit()
-
-
-def add_allowance(worker_id, a_type, amount, year, month, accountant_login):
-    if a_type not in ALLOWANCE_TYPES:
-        raise ValueError("Неизвестный тип надбавки.")
-    if amount < 0:
-        raise ValueError("Сумма не может быть отрицательной.")
-
-    with get_conn() as conn:
-        cur = conn.cursor()
-        cur.execute("""
-            INSERT INTO allowances(worker_id, allowance_type, amount, period_year, period_month, 
-                                   created_by_accountant, created_at)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        """, (worker_id, a_type, amount, year, month, accountant_login, now_iso()))
-        allow_id = cur.lastrowid
-
-        cur.execute("""
-            INSERT INTO financial_audit(action_type, entity_id, worker_id, period_year, period_month,
-                                        accountant_login, action_time, details)
-            VALUES ('ADD_ALLOW', ?, ?, ?, ?, ?, ?, ?)
-        """, (allow_id, worker_id, year, month, accountant_login, now_iso(),
-              f"{a_type}: {amount}"))
-
-        conn.commit()
-
-
-def sick_days_in_month(worker_id, year, month):
-    m_start, m_end, days_in_month = month_bounds(year, month)
-
-    with get_conn() as conn:
-        cur = conn.cursor()
-        cur.execute("""
-            SELECT date_start, date_end
-            FROM sick_leaves
-            WHERE worker_id=? AND period_year=? AND period_month=?
-        """, (worker_id, year, month))
-        rows = cur.fetchall()
-
-    total = 0
-    for ds, de in rows:
-        s = parse_date(ds)
-        e = parse_date(de)
-        total += overlap_days(s, e, m_start, m_end)
-
-    return max(0, min(total, days_in_month))
-
-
 def allowances_sum(worker_id, year, month):
     with get_conn() as conn:
         cur = conn.cursor()
@@ -652,13 +489,11 @@ class AccountantApp(tk.Tk):
             wid = self.fin_selected_worker_id()
             if not wid:
                 raise ValueError("Нет выбранного работника.")
-            year = int(self.fin_year.get().strip())
-            month = int(self.fin_month.get().strip())
 
             d1 = parse_date(self.v_s1.get())
             d2 = parse_date(self.v_s2.get())
 
-            add_sick_leave(wid, d1, d2, year, month, self.login)
+            add_sick_leave(wid, d1, d2, self.login)
             self.v_s1.set(""); self.v_s2.set("")
             messagebox.showinfo("Готово", "Больничный добавлен и зафиксирован.")
         except Exception as e:
@@ -0,0 +1,124 @@
+import os
+import zipfile
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from html import escape
+
+from db import read_conn
+from payroll import period_lines
+
+# -------- bulk data --------
+
+def fetch_payslip_data(year, month):
+    # строки ведомости + детализация надбавок и больничных: по одному запросу на таблицу
+    lines, _, closed = period_lines(year, month)
+    allowances = defaultdict(list)
+    sick = defaultdict(list)
+    with read_conn() as conn:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT worker_id, allowance_type, amount
+            FROM allowances
+            WHERE period_year=? AND period_month=?
+            ORDER BY worker_id, id
+        """, (year, month))
+        for wid, a_type, amount in cur:
+            allowances[wid].append((a_type, amount))
+        cur.execute("""
+            SELECT worker_id, date_start, date_end
+            FROM sick_leaves
+            WHERE period_year=? AND period_month=?
+            ORDER BY worker_id, date_start
+        """, (year, month))
+        for wid, ds, de in cur:
+            sick[wid].append((ds, de))
+
+    return [(year, month, closed, line, allowances.get(line[0], []), sick.get(line[0], []))
+            for line in lines]
+
+# -------- rendering --------
+
+def render_text(item):
+    year, month, closed, line, allowances, sick = item
+    _, tab, name, pos, sick_days, base, add, gross, tax, net = line
+    out = [
+        f"РАСЧЁТНЫЙ ЛИСТОК за {month:02d}.{year}" + ("" if closed else " (предварительный)"),
+        f"Табельный №: {tab}",
+        f"Ф.И.О.: {name}",
+        f"Должность: {pos}",
+        "",
+        f"Больничные дни: {sick_days}",
+    ]
+    out += [f"  {ds} - {de}" for ds, de in sick]
+    out += ["", f"{'Оплата по окладу':<28}{base:>14.2f}"]
+    out += [f"{'Надбавка: ' + a_type:<28}{amount:>14.2f}" for a_type, amount in allowances]
+    out += [
+        f"{'Итого надбавок':<28}{add:>14.2f}",
+        f"{'Начислено':<28}{gross:>14.2f}",
+        f"{'НДФЛ':<28}{tax:>14.2f}",
+        f"{'К выдаче':<28}{net:>14.2f}",
+    ]
+    return "\n".join(out) + "\n"
+
+def render_html(item):
+    year, month, closed, line, allowances, sick = item
+    _, tab, name, pos, sick_days, base, add, gross, tax, net = line
+    rows = [("Оплата по окладу", base)]
+    rows += [(f"Надбавка: {a_type}", amount) for a_type, amount in allowances]
+    rows += [("Итого надбавок", add), ("Начислено", gross), ("НДФЛ", tax), ("К выдаче", net)]
+    sick_html = "".join(f"<li>{escape(ds)} &ndash; {escape(de)}</li>" for ds, de in sick)
+    body = "".join(f"<tr><td>{escape(t)}</td><td align=\"right\">{v:.2f}</td></tr>" for t, v in rows)
+    title = f"Расчётный листок за {month:02d}.{year}" + ("" if closed else " (предварительный)")
+    return (
+        "<!DOCTYPE html><html><head><meta charset=\"utf-8\">"
+        f"<title>{escape(title)}</title></head><body>"
+        f"<h2>{escape(title)}</h2>"
+        f"<p>Табельный №: {escape(tab)}<br>Ф.И.О.: {escape(name)}<br>Должность: {escape(pos)}</p>"
+        f"<p>Больничные дни: {sick_days}</p>"
+        + (f"<ul>{sick_html}</ul>" if sick_html else "")
+        + f"<table>{body}</table></body></html>\n"
+    )
+
+def render_chunk(items):
+    # выполняется в дочернем процессе
+    result = []
+    for item in items:
+        tab = item[3][1]
+        base_name = f"{item[0]}-{item[1]:02d}_{tab}"
+        result.append((base_name, render_text(item).encode("utf-8"), render_html(item).encode("utf-8")))
+    return result
+
+# -------- batch job --------
+
+def _chunks(items, size):
+    # пачки нарезаются по мере отправки; строки отправленной пачки в items сразу освобождаются
+    for i in range(0, len(items), size):
+        chunk = items[i:i + size]
+        items[i:i + size] = [None] * len(chunk)
+        yield chunk
+
+def generate_payslips(year, month, out_path, processes=None, chunk_size=500):
+    todo = _chunks(fetch_payslip_data(year, month), chunk_size)
+    processes = processes or os.cpu_count() or 1
+    # не больше двух пачек на процесс в полёте: готовые листки сразу уходят в архив
+    window = processes * 2
+
+    written = 0
+    with zipfile.ZipFile(out_path, "w", compression=zipfile.ZIP_DEFLATED) as zf, \
+            ProcessPoolExecutor(max_workers=processes) as pool:
+        pending = set()
+        while True:
+            while len(pending) < window:
+                chunk = next(todo, None)
+                if chunk is None:
+                    break
+                pending.add(pool.submit(render_chunk, chunk))
+            if not pending:
+                break
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                for base_name, text, html in future.result():
+                    zf.writestr(f"txt/{base_name}.txt", text)
+                    zf.writestr(f"html/{base_name}.html", html)
+                    written += 1
+    return written
@@ -0,0 +1,215 @@
+import os
+import re
+import shutil
+import tempfile
+from datetime import date
+
+import db
+
+# Проверка планов запросов: на синтетической БД реалистичного размера выполняются операции
+# auth/payroll/db (и модулей поверх них), все SQL-операторы собираются через trace-хук
+# соединений get_conn, и для каждого уникального оператора строится EXPLAIN QUERY PLAN.
+# Ошибка - полный SCAN таблицы, в которой строк больше порога, если он не в ALLOWED_SCANS.
+# Операторы внутри триггеров в EXPLAIN QUERY PLAN не видны и здесь не проверяются.
+
+# (таблица, фрагмент SQL): полный проход ожидаем - оператор и так читает всю таблицу
+ALLOWED_SCANS = (
+    ("workers", "FROM workers\n        ORDER BY full_name"),   # _fetch_workers: все работники
+    ("workers", "JOIN workers w ON w.position = r.position"),  # развёртка шаблонов на должность
+    ("financial_audit", "FROM financial_audit ORDER BY id DESC LIMIT"),  # query_audit без фильтров: последние записи
+)
+
+_SKIP = ("BEGIN", "COMMIT", "ROLLBACK", "END", "PRAGMA", "CREATE", "DROP", "ALTER", "ANALYZE",
+         "VACUUM", "SAVEPOINT", "RELEASE", "--")
+
+_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+# SQLite до 3.36 пишет "SCAN TABLE workers AS w", новые - "SCAN w"
+_SCAN = re.compile(r"^SCAN (?:TABLE )?(\w+)")
+_SEARCH = re.compile(r"^SEARCH (?:TABLE )?(\w+)")
+_ALIAS = re.compile(r"\b(?:FROM|JOIN)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?", re.IGNORECASE)
+_KEYWORDS = {"WHERE", "JOIN", "ON", "LEFT", "INNER", "CROSS", "GROUP", "ORDER", "LIMIT", "USING",
+             "UNION", "SET", "VALUES", "AND", "OR"}
+
+def normalize(sql):
+    return " ".join(_LITERAL.sub("?", sql).split())
+
+def _allowed(table, sql):
+    text = normalize(sql)
+    return any(t == table and normalize(fragment) in text for t, fragment in ALLOWED_SCANS)
+
+def _aliases(sql):
+    result = {}
+    for table, alias in _ALIAS.findall(sql):
+        result[table] = table
+        if alias and alias.upper() not in _KEYWORDS:
+            result[alias] = table
+    return result
+
+# -------- workload --------
+
+def exercise(workers):
+    # вызывает операции так, чтобы прошли все основные ветки запросов
+    from auth import auth_accountant, auth_worker
+    from audit import verify_audit_chain, query_audit
+    from payroll import (
+        fetch_workers, fetch_worker, insert_worker, update_worker_field,
+        create_personal_request, fetch_pending_requests, approve_request, reject_request,
+        fetch_worker_requests, add_sick_leave, add_allowance, sick_days_in_month, sick_days_for_period,
+        working_days_in_month, allowances_sum, allowances_for_period, calc_salary_row, calc_payroll,
+        finalize_ytd, invalidate_ytd, fetch_ytd, check_ytd, period_status, period_lines,
+        period_summary, range_report, fetch_worker_pay_history, verify_snapshot,
+        close_period, reopen_period,
+    )
+    from recurring import add_recurring_allowance, materialize_recurring, fetch_recurring_allowances
+    from tax_rules import fetch_tax_rules
+
+    today = date.today()
+    y, m = today.year, today.month
+    py, pm = divmod(y * 12 + m - 2, 12)
+    pm += 1
+    wid = workers // 2
+
+    auth_accountant("admin", "admin")
+    auth_worker(f"T{wid:06d}", "1234")
+    table = fetch_workers()
+    row = fetch_worker(wid)
+    insert_worker("PLAN-1", "Проверка Плана", "Инженер", 50_000.0, "Холост", 0)
+    update_worker_field(wid, "children_count", 2)
+
+    create_personal_request(wid, "children_count", 3)
+    create_personal_request(wid, "marital_status", "Женат")
+    pending = fetch_pending_requests()
+    approve_request(pending[0][0], "admin")
+    reject_request(pending[1][0], "admin")
+    fetch_worker_requests(wid)
+
+    add_sick_leave(wid, date(y, m, 1), date(y, m, 3), "admin")
+    add_allowance(wid, "Премия", 1000.0, y, m, "admin")
+    sick_days_in_month(wid, y, m)
+    sick_days_for_period(y, m)
+    working_days_in_month(y, m)
+    allowances_sum(wid, y, m)
+    allowances_for_period(y, m)
+    calc_salary_row(row, y, m)
+    calc_payroll(y, m)
+
+    finalize_ytd(py, pm)
+    fetch_ytd(wid, py, pm)
+    check_ytd(py)
+    invalidate_ytd(py, pm, wid)
+
+    period_status(py, pm)
+    period_lines(py, pm)
+    period_summary(py, pm)
+    period_summary(y, m)
+    range_report(py, 1, y, m)
+    close_period(y, m, "admin")
+    period_summary(y, m)
+    verify_snapshot(y, m)
+    fetch_worker_pay_history(wid)
+    reopen_period(y, m, "admin", "проверка планов")
+
+    add_recurring_allowance("Стаж", 2000.0, date(y, 1, 1), "admin", position="Инженер")
+    add_recurring_allowance("Квалификация", 500.0, date(y, 1, 1), "admin", worker_id=wid)
+    materialize_recurring(y, m, "admin")
+    fetch_recurring_allowances(today)
+    fetch_tax_rules()
+    verify_audit_chain()
+    query_audit()
+    query_audit(allowance_type="Премия", year=py, min_amount=1000.0)
+    query_audit(min_amount=10_000.0)
+    query_audit(sick_from=date(y, m, 1), sick_to=date(y, m, 2))
+    query_audit(worker_id=wid)
+    query_audit(action_type="CLOSE_PERIOD", year=py, month=pm)
+    return len(table)
+
+# -------- check --------
+
+def explain(conn, sql):
+    # [(id, parent, detail)]
+    return [(r[0], r[1], r[3]) for r in conn.execute(f"EXPLAIN QUERY PLAN {sql}").fetchall()]
+
+def plan_tree(plan):
+    depth = {0: -1}
+    lines = []
+    for node, parent, detail in plan:
+        depth[node] = depth.get(parent, -1) + 1
+        lines.append("  " * depth[node] + detail)
+    return lines
+
+def check_plans(workers=20_000, min_rows=1000, history_months=24, closed_months=18, analyze=True,
+                work_dir=None):
+    # [{"sql", "plan", "problems": [(таблица, строк, деталь)]}] по уникальным операторам.
+    # analyze=True - планы как в рабочей БД после ночного ANALYZE (maintenance.optimize);
+    # для них история должна охватывать несколько лет и много закрытых периодов, иначе фильтр
+    # по году или периоду выбирает большую часть таблицы и полный проход действительно дешевле
+    from loadtest import seed_database
+
+    tmp = work_dir or tempfile.mkdtemp(prefix="payroll_plan_")
+    saved_name = db.DB_NAME
+    db.DB_NAME = os.path.join(tmp, "plan.db")
+    statements = {}
+    try:
+        if os.path.exists(db.DB_NAME):
+            os.remove(db.DB_NAME)
+        seed_database(workers, history_months=history_months, closed_months=closed_months)
+        if analyze:
+            with db.get_conn() as conn:
+                conn.execute("ANALYZE")
+                conn.commit()
+
+        def collect(sql):
+            if sql.lstrip().upper().startswith(_SKIP):
+                return
+            statements.setdefault(normalize(sql), sql)
+
+        db.set_sql_trace(collect)
+        try:
+            exercise(workers)
+        finally:
+            db.set_sql_trace(None)
+
+        conn = db.get_conn()
+        sizes = {name: conn.execute(f'SELECT COUNT(*) FROM "{name}"').fetchone()[0]
+                 for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+        results = []
+        for sql in statements.values():
+            plan = explain(conn, sql)
+            aliases = _aliases(sql)
+            problems = []
+            checked = 0
+            for _, _, detail in plan:
+                match = _SCAN.match(detail) or _SEARCH.match(detail)
+                if not match:
+                    continue
+                table = aliases.get(match.group(1), match.group(1))
+                rows = sizes.get(table)
+                if rows is None:
+                    continue
+                checked += 1
+                if match.re is _SCAN and rows > min_rows and not _allowed(table, sql):
+                    problems.append((table, rows, detail))
+            results.append({"sql": sql, "plan": plan, "problems": problems, "checked": checked})
+        conn.close()
+        # ни одной распознанной строки плана - значит, формат вывода не понят и проверка пуста
+        if statements and not any(r["checked"] for r in results):
+            raise ValueError("Не распознана ни одна строка EXPLAIN QUERY PLAN.")
+        return results
+    finally:
+        db.DB_NAME = saved_name
+        if work_dir is None:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+def format_results(results, verbose=False):
+    lines = []
+    for r in results:
+        if not (verbose or r["problems"]):
+            continue
+        lines.append("FAIL" if r["problems"] else "ok")
+        lines.append("  " + " ".join(r["sql"].split()))
+        lines.extend("    " + line for line in plan_tree(r["plan"]))
+        for table, rows, detail in r["problems"]:
+            lines.append(f"  !! полный проход {table} ({rows} строк): {detail}")
+    failed = sum(1 for r in results if r["problems"])
+    lines.append(f"Операторов: {len(results)}, с полным проходом больших таблиц: {failed}")
+    return "\n".join(lines)
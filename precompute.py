@@ -0,0 +1,175 @@
+import threading
+import time
+from datetime import date
+
+from config import PRECOMPUTE_QUIET_MS, PRECOMPUTE_INTERVAL
+from db import get_conn, data_fingerprint
+from payroll import period_summary, Cancelled
+
+# Предрасчёт ведомости текущего и следующего периода. Результаты period_summary хранятся в памяти
+# вместе с отпечатком данных (db.data_fingerprint), на котором они посчитаны; отпечаток
+# перечитывается только после смены PRAGMA data_version. Пересчёт идёт через read_conn -
+# только чтение, блокировок записи он не берёт. В GUI пересчёт запускается из after_idle
+# в фоновом потоке, без GUI - по таймеру (start_background).
+
+def default_periods():
+    today = date.today()
+    year, month = divmod(today.year * 12 + today.month, 12)
+    return [(today.year, today.month), (year, month + 1)]
+
+class PeriodCache:
+    def __init__(self, periods=default_periods, keep=2):
+        # keep - сколько ещё периодов (кроме periods()) хранить после запросов пользователя
+        self.periods = periods
+        self.keep = keep
+        self.lock = threading.Lock()
+        self.conn = get_conn(readonly=True, check_same_thread=False)
+        self.data_version = None
+        self.fp = None
+        self.entries = {}  # (год, месяц) -> (отпечаток, summary)
+        self.running = {}  # (год, месяц) -> Event потока, который считает период
+
+    def fingerprint(self):
+        with self.lock:
+            version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+            if version != self.data_version:
+                self.data_version = version
+                self.fp = data_fingerprint(self.conn)
+            return self.fp
+
+    def get(self, year, month):
+        # актуальный готовый результат или None
+        fp = self.fingerprint()
+        with self.lock:
+            entry = self.entries.get((year, month))
+        return entry[1] if entry and entry[0] == fp else None
+
+    def summary(self, year, month, should_stop=None):
+        # как payroll.period_summary; если этот период сейчас считается в другом потоке - ждёт его.
+        # should_stop прерывает расчёт между пачками работников - тогда None и в кэш ничего не пишется
+        key = (year, month)
+        while True:
+            fp = self.fingerprint()
+            with self.lock:
+                entry = self.entries.get(key)
+                if entry and entry[0] == fp:
+                    return entry[1]
+                done = self.running.get(key)
+                if done is None:
+                    done = self.running[key] = threading.Event()
+                    break
+            done.wait()
+        try:
+            # отпечаток прочитан до расчёта: изменение во время расчёта даст лишний пересчёт, но не устаревший результат
+            result = period_summary(year, month, should_stop=should_stop)
+        except Cancelled:
+            return None
+        else:
+            self._store(key, fp, result)
+            return result
+        finally:
+            with self.lock:
+                del self.running[key]
+            done.set()
+
+    def _store(self, key, fp, result):
+        wanted = set(self.periods())
+        with self.lock:
+            self.entries.pop(key, None)
+            self.entries[key] = (fp, result)
+            extra = [k for k in self.entries if k not in wanted]
+            for k in extra[:max(0, len(extra) - self.keep)]:
+                del self.entries[k]
+
+    def stale(self):
+        # периоды из periods() без актуального результата, которые никто сейчас не считает
+        fp = self.fingerprint()
+        with self.lock:
+            return [p for p in self.periods()
+                    if p not in self.running and self.entries.get(p, (None,))[0] != fp]
+
+    def refresh(self, should_stop=None):
+        # пересчитать устаревшие периоды по одному; число пересчитанных до остановки
+        count = 0
+        for year, month in self.stale():
+            if self.summary(year, month, should_stop) is None:
+                break
+            count += 1
+        return count
+
+    def close(self):
+        self.conn.close()
+
+_shared = None
+_shared_lock = threading.Lock()
+
+def shared_cache():
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = PeriodCache()
+        return _shared
+
+# -------- schedulers --------
+
+class IdleScheduler:
+    # Tk: schedule() после запуска окна и на каждом опросе изменений; расчёт начинается из
+    # after_idle, только если пользователь quiet_ms ничего не нажимал, и при первом его действии
+    # прерывается на ближайшей проверке внутри расчёта (недосчитанное повторит следующий schedule())
+    def __init__(self, widget, cache, quiet_ms=PRECOMPUTE_QUIET_MS):
+        self.widget = widget
+        self.cache = cache
+        self.quiet_ms = quiet_ms
+        self.last_input = time.monotonic()
+        self.pending = None
+        self.thread = None
+        for sequence in ("<Any-KeyPress>", "<Any-ButtonPress>"):
+            widget.bind_all(sequence, self.on_input, add="+")
+
+    def on_input(self, _event=None):
+        self.last_input = time.monotonic()
+
+    def user_active(self):
+        return (time.monotonic() - self.last_input) * 1000 < self.quiet_ms
+
+    def schedule(self):
+        if self.pending is None:
+            self.pending = self.widget.after_idle(self.run)
+
+    def run(self):
+        self.pending = None
+        if self.thread is not None and self.thread.is_alive():
+            return
+        if self.user_active():
+            self.pending = self.widget.after(self.quiet_ms, self.run)
+            return
+        try:
+            if not self.cache.stale():
+                return
+        except Exception:
+            return
+        self.thread = threading.Thread(target=self.work, name="payroll-precompute", daemon=True)
+        self.thread.start()
+
+    def work(self):
+        try:
+            self.cache.refresh(self.user_active)
+        except Exception:
+            pass
+
+def start_background(cache=None, interval=PRECOMPUTE_INTERVAL):
+    # без GUI: пересчёт сразу и затем раз в interval секунд; set() у результата - остановить
+    cache = cache or shared_cache()
+    stop = threading.Event()
+
+    def loop():
+        while True:
+            try:
+                cache.refresh(stop.is_set)
+            except Exception:
+                pass
+            if stop.wait(interval):
+                break
+
+    threading.Thread(target=loop, name="payroll-precompute", daemon=True).start()
+    return stop
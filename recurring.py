@@ -0,0 +1,117 @@
+from db import get_conn, read_conn
+from metrics import timed, rows_processed
+from payroll import check_allowance, month_bounds, now_iso
+
+# Постоянные надбавки (стаж, квалификация): шаблон на работника или на должность с диапазоном
+# дат действия. При открытии периода шаблоны разворачиваются в allowances и financial_audit
+# двумя INSERT ... SELECT; повторный запуск ничего не добавляет (recurring_id + уникальный индекс).
+# Шаблон работника заменяет шаблон его должности того же типа.
+
+_ACTIVE = "{r}.valid_from <= :end AND ({r}.valid_to IS NULL OR {r}.valid_to >= :start)"
+
+_MATERIALIZE_SQL = f"""
+    INSERT INTO allowances(worker_id, allowance_type, amount, period_year, period_month,
+                           created_by_accountant, created_at, recurring_id)
+    SELECT worker_id, allowance_type, amount, :year, :month, :login, :now, recurring_id
+    FROM (
+        SELECT w.id AS worker_id, r.allowance_type, r.amount, r.id AS recurring_id
+        FROM recurring_allowances r
+        JOIN workers w ON w.id = r.worker_id
+        WHERE r.worker_id IS NOT NULL AND {_ACTIVE.format(r="r")}
+        UNION ALL
+        SELECT w.id, r.allowance_type, r.amount, r.id
+        FROM recurring_allowances r
+        JOIN workers w ON w.position = r.position
+        WHERE r.position IS NOT NULL AND {_ACTIVE.format(r="r")}
+          AND NOT EXISTS (
+              SELECT 1 FROM recurring_allowances o
+              WHERE o.worker_id = w.id AND o.allowance_type = r.allowance_type AND {_ACTIVE.format(r="o")}
+          )
+    ) t
+    WHERE NOT EXISTS (
+        SELECT 1 FROM allowances a
+        WHERE a.recurring_id = t.recurring_id AND a.period_year = :year AND a.period_month = :month
+          AND a.worker_id = t.worker_id
+    )
+    ORDER BY worker_id, recurring_id
+"""
+
+@timed
+def add_recurring_allowance(a_type, amount, valid_from, accountant_login,
+                            worker_id=None, position=None, valid_to=None):
+    check_allowance(a_type, amount)
+    if (worker_id is None) == (not position):
+        raise ValueError("Укажите либо работника, либо должность.")
+    if valid_to is not None and valid_to < valid_from:
+        raise ValueError("Дата окончания раньше даты начала.")
+
+    with get_conn() as conn:
+        cur = conn.cursor()
+        cur.execute("""
+            INSERT INTO recurring_allowances(worker_id, position, allowance_type, amount,
+                                             valid_from, valid_to, created_by_accountant, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, (worker_id, position or None, a_type, amount, valid_from.isoformat(),
+              valid_to.isoformat() if valid_to else None, accountant_login, now_iso()))
+        conn.commit()
+        return cur.lastrowid
+
+@timed
+def end_recurring_allowance(recurring_id, valid_to):
+    # уже начисленные периоды не трогаются: шаблон просто перестаёт действовать после valid_to
+    with get_conn() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT valid_from FROM recurring_allowances WHERE id=?", (recurring_id,))
+        row = cur.fetchone()
+        if not row:
+            raise ValueError("Шаблон надбавки не найден.")
+        if valid_to.isoformat() < row[0]:
+            raise ValueError("Дата окончания раньше даты начала.")
+        cur.execute("UPDATE recurring_allowances SET valid_to=? WHERE id=?",
+                    (valid_to.isoformat(), recurring_id))
+        conn.commit()
+
+@timed
+def fetch_recurring_allowances(on_date=None):
+    # [(id, worker_id, должность, тип, сумма, с, по)]; on_date - только действующие на эту дату
+    with read_conn() as conn:
+        cur = conn.cursor()
+        sql = """
+            SELECT id, worker_id, position, allowance_type, amount, valid_from, valid_to
+            FROM recurring_allowances
+        """
+        params = ()
+        if on_date is not None:
+            sql += " WHERE valid_from <= ? AND (valid_to IS NULL OR valid_to >= ?)"
+            params = (on_date.isoformat(), on_date.isoformat())
+        cur.execute(sql + " ORDER BY position, worker_id, allowance_type", params)
+        return cur.fetchall()
+
+@timed
+def materialize_recurring(year, month, accountant_login):
+    # число добавленных надбавок; всё - одна транзакция вместе со строками аудита
+    start, end, _ = month_bounds(year, month)
+    with get_conn() as conn:
+        cur = conn.cursor()
+        cur.execute("BEGIN IMMEDIATE")
+        cur.execute("SELECT COALESCE(MAX(id), 0) FROM allowances")
+        last_id = cur.fetchone()[0]
+
+        cur.execute(_MATERIALIZE_SQL, {"year": year, "month": month, "login": accountant_login,
+                                       "now": now_iso(), "start": start.isoformat(),
+                                       "end": end.isoformat()})
+        count = cur.rowcount
+        if count:
+            # details в том же виде, что у add_allowance
+            cur.execute("""
+                INSERT INTO financial_audit(action_type, entity_id, worker_id, period_year, period_month,
+                                            accountant_login, action_time, details)
+                SELECT 'ADD_ALLOW', id, worker_id, period_year, period_month,
+                       created_by_accountant, created_at, allowance_type || ': ' || amount
+                FROM allowances
+                WHERE id > ? AND recurring_id IS NOT NULL
+                ORDER BY id
+            """, (last_id,))
+        conn.commit()
+    rows_processed("materialize_recurring", count)
+    return count
@@ -0,0 +1,69 @@
+from array import array
+
+from payroll import fetch_period_inputs, compute_lines
+from tax_rules import flat_tax
+
+# -------- what-if payroll --------
+
+def parse_mapping(text):
+    # "Инженер=5; Бухгалтер=2,5" -> {"Инженер": 5.0, "Бухгалтер": 2.5}
+    result = {}
+    for part in text.replace("\n", ";").split(";"):
+        part = part.strip()
+        if not part:
+            continue
+        key, sep, value = part.partition("=")
+        if not sep or not key.strip():
+            raise ValueError(f"Ожидается «должность=число»: {part}")
+        result[key.strip()] = float(value.strip().replace(",", "."))
+    return result
+
+def _apply_overrides(inputs, raise_by_position, extra_allowance):
+    # raise_by_position: {должность: % индексации}
+    # extra_allowance: {должность или "*": доп. надбавка на человека}
+    workers, sick, allow, *rest = inputs
+    salaries = array("d", workers.salaries)
+    sim_allow = dict(allow)
+    for i, pos in enumerate(workers.positions):
+        pct = raise_by_position.get(pos, raise_by_position.get("*", 0.0))
+        if pct:
+            salaries[i] *= 1 + pct / 100
+        extra = extra_allowance.get(pos, 0.0) + extra_allowance.get("*", 0.0)
+        if extra:
+            wid = workers.ids[i]
+            sim_allow[wid] = sim_allow.get(wid, 0.0) + extra
+    return (workers.replace(salary=salaries), sick, sim_allow, *rest)
+
+def _totals(lines):
+    gross = tax = net = 0.0
+    for line in lines:
+        gross += line[6]
+        tax += line[7]
+        net += line[8]
+    return round(gross, 2), round(tax, 2), round(net, 2)
+
+def simulate_payroll(year, month, tax_rate=None, raise_by_position=None, extra_allowance=None):
+    # одно read-only чтение периода; обе ведомости считаются в памяти, БД не изменяется.
+    # tax_rate задаёт плоскую ставку вместо действующих правил tax_rules
+    inputs = fetch_period_inputs(year, month)
+    real = compute_lines(inputs, year, month)
+
+    sim_inputs = _apply_overrides(inputs, raise_by_position or {}, extra_allowance or {})
+    sim = compute_lines(sim_inputs, year, month, None if tax_rate is None else flat_tax(tax_rate))
+
+    deltas = []
+    for worker_id, r in real.items():
+        s = sim[worker_id]
+        tab, name, pos = r[0], r[1], r[2]
+        deltas.append((tab, name, pos,
+                       r[6], s[6], round(s[6] - r[6], 2),
+                       round(s[7] - r[7], 2), round(s[8] - r[8], 2)))
+
+    real_totals = _totals(real.values())
+    sim_totals = _totals(sim.values())
+    return {
+        "real": real_totals,
+        "simulated": sim_totals,
+        "delta": tuple(round(s - r, 2) for r, s in zip(real_totals, sim_totals)),
+        "lines": deltas,
+    }
@@ -0,0 +1,107 @@
+from bisect import bisect_right
+from datetime import date
+
+from db import get_conn, read_conn
+from metrics import cache_lookup
+
+# Правила НДФЛ хранятся в таблице tax_rules и версионируются по effective_from:
+# для периода действует весь набор строк с максимальной effective_from <= 1-го числа месяца.
+#   BRACKET          threshold = нижняя граница налоговой базы с начала года, value = ставка
+#   CHILD_DEDUCTION  threshold = порядковый номер ребёнка (последний действует для всех следующих),
+#                    value = вычет в месяц
+#   DEDUCTION_LIMIT  value = доход с начала года, после которого детские вычеты не применяются
+#   MARITAL_FACTOR   match_value = семейное положение, value = множитель детского вычета
+RULE_KINDS = ("BRACKET", "CHILD_DEDUCTION", "DEDUCTION_LIMIT", "MARITAL_FACTOR")
+
+_compiled = {}
+
+def load_rules(cur, on_date):
+    cur.execute("""
+        SELECT kind, threshold, value, COALESCE(match_value, '')
+        FROM tax_rules
+        WHERE effective_from = (SELECT MAX(effective_from) FROM tax_rules WHERE effective_from <= ?)
+        ORDER BY kind, threshold, match_value
+    """, (on_date.isoformat(),))
+    return tuple(cur.fetchall())
+
+def compile_rules(rules):
+    brackets = sorted((t, v) for k, t, v, _ in rules if k == "BRACKET") or [(0.0, 0.0)]
+    children = sorted((int(t), v) for k, t, v, _ in rules if k == "CHILD_DEDUCTION")
+    limits = [v for k, _, v, _ in rules if k == "DEDUCTION_LIMIT"]
+    factors = {m.strip().lower(): v for k, _, v, m in rules if k == "MARITAL_FACTOR"}
+    limit = min(limits) if limits else float("inf")
+
+    # налог на нижней границе каждой ступени, чтобы считать прогрессию одним bisect
+    bounds = [t for t, _ in brackets]
+    rates = [r for _, r in brackets]
+    base_tax = [0.0]
+    for i in range(1, len(brackets)):
+        base_tax.append(base_tax[-1] + (bounds[i] - bounds[i - 1]) * rates[i - 1])
+
+    # суммарный вычет на n детей: префиксные суммы по порядковым номерам
+    per_child = []
+    for ordinal, amount in children:
+        per_child.extend([amount] * (ordinal - len(per_child)))
+    child_prefix = [0.0]
+    for amount in per_child:
+        child_prefix.append(child_prefix[-1] + amount)
+    last_amount = per_child[-1] if per_child else 0.0
+
+    def bracket_tax(base):
+        if base <= 0:
+            return 0.0
+        i = bisect_right(bounds, base) - 1
+        if i < 0:
+            return 0.0
+        return base_tax[i] + (base - bounds[i]) * rates[i]
+
+    def child_deduction(count):
+        if count <= 0:
+            return 0.0
+        if count < len(child_prefix):
+            return child_prefix[count]
+        return child_prefix[-1] + (count - len(per_child)) * last_amount
+
+    def tax_for(gross, children_count, marital, ytd_gross=0.0, ytd_base=0.0, ytd_tax=0.0):
+        # нарастающим итогом с начала года; возвращает (налог за месяц, налоговая база за месяц)
+        deduction = 0.0
+        if children_count and ytd_gross + gross <= limit:
+            deduction = child_deduction(children_count) * factors.get((marital or "").strip().lower(), 1.0)
+        base = max(0.0, gross - deduction)
+        return bracket_tax(ytd_base + base) - ytd_tax, base
+
+    return tax_for
+
+def flat_tax(rate):
+    return compile_rules((("BRACKET", 0.0, rate, ""),))
+
+def tax_function(rules):
+    fn = _compiled.get(rules)
+    cache_lookup("tax_rules", fn is not None)
+    if fn is None:
+        fn = _compiled[rules] = compile_rules(rules)
+    return fn
+
+def rules_for_period(cur, year, month):
+    return tax_function(load_rules(cur, date(year, month, 1)))
+
+def add_tax_rule(effective_from, kind, threshold, value, match_value=None):
+    if kind not in RULE_KINDS:
+        raise ValueError("Неизвестный вид налогового правила.")
+    with get_conn() as conn:
+        cur = conn.cursor()
+        cur.execute("""
+            INSERT INTO tax_rules(effective_from, kind, threshold, value, match_value)
+            VALUES (?, ?, ?, ?, ?)
+        """, (effective_from.isoformat(), kind, threshold, value, match_value))
+        conn.commit()
+
+def fetch_tax_rules():
+    with read_conn() as conn:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT id, effective_from, kind, threshold, value, match_value
+            FROM tax_rules
+            ORDER BY effective_from, kind, threshold
+        """)
+        return cur.fetchall()
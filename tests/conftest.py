@@ -0,0 +1,16 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db
+
+
+@pytest.fixture
+def temp_db(tmp_path, monkeypatch):
+    # пустая БД со всеми миграциями во временном каталоге
+    monkeypatch.setattr(db, "DB_NAME", str(tmp_path / "payroll.db"))
+    db.init_db()
+    return db.DB_NAME
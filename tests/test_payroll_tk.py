@@ -0,0 +1,24 @@
+from datetime import date
+
+import payroll_tk
+from audit import verify_audit_chain
+
+
+def test_legacy_sick_leave_counts_in_every_month(temp_db):
+    payroll_tk.insert_worker("T1", "Иванов Иван", "Инженер", 62_000.0, "Холост", 0)
+    row = payroll_tk.fetch_workers()[0]
+    payroll_tk.add_sick_leave(row[0], date(2024, 1, 30), date(2024, 2, 2), "admin")
+
+    assert payroll_tk.calc_salary_row(row, 2024, 1)[3] == 2
+    assert payroll_tk.calc_salary_row(row, 2024, 2)[3] == 2
+
+
+def test_legacy_writes_extend_audit_chain(temp_db):
+    payroll_tk.insert_worker("T1", "Иванов Иван", "Инженер", 62_000.0, "Холост", 0)
+    wid = payroll_tk.fetch_workers()[0][0]
+    payroll_tk.add_allowance(wid, "Премия", 5000.0, 2024, 3, "admin")
+    payroll_tk.add_sick_leave(wid, date(2024, 3, 4), date(2024, 3, 6), "admin")
+
+    result = verify_audit_chain(full=True, checkpoint=False)
+    assert result["ok"] and result["checked"] == 2
+    assert payroll_tk.allowances_sum(wid, 2024, 3) == 5000.0
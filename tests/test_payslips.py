@@ -0,0 +1,22 @@
+import zipfile
+
+from payroll import insert_worker
+from payslips import _chunks, generate_payslips
+
+
+def test_chunks_release_dispatched_items():
+    items = list(range(7))
+    chunks = _chunks(items, 3)
+    assert next(chunks) == [0, 1, 2]
+    assert items[:3] == [None] * 3 and items[3:] == [3, 4, 5, 6]
+    assert list(chunks) == [[3, 4, 5], [6]]
+    assert items == [None] * 7
+
+
+def test_generate_payslips_writes_every_worker(temp_db, tmp_path):
+    for i in range(5):
+        insert_worker(f"T{i}", f"Работник {i}", "Инженер", 50_000.0, "Холост", 0)
+    out = tmp_path / "payslips.zip"
+    assert generate_payslips(2024, 3, str(out), processes=2, chunk_size=2) == 5
+    with zipfile.ZipFile(out) as zf:
+        assert len(zf.namelist()) == 10
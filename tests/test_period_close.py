@@ -0,0 +1,59 @@
+import sqlite3
+
+import pytest
+
+from db import get_conn
+from payroll import _snapshot_hash, close_period, insert_worker, reopen_period, verify_snapshot
+
+
+def _add_snapshot_line(year, month):
+    with get_conn() as conn:
+        cur = conn.cursor()
+        cur.execute("""
+            INSERT INTO payroll_snapshot_lines(year, month, line_no, worker_id, tab_number, full_name,
+                                               position, sick_days, base, allowances, gross, tax, net)
+            VALUES (?, ?, 99, 1, 'T1', 'Иванов Иван', 'Инженер', 0, 1.0, 0.0, 1.0, 0.0, 1.0)
+        """, (year, month))
+        conn.commit()
+
+
+def test_closed_snapshot_rejects_insert(temp_db):
+    insert_worker("T1", "Иванов Иван", "Инженер", 100_000.0, "Холост", 0)
+    close_period(2025, 5, "admin")
+
+    with pytest.raises(sqlite3.IntegrityError, match="Снимок ведомости неизменяем"):
+        _add_snapshot_line(2025, 5)
+    assert verify_snapshot(2025, 5)
+
+    reopen_period(2025, 5, "admin", "исправление")
+    close_period(2025, 5, "admin")
+    assert verify_snapshot(2025, 5)
+
+
+def test_reopen_archives_snapshot(temp_db):
+    insert_worker("T1", "Иванов Иван", "Инженер", 100_000.0, "Холост", 0)
+    insert_worker("T2", "Петров Пётр", "Техник", 60_000.0, "Женат", 1)
+    first_hash = close_period(2025, 5, "admin")
+    reopen_period(2025, 5, "admin", "исправление")
+
+    with get_conn() as conn:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT worker_id, tab_number, full_name, position, sick_days, base, allowances, gross, tax, net
+            FROM payroll_snapshot_archive WHERE year=2025 AND month=5 ORDER BY line_no
+        """)
+        archived = [tuple(r) for r in cur.fetchall()]
+        cur.execute("SELECT DISTINCT content_hash FROM payroll_snapshot_archive")
+        assert [r[0] for r in cur.fetchall()] == [first_hash]
+        with pytest.raises(sqlite3.IntegrityError, match="Снимок ведомости неизменяем"):
+            cur.execute("DELETE FROM payroll_snapshot_archive")
+    assert _snapshot_hash(archived) == first_hash
+
+    close_period(2025, 5, "admin")
+    assert verify_snapshot(2025, 5)
+
+    reopen_period(2025, 5, "admin", "ещё исправление")
+    with get_conn() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT revision, COUNT(*) FROM payroll_snapshot_archive GROUP BY revision")
+        assert cur.fetchall() == [(1, 2), (2, 2)]
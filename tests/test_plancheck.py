@@ -0,0 +1,17 @@
+import pytest
+
+from plancheck import _SCAN, check_plans, format_results
+
+
+@pytest.mark.parametrize("analyze", [False, True])
+def test_no_full_scans_of_large_tables(analyze):
+    results = check_plans(workers=200, min_rows=100, history_months=26, closed_months=20, analyze=analyze)
+    assert len(results) > 50
+    assert sum(r["checked"] for r in results) > len(results) // 2
+    problems = [r for r in results if r["problems"]]
+    assert not problems, format_results(problems)
+
+
+def test_scan_pattern_matches_old_and_new_sqlite_format():
+    assert _SCAN.match("SCAN workers").group(1) == "workers"
+    assert _SCAN.match("SCAN TABLE workers AS w").group(1) == "workers"
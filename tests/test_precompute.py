@@ -0,0 +1,41 @@
+from payroll import add_allowance, insert_worker, period_summary
+from precompute import PeriodCache
+
+PERIOD = (2024, 3)
+
+
+def _workers(count):
+    for i in range(count):
+        insert_worker(f"T{i:04d}", f"Работник {i}", "Инженер", 50_000.0, "Холост", 0)
+
+
+def test_refresh_caches_until_data_changes(temp_db):
+    _workers(3)
+    cache = PeriodCache(periods=lambda: [PERIOD])
+    assert cache.refresh() == 1
+    assert cache.get(*PERIOD) == period_summary(*PERIOD)
+    assert cache.stale() == []
+
+    add_allowance(1, "Премия", 1000.0, *PERIOD, "admin")
+    assert cache.get(*PERIOD) is None
+    assert cache.stale() == [PERIOD]
+    assert cache.summary(*PERIOD) == period_summary(*PERIOD)
+    cache.close()
+
+
+def test_refresh_stops_inside_a_period(temp_db):
+    _workers(1200)
+    cache = PeriodCache(periods=lambda: [PERIOD])
+    checks = []
+
+    def should_stop():
+        # пользователь нажал клавишу, когда часть работников уже посчитана
+        checks.append(1)
+        return len(checks) > 2
+
+    assert cache.refresh(should_stop) == 0
+    assert len(checks) == 3
+    assert cache.get(*PERIOD) is None and cache.running == {}
+    assert cache.stale() == [PERIOD]
+    assert cache.summary(*PERIOD) == period_summary(*PERIOD)
+    cache.close()
@@ -0,0 +1,49 @@
+import sqlite3
+import threading
+from datetime import date
+
+import pytest
+
+import db
+import maintenance
+from payroll import fetch_workers, insert_worker, period_summary
+from recurring import add_recurring_allowance, fetch_recurring_allowances
+
+
+@pytest.fixture
+def replica(temp_db):
+    yield db.enable_replica()
+    db.disable_replica()
+
+
+def test_read_through_replica_from_thread(replica):
+    insert_worker("T1", "Иванов Иван", "Инженер", 100_000.0, "Холост", 0)
+    results, errors = [], []
+
+    def work():
+        try:
+            results.append(period_summary(2024, 1))
+            results.append(len(fetch_workers()))
+        except Exception as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=work)
+    thread.start()
+    thread.join()
+    assert errors == []
+    assert results[1] == 1
+
+
+def test_connection_execute_is_replayed(replica):
+    maintenance._log("vacuum", "2024-01-01T00:00:00", 0.5)
+    with db.read_conn() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM maintenance_log").fetchone()[0] == 1
+
+
+def test_external_recurring_change_resyncs(replica):
+    rid = add_recurring_allowance("Премия", 1000.0, date(2024, 1, 1), "admin", position="Инженер")
+    other = sqlite3.connect(db.DB_NAME)
+    other.execute("UPDATE recurring_allowances SET valid_to='2024-03-31' WHERE id=?", (rid,))
+    other.commit()
+    other.close()
+    assert fetch_recurring_allowances()[0][6] == "2024-03-31"
@@ -0,0 +1,17 @@
+from payroll import insert_worker
+from simulation import simulate_payroll
+
+
+def test_flat_tax_rate_january(temp_db):
+    insert_worker("T1", "Иванов Иван", "Инженер", 100_000.0, "Холост", 0)
+    result = simulate_payroll(2024, 1, tax_rate=0.15)
+    assert result["simulated"] == (100_000.0, 15_000.0, 85_000.0)
+
+
+def test_flat_tax_rate_after_january_ignores_earlier_rate_difference(temp_db):
+    # сентябрь: нарастающий итог за январь-август не должен доначислять 2% за прошлые месяцы
+    insert_worker("T1", "Иванов Иван", "Инженер", 100_000.0, "Холост", 0)
+    result = simulate_payroll(2024, 9, tax_rate=0.15)
+    assert result["real"] == (100_000.0, 13_000.0, 87_000.0)
+    assert result["simulated"] == (100_000.0, 15_000.0, 85_000.0)
+    assert result["delta"] == (0.0, 2_000.0, -2_000.0)
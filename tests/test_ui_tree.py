@@ -0,0 +1,92 @@
+import random
+
+from ui_tree import TreeSync
+
+
+class FakeTree:
+    # модель ttk.Treeview: дети по родителям и values по iid, семантика insert/move/delete как у Tk
+    def __init__(self):
+        self.children = {"": []}
+        self.values = {}
+        self.options = {}
+        self.calls = 0
+
+    def insert(self, parent, index, iid, values, **options):
+        assert iid not in self.values
+        self.calls += 1
+        self.children[parent].insert(index, iid)
+        self.children[iid] = []
+        self.values[iid] = tuple(values)
+        self.options[iid] = options
+
+    def delete(self, *iids):
+        self.calls += 1
+        for iid in iids:
+            for kids in self.children.values():
+                if iid in kids:
+                    kids.remove(iid)
+            for child in self.children.pop(iid):
+                self.delete(child)
+            del self.values[iid]
+
+    def item(self, iid, values):
+        self.calls += 1
+        self.values[iid] = tuple(values)
+
+    def move(self, iid, parent, index):
+        self.calls += 1
+        for kids in self.children.values():
+            if iid in kids:
+                kids.remove(iid)
+        self.children[parent].insert(index, iid)
+
+    def get_children(self, parent=""):
+        return tuple(self.children[parent])
+
+
+def _random_rows(rnd, keys):
+    rows = [(k, f"v{rnd.randrange(3)}") for k in rnd.sample(keys, rnd.randrange(len(keys) + 1))]
+    rnd.shuffle(rows)
+    return rows
+
+
+def test_random_updates_keep_order_and_values():
+    rnd = random.Random(37)
+    keys = [f"k{i}" for i in range(12)]
+    for _ in range(3000):
+        tree = FakeTree()
+        sync = TreeSync(tree)
+        for _ in range(rnd.randrange(1, 6)):
+            rows = _random_rows(rnd, keys)
+            assert sync.update(rows) == len(rows)
+            assert tree.get_children() == tuple(k for k, _ in rows)
+            assert all(tree.values[k] == (k, v) for k, v in rows)
+
+
+def test_unchanged_rows_make_no_tree_calls():
+    tree = FakeTree()
+    sync = TreeSync(tree)
+    rows = [(f"k{i}", i) for i in range(10)]
+    sync.update(rows)
+    calls = tree.calls
+    sync.update(rows)
+    assert tree.calls == calls
+    sync.update(rows[:5] + [("k5", -1)] + rows[6:])
+    assert tree.calls == calls + 1
+
+
+def test_grouped_rows_under_parents():
+    tree = FakeTree()
+    groups = TreeSync(tree, key=lambda v: f"grp/{v[0]}", open=True)
+    groups.update([("A",), ("B",)])
+    lines = {g: TreeSync(tree, key=lambda v: f"{v[0]}/{v[1]}", parent=f"grp/{g}") for g in "AB"}
+    lines["A"].update([("A", 1), ("A", 2)])
+    lines["B"].update([("B", 3)])
+    assert tree.get_children() == ("grp/A", "grp/B")
+    assert tree.get_children("grp/A") == ("A/1", "A/2")
+    assert tree.options["grp/A"] == {"open": True}
+
+    lines["A"].update([("A", 2), ("A", 1), ("A", 4)])
+    assert tree.get_children("grp/A") == ("A/2", "A/1", "A/4")
+    groups.update([("A",)])
+    assert "B/3" not in tree.values
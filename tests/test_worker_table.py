@@ -0,0 +1,10 @@
+from worker_table import WorkerTable
+
+
+def test_row_positional_and_named_access():
+    table = WorkerTable.from_rows([(7, "T7", "Иванов Иван", "Инженер", 100_000.0, "Женат", 2)])
+    row = table[0]
+    assert row[1:4] == ("T7", "Иванов Иван", "Инженер")
+    assert row[-1] == row.children_count == 2
+    assert tuple(row) == row[:] == (7, "T7", "Иванов Иван", "Инженер", 100_000.0, "Женат", 2)
+    assert WorkerTable.from_rows([row])[0].salary == 100_000.0
@@ -0,0 +1,38 @@
+from datetime import date
+
+from db import get_conn
+from payroll import check_ytd, finalize_ytd, insert_worker, update_worker_field
+from tax_rules import add_tax_rule
+
+
+def _stored_months(year):
+    with get_conn() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT DISTINCT month FROM ytd_totals WHERE year=? ORDER BY month", (year,))
+        return [r[0] for r in cur.fetchall()]
+
+
+def test_tax_rule_invalidates_ytd_from_effective_month(temp_db):
+    insert_worker("T1", "Иванов Иван", "Инженер", 100_000.0, "Холост", 0)
+    finalize_ytd(2024, 6)
+    assert _stored_months(2024) == [1, 2, 3, 4, 5, 6]
+
+    add_tax_rule(date(2024, 4, 1), "BRACKET", 0.0, 0.15)
+    assert _stored_months(2024) == [1, 2, 3]
+    assert check_ytd(2024) == []
+
+    finalize_ytd(2024, 6)
+    assert check_ytd(2024) == []
+
+
+def test_worker_change_invalidates_ytd(temp_db):
+    insert_worker("T1", "Иванов Иван", "Инженер", 100_000.0, "Женат", 0)
+    finalize_ytd(2024, 6)
+
+    update_worker_field(1, "children_count", 2)
+    assert _stored_months(2024) == []
+    finalize_ytd(2024, 6)
+    assert check_ytd(2024) == []
+
+    update_worker_field(1, "full_name", "Иванов Иван Петрович")
+    assert _stored_months(2024) == [1, 2, 3, 4, 5, 6]
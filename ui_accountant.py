@@ -1,5 +1,5 @@
 import tkinter as tk
-from tkinter import ttk, messagebox
+from tkinter import ttk, messagebox, simpledialog, filedialog
 import sqlite3
 from datetime import date
 
@@ -8,9 +8,20 @@ from auth import auth_accountant
 from payroll import (
     fetch_workers, insert_worker,
     fetch_pending_requests, approve_request, reject_request,
-    add_sick_leave, add_allowance,
-    parse_date, calc_salary_row
+    add_sick_leave, add_allowance, allowances_for_period, save_financial_batch,
+    parse_date, close_period, reopen_period, period_diff, diff_percent, DIFF_COLUMNS, DIFF_STATUS
 )
+from simulation import simulate_payroll, parse_mapping
+from payslips import generate_payslips
+from export import export_period_report, export_range_report, write_csv, period_diff_rows, DIFF_HEADER
+from recurring import materialize_recurring
+from maintenance import run_if_due_in_background
+from ui_tree import TreeSync
+from ui_grid import CellEditor
+from db_watch import ChangeWatcher
+from precompute import IdleScheduler, shared_cache
+from config import CHANGE_POLL_MS, READ_REPLICA
+from db import enable_replica
 
 class AccountantLogin(tk.Tk):
     def __init__(self):
@@ -44,6 +55,8 @@ class AccountantLogin(tk.Tk):
             messagebox.showerror("Ошибка", "Неверный логин или пароль.")
             return
         self.destroy()
+        if READ_REPLICA:
+            enable_replica()
         AccountantApp(acc).mainloop()
 
 
@@ -54,27 +67,79 @@ class AccountantApp(tk.Tk):
         self.title(f"Бухгалтер: {self.login}")
         self.geometry("980x560")
 
-        nb = ttk.Notebook(self)
+        nb = self.nb = ttk.Notebook(self)
         nb.pack(fill="both", expand=True, padx=8, pady=8)
 
         self.tab_workers = ttk.Frame(nb)
         self.tab_fin = ttk.Frame(nb)
+        self.tab_batch = ttk.Frame(nb)
         self.tab_requests = ttk.Frame(nb)
         self.tab_report = ttk.Frame(nb)
+        self.tab_sim = ttk.Frame(nb)
 
         nb.add(self.tab_workers, text="Работники")
         nb.add(self.tab_fin, text="Финансовые данные")
+        nb.add(self.tab_batch, text="Пакетный ввод")
         nb.add(self.tab_requests, text="Запросы работников")
         nb.add(self.tab_report, text="Ведомость")
+        nb.add(self.tab_sim, text="Моделирование")
 
         self.build_workers_tab()
         self.build_fin_tab()
+        self.build_batch_tab()
         self.build_requests_tab()
         self.build_report_tab()
+        self.build_sim_tab()
 
         self.refresh_workers()
         self.refresh_requests()
 
+        self.after(60_000, self.maintenance_tick)
+
+        self.rep_shown = None
+        self.rep_dirty = False
+        self.watcher = ChangeWatcher()
+        nb.bind("<<NotebookTabChanged>>", self.on_tab_changed)
+        self.after(CHANGE_POLL_MS, self.poll_changes)
+
+        # ведомость текущего и следующего месяца считается заранее, пока бухгалтер ничего не делает
+        self.rep_cache = shared_cache()
+        self.precompute = IdleScheduler(self, self.rep_cache)
+        self.precompute.schedule()
+
+    # таблицы, от которых зависит ведомость
+    REPORT_TABLES = {"workers", "sick_leaves", "allowances", "period_closures"}
+
+    def poll_changes(self):
+        try:
+            changed = self.watcher.poll()
+        except Exception:
+            changed = set()
+        if "workers" in changed:
+            self.refresh_workers()
+        if "personal_change_requests" in changed or "workers" in changed:
+            self.refresh_requests()
+        if changed & self.REPORT_TABLES and self.rep_shown:
+            # пересчёт ведомости дорогой: сразу - только если вкладка открыта
+            if self.nb.select() == str(self.tab_report):
+                self.refresh_report()
+            else:
+                self.rep_dirty = True
+        self.precompute.schedule()
+        self.after(CHANGE_POLL_MS, self.poll_changes)
+
+    def on_tab_changed(self, _event=None):
+        if self.rep_dirty and self.nb.select() == str(self.tab_report):
+            self.refresh_report()
+
+    def maintenance_tick(self):
+        # резервная копия и оптимизация БД по расписанию, в фоновом потоке
+        try:
+            run_if_due_in_background()
+        except Exception:
+            pass
+        self.after(30 * 60_000, self.maintenance_tick)
+
     # ---- workers ----
 
     def build_workers_tab(self):
@@ -100,15 +165,15 @@ class AccountantApp(tk.Tk):
         for c, t, w in heads:
             self.w_tree.heading(c, text=t)
             self.w_tree.column(c, width=w)
+        self.w_sync = TreeSync(self.w_tree)
 
     def refresh_workers(self):
-        for i in self.w_tree.get_children():
-            self.w_tree.delete(i)
         rows = fetch_workers()
-        for r in rows:
-            self.w_tree.insert("", "end", values=(
-                r[0], r[1], r[2], r[3], f"{r[4]:.2f}", r[5] or "", r[6] or 0
-            ))
+        self.w_sync.update(
+            (r.id, r.tab_number, r.full_name, r.position, f"{r.salary:.2f}",
+             r.marital_status, r.children_count)
+            for r in rows
+        )
         self.workers_cache = rows
         self.refresh_fin_worker_cb()
 
@@ -213,30 +278,35 @@ class AccountantApp(tk.Tk):
         ttk.Button(allow_box, text="Добавить", command=self.ui_add_allow).grid(row=0, column=4, padx=10)
 
     def refresh_fin_worker_cb(self):
-        rows = getattr(self, "workers_cache", fetch_workers())
-        self.worker_map = {f"{r[2]} (таб. {r[1]})": r[0] for r in rows}
-        names = list(self.worker_map.keys())
-        self.fin_worker_cb["values"] = names
-        if names and self.fin_worker_cb.get() not in names:
-            self.fin_worker_cb.set(names[0])
-        if not names:
+        if not hasattr(self, "workers_cache"):
+            self.workers_cache = fetch_workers()
+        table = self.workers_cache
+        prev_id = self.fin_selected_worker_id()
+
+        # позиция в списке = позиция в таблице, отдельный словарь подпись -> id не нужен
+        self.fin_worker_ids = table.ids
+        self.fin_worker_cb["values"] = [f"{name} (таб. {tab})"
+                                        for name, tab in zip(table.full_names, table.tab_numbers)]
+        if not len(table):
             self.fin_worker_cb.set("")
+            return
+        i = table.index_of(prev_id) if prev_id is not None else None
+        self.fin_worker_cb.current(0 if i is None else i)
 
     def fin_selected_worker_id(self):
-        return self.worker_map.get(self.fin_worker_cb.get())
+        ids = getattr(self, "fin_worker_ids", ())
+        i = self.fin_worker_cb.current()
+        return ids[i] if 0 <= i < len(ids) else None
 
     def ui_add_sick(self):
         try:
             wid = self.fin_selected_worker_id()
             if not wid:
                 raise ValueError("Нет выбранного работника.")
-            year = int(self.fin_year.get().strip())
-            month = int(self.fin_month.get().strip())
-
             d1 = parse_date(self.v_s1.get())
             d2 = parse_date(self.v_s2.get())
 
-            add_sick_leave(wid, d1, d2, year, month, self.login)
+            add_sick_leave(wid, d1, d2, self.login)
             self.v_s1.set(""); self.v_s2.set("")
             messagebox.showinfo("Готово", "Больничный добавлен и зафиксирован.")
         except Exception as e:
@@ -259,6 +329,201 @@ class AccountantApp(tk.Tk):
         except Exception as e:
             messagebox.showerror("Ошибка", str(e))
 
+    # ---- batch entry ----
+
+    BATCH_COLUMNS = ("amount", "sick_from", "sick_to")
+
+    def build_batch_tab(self):
+        top = ttk.Frame(self.tab_batch)
+        top.pack(fill="x", padx=10, pady=8)
+
+        now = date.today()
+        self.batch_year = tk.StringVar(value=str(now.year))
+        self.batch_month = tk.StringVar(value=str(now.month))
+        self.batch_atype = tk.StringVar(value=ALLOWANCE_TYPES[0])
+
+        ttk.Label(top, text="Год").pack(side="left")
+        ttk.Entry(top, textvariable=self.batch_year, width=6).pack(side="left", padx=6)
+        ttk.Label(top, text="Месяц").pack(side="left")
+        ttk.Entry(top, textvariable=self.batch_month, width=4).pack(side="left", padx=6)
+        ttk.Label(top, text="Тип надбавки").pack(side="left", padx=(10, 2))
+        ttk.Combobox(top, state="readonly", values=ALLOWANCE_TYPES, textvariable=self.batch_atype, width=16)\
+            .pack(side="left", padx=6)
+
+        ttk.Button(top, text="Загрузить", command=self.ui_batch_load).pack(side="left", padx=10)
+        ttk.Button(top, text="Сохранить всё", command=self.ui_batch_save).pack(side="left", padx=4)
+        ttk.Button(top, text="Отменить правки", command=self.ui_batch_reset).pack(side="left", padx=4)
+        ttk.Button(top, text="Постоянные надбавки", command=self.ui_batch_recurring).pack(side="left", padx=4)
+
+        self.batch_status = ttk.Label(self.tab_batch, text="Двойной щелчок или Enter - правка ячейки")
+        self.batch_status.pack(anchor="w", padx=12)
+
+        frame = ttk.Frame(self.tab_batch)
+        frame.pack(fill="both", expand=True, padx=10, pady=(4, 10))
+        cols = ("id", "tab", "name", "pos", "entered", "amount", "sick_from", "sick_to")
+        tree = self.batch_tree = ttk.Treeview(frame, columns=cols, displaycolumns=cols[1:],
+                                              show="headings", height=18)
+        scroll = ttk.Scrollbar(frame, orient="vertical", command=tree.yview)
+        tree.configure(yscrollcommand=scroll.set)
+        tree.pack(side="left", fill="both", expand=True)
+        scroll.pack(side="left", fill="y")
+
+        heads = [
+            ("tab", "Таб. №", 80),
+            ("name", "Ф.И.О.", 220),
+            ("pos", "Должность", 140),
+            ("entered", "Уже начислено", 110),
+            ("amount", "Надбавка", 100),
+            ("sick_from", "Больничный с", 110),
+            ("sick_to", "по", 110),
+        ]
+        for c, t, w in heads:
+            tree.heading(c, text=t)
+            tree.column(c, width=w)
+        tree.tag_configure("changed", background="#fff4c2")
+        tree.tag_configure("invalid", background="#ffd6d6")
+
+        self.batch_editor = CellEditor(tree, self.BATCH_COLUMNS, self.batch_cell_error,
+                                       self.batch_cell_changed, self.batch_show_error)
+        self.batch_edits = {}  # worker_id -> {столбец: текст}
+        self.batch_period = None
+
+    def batch_cell_error(self, _iid, column, text):
+        text = text.strip()
+        if not text:
+            return None
+        if column == "amount":
+            try:
+                amount = float(text.replace(",", "."))
+            except ValueError:
+                return "Сумма - число, например 5000 или 5000,50."
+            return "Сумма не может быть отрицательной." if amount < 0 else None
+        try:
+            parse_date(text)
+        except ValueError:
+            return "Дата в формате ГГГГ-ММ-ДД."
+        return None
+
+    def batch_row_error(self, edits):
+        for column, text in edits.items():
+            error = self.batch_cell_error(None, column, text)
+            if error:
+                return error
+        s1, s2 = edits.get("sick_from", ""), edits.get("sick_to", "")
+        if bool(s1) != bool(s2):
+            return "Для больничного нужны обе даты."
+        if s1 and parse_date(s2) < parse_date(s1):
+            return "Дата выздоровления раньше даты заболевания."
+        return None
+
+    def batch_cell_changed(self, iid, column, text):
+        wid = int(iid)
+        edits = self.batch_edits.setdefault(wid, {})
+        if text:
+            edits[column] = text
+        else:
+            edits.pop(column, None)
+        if not edits:
+            del self.batch_edits[wid]
+            tags = ()
+        else:
+            tags = ("invalid",) if self.batch_row_error(edits) else ("changed",)
+        self.batch_tree.item(iid, tags=tags)
+        self.batch_show_error("")
+
+    def batch_show_error(self, error):
+        if error:
+            self.batch_status.config(text=error, foreground="#b00020")
+            return
+        invalid = sum(1 for e in self.batch_edits.values() if self.batch_row_error(e))
+        text = f"Изменено строк: {len(self.batch_edits)}"
+        if invalid:
+            text += f", с ошибками: {invalid}"
+        self.batch_status.config(text=text, foreground="")
+
+    def ui_batch_load(self):
+        # открытая ячейка относится к старому дереву: её текст становится обычной правкой
+        self.batch_editor.finish()
+        try:
+            year = int(self.batch_year.get().strip())
+            month = int(self.batch_month.get().strip())
+            if not (1 <= month <= 12):
+                raise ValueError("Месяц 1..12.")
+            if self.batch_edits and (year, month) != self.batch_period:
+                if not messagebox.askyesno("Пакетный ввод", "Несохранённые правки будут потеряны. Продолжить?"):
+                    return
+                self.batch_edits = {}
+            workers = fetch_workers()
+            entered = allowances_for_period(year, month)
+        except Exception as e:
+            messagebox.showerror("Ошибка", str(e))
+            return
+
+        self.batch_period = (year, month)
+        tree = self.batch_tree
+        tree.delete(*tree.get_children())
+        for w in workers:
+            edits = self.batch_edits.get(w.id, {})
+            total = entered.get(w.id)
+            tags = ()
+            if edits:
+                tags = ("invalid",) if self.batch_row_error(edits) else ("changed",)
+            tree.insert("", "end", iid=str(w.id), tags=tags, values=(
+                w.id, w.tab_number, w.full_name, w.position,
+                f"{total:.2f}" if total else "",
+                *(edits.get(c, "") for c in self.BATCH_COLUMNS)))
+        self.batch_show_error("")
+
+    def ui_batch_reset(self):
+        if self.batch_edits and not messagebox.askyesno("Пакетный ввод", "Отменить все несохранённые правки?"):
+            return
+        self.batch_editor.cancel()
+        self.batch_edits = {}
+        if self.batch_period:
+            self.ui_batch_load()
+
+    def ui_batch_save(self):
+        try:
+            if self.batch_period is None or not self.batch_edits:
+                raise ValueError("Нет изменений для сохранения.")
+            year, month = self.batch_period
+            a_type = self.batch_atype.get()
+            allowances, sick = [], []
+            for wid, edits in self.batch_edits.items():
+                error = self.batch_row_error(edits)
+                if error:
+                    iid = str(wid)
+                    self.batch_tree.see(iid)
+                    self.batch_tree.selection_set(iid)
+                    raise ValueError(f"Таб. № {self.batch_tree.set(iid, 'tab')}: {error}")
+                if edits.get("amount"):
+                    allowances.append((wid, a_type, float(edits["amount"].replace(",", "."))))
+                if edits.get("sick_from"):
+                    sick.append((wid, parse_date(edits["sick_from"]), parse_date(edits["sick_to"])))
+            n_allow, n_sick = save_financial_batch(year, month, allowances, sick, self.login)
+        except Exception as e:
+            messagebox.showerror("Ошибка", str(e))
+            return
+
+        self.batch_edits = {}
+        self.ui_batch_load()
+        self.batch_status.config(text=f"Сохранено одной транзакцией: надбавок {n_allow}, больничных {n_sick}")
+
+    def ui_batch_recurring(self):
+        # открытие периода: шаблоны стажа/квалификации разворачиваются в надбавки; повтор безопасен
+        try:
+            year = int(self.batch_year.get().strip())
+            month = int(self.batch_month.get().strip())
+            if not (1 <= month <= 12):
+                raise ValueError("Месяц 1..12.")
+            count = materialize_recurring(year, month, self.login)
+        except Exception as e:
+            messagebox.showerror("Ошибка", str(e))
+            return
+        if self.batch_period == (year, month):
+            self.ui_batch_load()
+        self.batch_status.config(text=f"Начислено постоянных надбавок за {month:02d}.{year}: {count}")
+
     # ---- requests ----
 
     def build_requests_tab(self):
@@ -284,13 +549,11 @@ class AccountantApp(tk.Tk):
         for c, t, w in heads:
             self.req_tree.heading(c, text=t)
             self.req_tree.column(c, width=w)
+        self.req_sync = TreeSync(self.req_tree)
 
     def refresh_requests(self):
-        for i in self.req_tree.get_children():
-            self.req_tree.delete(i)
-        rows = fetch_pending_requests()
-        for r in rows:
-            self.req_tree.insert("", "end", values=r)
+        count = self.req_sync.update(fetch_pending_requests())
+        self.nb.tab(self.tab_requests, text=f"Запросы работников ({count})" if count else "Запросы работников")
 
     def selected_request_id(self):
         sel = self.req_tree.selection()
@@ -338,9 +601,24 @@ class AccountantApp(tk.Tk):
 
         ttk.Button(top, text="Сформировать ведомость", command=self.ui_make_report)\
             .pack(side="left", padx=10)
+        ttk.Button(top, text="Закрыть период", command=self.ui_close_period)\
+            .pack(side="left", padx=4)
+        ttk.Button(top, text="Открыть повторно", command=self.ui_reopen_period)\
+            .pack(side="left", padx=4)
+        ttk.Button(top, text="Расчётные листки...", command=self.ui_payslips)\
+            .pack(side="left", padx=4)
+        ttk.Button(top, text="Экспорт CSV...", command=self.ui_export_report)\
+            .pack(side="left", padx=4)
+        ttk.Button(top, text="За диапазон...", command=self.ui_export_range)\
+            .pack(side="left", padx=4)
+        ttk.Button(top, text="Сравнить...", command=self.ui_compare_period)\
+            .pack(side="left", padx=4)
+
+        self.rep_status = ttk.Label(top, text="")
+        self.rep_status.pack(side="left", padx=10)
 
         cols = ("tab", "name", "pos", "sick", "base", "add", "gross", "tax", "net")
-        self.rep_tree = ttk.Treeview(self.tab_report, columns=cols, show="headings", height=18)
+        self.rep_tree = ttk.Treeview(self.tab_report, columns=cols, show="tree headings", height=18)
         self.rep_tree.pack(fill="both", expand=True, padx=10, pady=(0, 10))
 
         heads = [
@@ -354,41 +632,307 @@ class AccountantApp(tk.Tk):
             ("tax", "НДФЛ", 90),
             ("net", "К выдаче", 100),
         ]
+        self.rep_tree.column("#0", width=30, stretch=False)
         for c, t, w in heads:
             self.rep_tree.heading(c, text=t)
             self.rep_tree.column(c, width=w)
+        # сворачиваемые строки-подытоги по должностям, под ними строки работников
+        self.rep_groups = TreeSync(self.rep_tree, key=lambda v: f"grp/{v[2]}", open=True)
+        self.rep_group_lines = {}
 
         self.rep_total = ttk.Label(self.tab_report, text="Итого: 0.00 | НДФЛ: 0.00 | К выдаче: 0.00")
         self.rep_total.pack(anchor="e", padx=12, pady=(0, 10))
 
+    def report_period(self):
+        year = int(self.rep_year.get().strip())
+        month = int(self.rep_month.get().strip())
+        if not (1 <= month <= 12):
+            raise ValueError("Месяц 1..12.")
+        return year, month
+
     def ui_make_report(self):
         try:
-            year = int(self.rep_year.get().strip())
-            month = int(self.rep_month.get().strip())
+            year, month = self.report_period()
+            summary = self.rep_cache.summary(year, month)
+        except Exception as e:
+            messagebox.showerror("Ошибка", str(e))
+            return
+        self.rep_shown = (year, month)
+        self.show_report(summary)
+
+    def refresh_report(self):
+        # тихое обновление уже показанной ведомости после внешних изменений
+        self.rep_dirty = False
+        try:
+            summary = self.rep_cache.summary(*self.rep_shown)
+        except Exception:
+            return
+        self.show_report(summary)
+
+    def show_report(self, summary):
+        groups = summary["groups"]
+        self.rep_groups.update(
+            ("", f"Итого: {pos} ({count})", pos, sick,
+             f"{base:.2f}", f"{add:.2f}",
+             f"{gross:.2f}", f"{tax:.2f}", f"{net:.2f}")
+            for pos, count, sick, base, add, gross, tax, net in groups
+        )
+
+        by_group = {pos: [] for pos, *_ in groups}
+        for _, tab, name, pos, sick, base, add, gross, tax, net in summary["lines"]:
+            by_group[pos].append(
+                (tab, name, pos, sick,
+                 f"{base:.2f}", f"{add:.2f}",
+                 f"{gross:.2f}", f"{tax:.2f}", f"{net:.2f}")
+            )
+        # строки исчезнувших групп удалены вместе с родительской строкой
+        for pos in list(self.rep_group_lines):
+            if pos not in by_group:
+                del self.rep_group_lines[pos]
+        for pos, rows in by_group.items():
+            sync = self.rep_group_lines.get(pos)
+            if sync is None:
+                sync = self.rep_group_lines[pos] = TreeSync(
+                    self.rep_tree, key=lambda v: f"{v[2]}/{v[0]}", parent=f"grp/{pos}")
+            sync.update(rows)
+
+        total_g, total_t, total_n = summary["totals"]
+        closed = summary["closed"]
+        self.rep_total.config(
+            text=f"Итого: {total_g:.2f} | НДФЛ: {total_t:.2f} | К выдаче: {total_n:.2f}"
+        )
+        self.rep_status.config(text="Период закрыт" if closed else "")
+
+    def ui_close_period(self):
+        try:
+            year, month = self.report_period()
+            if not messagebox.askyesno("Закрытие периода",
+                                       f"Закрыть {month:02d}.{year}? Начисления периода станут неизменяемыми."):
+                return
+            close_period(year, month, self.login)
+            self.ui_make_report()
+        except Exception as e:
+            messagebox.showerror("Ошибка", str(e))
+
+    def ui_reopen_period(self):
+        try:
+            year, month = self.report_period()
+            reason = simpledialog.askstring("Повторное открытие", "Причина (будет записана в аудит):", parent=self)
+            if reason is None:
+                return
+            reopen_period(year, month, self.login, reason)
+            self.ui_make_report()
+        except Exception as e:
+            messagebox.showerror("Ошибка", str(e))
+
+    def ui_payslips(self):
+        try:
+            year, month = self.report_period()
+            path = filedialog.asksaveasfilename(
+                parent=self, defaultextension=".zip", filetypes=[("ZIP", "*.zip")],
+                initialfile=f"payslips_{year}-{month:02d}.zip")
+            if not path:
+                return
+            self.config(cursor="watch")
+            self.update_idletasks()
+            try:
+                count = generate_payslips(year, month, path)
+            finally:
+                self.config(cursor="")
+            messagebox.showinfo("Готово", f"Сформировано расчётных листков: {count}")
+        except Exception as e:
+            messagebox.showerror("Ошибка", str(e))
+
+    def run_export(self, initialfile, export):
+        path = filedialog.asksaveasfilename(
+            parent=self, defaultextension=".csv", filetypes=[("CSV", "*.csv")],
+            initialfile=initialfile)
+        if not path:
+            return
+        self.config(cursor="watch")
+        self.update_idletasks()
+        try:
+            count = export(path)
+        finally:
+            self.config(cursor="")
+        messagebox.showinfo("Готово", f"Выгружено строк: {count}")
+
+    def ui_export_report(self):
+        try:
+            year, month = self.report_period()
+            self.run_export(f"vedomost_{year}-{month:02d}.csv",
+                            lambda path: export_period_report(year, month, path))
+        except Exception as e:
+            messagebox.showerror("Ошибка", str(e))
+
+    def ui_export_range(self):
+        try:
+            year, month = self.report_period()
+            text = simpledialog.askstring(
+                "Отчёт за диапазон", "Период (ГГГГ-ММ..ГГГГ-ММ):",
+                initialvalue=f"{year}-01..{year}-{month:02d}", parent=self)
+            if not text:
+                return
+            start, _, end = text.strip().partition("..")
+            try:
+                y1, m1 = map(int, start.split("-"))
+                y2, m2 = map(int, end.split("-"))
+            except ValueError:
+                raise ValueError("Формат периода: ГГГГ-ММ..ГГГГ-ММ.")
+            self.run_export(f"vedomost_{y1}-{m1:02d}_{y2}-{m2:02d}.csv",
+                            lambda path: export_range_report(y1, m1, y2, m2, path))
+        except Exception as e:
+            messagebox.showerror("Ошибка", str(e))
+
+    def ui_compare_period(self):
+        try:
+            year, month = self.report_period()
+            prev_year, prev_month = divmod(year * 12 + month - 2, 12)
+            text = simpledialog.askstring(
+                "Сравнение ведомостей", f"Сравнить {year}-{month:02d} с периодом (ГГГГ-ММ):",
+                initialvalue=f"{prev_year}-{prev_month + 1:02d}", parent=self)
+            if not text:
+                return
+            try:
+                base_year, base_month = map(int, text.strip().split("-"))
+            except ValueError:
+                raise ValueError("Формат периода: ГГГГ-ММ.")
+            self.config(cursor="watch")
+            self.update_idletasks()
+            try:
+                diff = period_diff(base_year, base_month, year, month, top=100,
+                                   summary=self.rep_cache.summary)
+            finally:
+                self.config(cursor="")
+        except Exception as e:
+            messagebox.showerror("Ошибка", str(e))
+            return
+        self.show_diff(diff, f"{base_year}-{base_month:02d}", f"{year}-{month:02d}")
+
+    def show_diff(self, diff, label_from, label_to):
+        win = tk.Toplevel(self)
+        win.title(f"Сравнение ведомостей: {label_from} -> {label_to}")
+        win.geometry("900x480")
+
+        changed = sum(1 for r in diff["rows"] if r[4] == "changed")
+        before, after, delta = diff["totals"]
+        ttk.Label(win, text=f"Новых: {len(diff['new'])} | Выбывших: {len(diff['gone'])} | "
+                            f"Изменилось: {changed} | К выдаче: {before[2]:.2f} -> {after[2]:.2f} "
+                            f"({delta[2]:+.2f})").pack(anchor="w", padx=10, pady=(8, 4))
+
+        bar = ttk.Frame(win)
+        bar.pack(fill="x", padx=10)
+        order = tk.StringVar(value="abs")
+        ttk.Radiobutton(bar, text="Новые и выбывшие", variable=order, value="moved",
+                        command=lambda: fill()).pack(side="left")
+        ttk.Radiobutton(bar, text="Наибольшие изменения", variable=order, value="abs",
+                        command=lambda: fill()).pack(side="left", padx=8)
+        ttk.Radiobutton(bar, text="Наибольшие изменения, %", variable=order, value="pct",
+                        command=lambda: fill()).pack(side="left")
+        ttk.Button(bar, text="Экспорт CSV...", command=lambda: self.run_export(
+            f"sravnenie_{label_from}_{label_to}.csv",
+            lambda path: write_csv(path, DIFF_HEADER, period_diff_rows(diff)))).pack(side="right")
+
+        cols = ("tab", "name", "pos", "status", "before", "after", "delta", "pct")
+        tree = ttk.Treeview(win, columns=cols, show="headings", height=16)
+        tree.pack(fill="both", expand=True, padx=10, pady=(4, 10))
+        for c, t, w in (("tab", "Таб. №", 80), ("name", "Ф.И.О.", 200), ("pos", "Должность", 130),
+                        ("status", "Статус", 90), ("before", "К выдаче было", 100),
+                        ("after", "К выдаче стало", 100), ("delta", "Разница", 90), ("pct", "%", 60)):
+            tree.heading(c, text=t)
+            tree.column(c, width=w)
+
+        net = DIFF_COLUMNS.index("net")
+
+        def fill():
+            tree.delete(*tree.get_children())
+            rows = {"moved": diff["new"] + diff["gone"], "abs": diff["by_abs"], "pct": diff["by_pct"]}[order.get()]
+            for row in rows:
+                _, tab, name, pos, status, prev, now, change = row
+                pct = diff_percent(row, net)
+                tree.insert("", "end", values=(
+                    tab, name, pos, DIFF_STATUS[status],
+                    "" if prev is None else f"{prev[net]:.2f}", "" if now is None else f"{now[net]:.2f}",
+                    f"{change[net]:+.2f}", "" if pct is None else f"{pct:+.2f}"))
+
+        fill()
+
+    # ---- what-if ----
+
+    def build_sim_tab(self):
+        top = ttk.Frame(self.tab_sim)
+        top.pack(fill="x", padx=10, pady=8)
+
+        now = date.today()
+        self.sim_year = tk.StringVar(value=str(now.year))
+        self.sim_month = tk.StringVar(value=str(now.month))
+        self.sim_tax = tk.StringVar()
+        self.sim_raise = tk.StringVar()
+        self.sim_extra = tk.StringVar()
+
+        ttk.Label(top, text="Год").grid(row=0, column=0, sticky="w")
+        ttk.Entry(top, textvariable=self.sim_year, width=6).grid(row=0, column=1, sticky="w", padx=6)
+        ttk.Label(top, text="Месяц").grid(row=0, column=2, sticky="w")
+        ttk.Entry(top, textvariable=self.sim_month, width=4).grid(row=0, column=3, sticky="w", padx=6)
+        ttk.Label(top, text="НДФЛ, % (пусто - по правилам)").grid(row=0, column=4, sticky="w")
+        ttk.Entry(top, textvariable=self.sim_tax, width=6).grid(row=0, column=5, sticky="w", padx=6)
+
+        ttk.Label(top, text="Индексация, % (должность=%; *=%)").grid(row=1, column=0, columnspan=4, sticky="w", pady=4)
+        ttk.Entry(top, textvariable=self.sim_raise, width=50).grid(row=1, column=4, columnspan=3, sticky="w", padx=6)
+        ttk.Label(top, text="Доп. надбавка (должность=сумма; *=сумма)").grid(row=2, column=0, columnspan=4, sticky="w")
+        ttk.Entry(top, textvariable=self.sim_extra, width=50).grid(row=2, column=4, columnspan=3, sticky="w", padx=6)
+
+        ttk.Button(top, text="Рассчитать", command=self.ui_simulate)\
+            .grid(row=0, column=6, padx=10)
+
+        cols = ("tab", "name", "pos", "gross", "sim_gross", "d_gross", "d_tax", "d_net")
+        self.sim_tree = ttk.Treeview(self.tab_sim, columns=cols, show="headings", height=16)
+        self.sim_tree.pack(fill="both", expand=True, padx=10, pady=(0, 10))
+
+        heads = [
+            ("tab", "Таб. №", 80),
+            ("name", "Ф.И.О.", 200),
+            ("pos", "Должность", 140),
+            ("gross", "Начисл.", 90),
+            ("sim_gross", "Начисл. (модель)", 110),
+            ("d_gross", "Δ Начисл.", 90),
+            ("d_tax", "Δ НДФЛ", 90),
+            ("d_net", "Δ К выдаче", 90),
+        ]
+        for c, t, w in heads:
+            self.sim_tree.heading(c, text=t)
+            self.sim_tree.column(c, width=w)
+
+        self.sim_total = ttk.Label(self.tab_sim, text="")
+        self.sim_total.pack(anchor="e", padx=12, pady=(0, 10))
+
+    def ui_simulate(self):
+        try:
+            year = int(self.sim_year.get().strip())
+            month = int(self.sim_month.get().strip())
             if not (1 <= month <= 12):
                 raise ValueError("Месяц 1..12.")
+            tax_text = self.sim_tax.get().strip().replace(",", ".")
+            tax_rate = float(tax_text) / 100 if tax_text else None
+            result = simulate_payroll(
+                year, month, tax_rate=tax_rate,
+                raise_by_position=parse_mapping(self.sim_raise.get()),
+                extra_allowance=parse_mapping(self.sim_extra.get()),
+            )
         except Exception as e:
             messagebox.showerror("Ошибка", str(e))
             return
 
-        for i in self.rep_tree.get_children():
-            self.rep_tree.delete(i)
-
-        rows = fetch_workers()
-        total_g = total_t = total_n = 0.0
-
-        for w in rows:
-            tab, name, pos, sick, base, add, gross, tax, net = calc_salary_row(w, year, month)
-            total_g += gross
-            total_t += tax
-            total_n += net
-
-            self.rep_tree.insert("", "end", values=(
-                tab, name, pos, sick,
-                f"{base:.2f}", f"{add:.2f}",
-                f"{gross:.2f}", f"{tax:.2f}", f"{net:.2f}"
+        for i in self.sim_tree.get_children():
+            self.sim_tree.delete(i)
+        for tab, name, pos, gross, sim_gross, d_gross, d_tax, d_net in result["lines"]:
+            self.sim_tree.insert("", "end", values=(
+                tab, name, pos, f"{gross:.2f}", f"{sim_gross:.2f}",
+                f"{d_gross:+.2f}", f"{d_tax:+.2f}", f"{d_net:+.2f}"
             ))
 
-        self.rep_total.config(
-            text=f"Итого: {total_g:.2f} | НДФЛ: {total_t:.2f} | К выдаче: {total_n:.2f}"
+        (rg, rt, rn), (sg, st, sn), (dg, dt, dn) = result["real"], result["simulated"], result["delta"]
+        self.sim_total.config(
+            text=f"Факт: {rg:.2f} / {rt:.2f} / {rn:.2f} | Модель: {sg:.2f} / {st:.2f} / {sn:.2f} | "
+                 f"Δ: {dg:+.2f} / {dt:+.2f} / {dn:+.2f}  (начисл. / НДФЛ / к выдаче)"
         )
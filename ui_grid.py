@@ -0,0 +1,124 @@
+import tkinter as tk
+from tkinter import ttk
+
+# Правка ячеек ttk.Treeview на месте: поле ввода кладётся поверх ячейки.
+# Enter и стрелки вверх/вниз - соседняя строка того же столбца, Tab/Shift+Tab - соседний
+# редактируемый столбец, Esc - отмена. validate(iid, столбец, текст) вызывается на каждое
+# изменение текста и возвращает текст ошибки или None; on_change(iid, столбец, текст) -
+# после того как значение ячейки изменилось.
+
+class CellEditor:
+    def __init__(self, tree, columns, validate, on_change, on_status=None):
+        self.tree = tree
+        self.columns = list(columns)
+        self.validate = validate
+        self.on_change = on_change
+        self.on_status = on_status or (lambda text: None)
+        self.entry = None
+        self.var = None
+        self.cell = None
+
+        ttk.Style(tree).configure("Invalid.TEntry", fieldbackground="#ffd6d6")
+        tree.bind("<Double-1>", self.on_double_click)
+        tree.bind("<Return>", self.on_key_edit)
+        tree.bind("<F2>", self.on_key_edit)
+
+    def column_at(self, x):
+        col = self.tree.identify_column(x)
+        if not col or col == "#0":
+            return None
+        display = self.tree["displaycolumns"]
+        if display in ("#all", ("#all",)):
+            display = self.tree["columns"]
+        return display[int(col[1:]) - 1]
+
+    def on_double_click(self, event):
+        iid = self.tree.identify_row(event.y)
+        column = self.column_at(event.x)
+        if iid and column in self.columns:
+            self.start(iid, column)
+
+    def on_key_edit(self, _event=None):
+        iid = self.tree.focus()
+        if iid:
+            self.start(iid, self.columns[0])
+        return "break"
+
+    def start(self, iid, column):
+        self.finish()
+        tree = self.tree
+        tree.see(iid)
+        tree.update_idletasks()
+        bbox = tree.bbox(iid, column)
+        if not bbox:
+            return
+        x, y, w, h = bbox
+        self.cell = (iid, column)
+        self.var = tk.StringVar(value=tree.set(iid, column))
+        entry = self.entry = ttk.Entry(tree, textvariable=self.var)
+        entry.place(x=x, y=y, width=w, height=h)
+        entry.focus_set()
+        entry.select_range(0, "end")
+
+        self.var.trace_add("write", lambda *_: self.check())
+        entry.bind("<Return>", lambda e: self.move(0, 1))
+        entry.bind("<Down>", lambda e: self.move(0, 1))
+        entry.bind("<Up>", lambda e: self.move(0, -1))
+        entry.bind("<Tab>", lambda e: self.move(1, 0))
+        entry.bind("<Shift-Tab>", lambda e: self.move(-1, 0))
+        entry.bind("<ISO_Left_Tab>", lambda e: self.move(-1, 0))
+        entry.bind("<Escape>", lambda e: self.cancel())
+        entry.bind("<FocusOut>", lambda e: self.finish())
+        self.check()
+
+    def check(self):
+        if self.entry is None:
+            return None
+        iid, column = self.cell
+        error = self.validate(iid, column, self.var.get())
+        self.entry.configure(style="Invalid.TEntry" if error else "TEntry")
+        self.on_status(error or "")
+        return error
+
+    def finish(self):
+        if self.entry is None:
+            return
+        iid, column = self.cell
+        text = self.var.get().strip()
+        entry, self.entry = self.entry, None
+        entry.destroy()
+        # строку могли удалить вместе с полем ввода (перезагрузка дерева) - править нечего
+        if not self.tree.exists(iid):
+            return
+        if text != self.tree.set(iid, column):
+            self.tree.set(iid, column, text)
+            self.on_change(iid, column, text)
+
+    def cancel(self):
+        if self.entry is not None:
+            entry, self.entry = self.entry, None
+            entry.destroy()
+            self.on_status("")
+        self.tree.focus_set()
+        return "break"
+
+    def move(self, dx, dy):
+        iid, column = self.cell
+        self.finish()
+        tree = self.tree
+        i = self.columns.index(column) + dx
+        if i >= len(self.columns):
+            i, dy = 0, 1
+        elif i < 0:
+            i, dy = len(self.columns) - 1, -1
+        if dy > 0:
+            iid = tree.next(iid)
+        elif dy < 0:
+            iid = tree.prev(iid)
+        if iid:
+            tree.selection_set(iid)
+            tree.focus(iid)
+            self.start(iid, self.columns[i])
+        else:
+            tree.focus_set()
+        return "break"
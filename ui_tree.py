@@ -0,0 +1,56 @@
+# Согласование содержимого ttk.Treeview с новым набором строк по первичному ключу:
+# удаляются, вставляются, обновляются и переставляются только изменившиеся строки,
+# поэтому выделение и прокрутка сохраняются, а число вызовов Tk пропорционально изменениям.
+
+class TreeSync:
+    # key - индекс ключевого столбца в values или функция values -> iid;
+    # item_options - доп. параметры tree.insert (например, open=True для групп)
+    def __init__(self, tree, key=0, parent="", **item_options):
+        self.tree = tree
+        self.key = key if callable(key) else (lambda values, i=key: values[i])
+        self.parent = parent
+        self.item_options = item_options
+        self.rows = {}    # iid -> values, как они сейчас отображаются
+        self.order = []   # iid в порядке отображения
+
+    def update(self, rows):
+        tree = self.tree
+        new_rows = {}
+        new_order = []
+        for values in rows:
+            values = tuple(values)
+            iid = str(self.key(values))
+            new_rows[iid] = values
+            new_order.append(iid)
+
+        gone = [iid for iid in self.order if iid not in new_rows]
+        if gone:
+            tree.delete(*gone)
+            gone = set(gone)
+            current = [iid for iid in self.order if iid not in gone]
+        else:
+            current = list(self.order)
+
+        for index, iid in enumerate(new_order):
+            values = new_rows[iid]
+            old = self.rows.get(iid)
+            if old is None:
+                tree.insert(self.parent, index, iid=iid, values=values, **self.item_options)
+                current.insert(index, iid)
+                continue
+            if old != values:
+                tree.item(iid, values=values)
+            if current[index] != iid:
+                tree.move(iid, self.parent, index)
+                current.remove(iid)
+                current.insert(index, iid)
+
+        self.rows = new_rows
+        self.order = new_order
+        return len(new_order)
+
+    def clear(self):
+        if self.order:
+            self.tree.delete(*self.order)
+        self.rows = {}
+        self.order = []
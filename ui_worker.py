@@ -2,7 +2,13 @@ import tkinter as tk
 from tkinter import ttk, messagebox
 
 from auth import auth_worker
-from payroll import fetch_worker, create_personal_request
+from payroll import (
+    fetch_worker, create_personal_request,
+    fetch_worker_pay_history, fetch_worker_requests
+)
+
+HISTORY_MONTHS = 24
+STATUS_TEXT = {"PENDING": "На рассмотрении", "APPROVED": "Одобрен", "REJECTED": "Отклонён"}
 
 class WorkerLogin(tk.Tk):
     def __init__(self):
@@ -45,10 +51,18 @@ class WorkerApp(tk.Tk):
         self.worker_id = worker_id
         w = fetch_worker(worker_id)
         self.title(f"Работник: {w[2]}")
-        self.geometry("720x420")
+        self.geometry("820x520")
+
+        nb = ttk.Notebook(self)
+        nb.pack(fill="both", expand=True, padx=8, pady=8)
 
-        frm = ttk.Frame(self, padding=12)
-        frm.pack(fill="both", expand=True)
+        frm = ttk.Frame(nb, padding=12)
+        self.tab_pay = ttk.Frame(nb)
+        self.tab_requests = ttk.Frame(nb)
+
+        nb.add(frm, text="Мои данные")
+        nb.add(self.tab_pay, text="История выплат")
+        nb.add(self.tab_requests, text="Мои запросы")
 
         info = ttk.LabelFrame(frm, text="Мои данные", padding=10)
         info.pack(fill="x")
@@ -81,6 +95,71 @@ class WorkerApp(tk.Tk):
         ttk.Button(req, text="Отправить запрос", command=self.ui_send_request)\
             .grid(row=0, column=4, padx=6)
 
+        self.build_pay_tab()
+        self.build_requests_tab()
+        self.refresh_pay_history()
+        self.refresh_requests()
+
+    def build_pay_tab(self):
+        ttk.Label(self.tab_pay, text=f"Закрытые периоды (последние {HISTORY_MONTHS} мес.)")\
+            .pack(anchor="w", padx=10, pady=(8, 4))
+
+        cols = ("period", "sick", "base", "add", "gross", "tax", "net")
+        self.pay_tree = ttk.Treeview(self.tab_pay, columns=cols, show="headings", height=16)
+        self.pay_tree.pack(fill="both", expand=True, padx=10, pady=(0, 10))
+
+        heads = [
+            ("period", "Период", 90),
+            ("sick", "Бол.", 50),
+            ("base", "База", 100),
+            ("add", "Надб.", 100),
+            ("gross", "Начисл.", 100),
+            ("tax", "НДФЛ", 100),
+            ("net", "К выдаче", 110),
+        ]
+        for c, t, w in heads:
+            self.pay_tree.heading(c, text=t)
+            self.pay_tree.column(c, width=w)
+
+    def refresh_pay_history(self):
+        for i in self.pay_tree.get_children():
+            self.pay_tree.delete(i)
+        for year, month, sick, base, add, gross, tax, net in fetch_worker_pay_history(self.worker_id, HISTORY_MONTHS):
+            self.pay_tree.insert("", "end", values=(
+                f"{month:02d}.{year}", sick,
+                f"{base:.2f}", f"{add:.2f}", f"{gross:.2f}", f"{tax:.2f}", f"{net:.2f}"
+            ))
+
+    def build_requests_tab(self):
+        bar = ttk.Frame(self.tab_requests)
+        bar.pack(fill="x", padx=10, pady=8)
+        ttk.Button(bar, text="Обновить", command=self.refresh_requests).pack(side="left")
+
+        cols = ("date", "field", "value", "status", "processed")
+        self.req_tree = ttk.Treeview(self.tab_requests, columns=cols, show="headings", height=16)
+        self.req_tree.pack(fill="both", expand=True, padx=10, pady=(0, 10))
+
+        heads = [
+            ("date", "Дата запроса", 150),
+            ("field", "Поле", 140),
+            ("value", "Новое значение", 200),
+            ("status", "Статус", 120),
+            ("processed", "Обработан", 150),
+        ]
+        for c, t, w in heads:
+            self.req_tree.heading(c, text=t)
+            self.req_tree.column(c, width=w)
+
+    def refresh_requests(self):
+        field_names = {v: k for k, v in self.field_reverse.items()}
+        for i in self.req_tree.get_children():
+            self.req_tree.delete(i)
+        for _, field, value, req_date, status, processed_at in fetch_worker_requests(self.worker_id):
+            self.req_tree.insert("", "end", values=(
+                req_date, field_names.get(field, field), value,
+                STATUS_TEXT.get(status, status), processed_at or ""
+            ))
+
     def worker_info_text(self):
         w = fetch_worker(self.worker_id)
         if not w:
@@ -109,6 +188,7 @@ class WorkerApp(tk.Tk):
 
             create_personal_request(self.worker_id, field_name, new_val)
             self.v_value.set("")
+            self.refresh_requests()
             messagebox.showinfo("Готово", "Запрос отправлен бухгалтеру.")
         except Exception as e:
             messagebox.showerror("Ошибка", str(e))
@@ -0,0 +1,108 @@
+import sys
+from array import array
+
+# Колоночное представление списка работников: числовые столбцы в array,
+# повторяющиеся строки (должность, семейное положение) интернированы.
+# Строка - лёгкое представление WorkerRow без копирования данных; поддерживает
+# и именованный доступ (row.salary), и позиционный (row[4], распаковку) для старого кода.
+
+COLUMNS = ("id", "tab_number", "full_name", "position", "salary", "marital_status", "children_count")
+
+class WorkerRow:
+    __slots__ = ("_table", "_i")
+
+    def __init__(self, table, i):
+        self._table = table
+        self._i = i
+
+    id = property(lambda self: self._table.ids[self._i])
+    tab_number = property(lambda self: self._table.tab_numbers[self._i])
+    full_name = property(lambda self: self._table.full_names[self._i])
+    position = property(lambda self: self._table.positions[self._i])
+    salary = property(lambda self: self._table.salaries[self._i])
+    marital_status = property(lambda self: self._table.marital_statuses[self._i])
+    children_count = property(lambda self: self._table.children_counts[self._i])
+
+    def __getitem__(self, k):
+        if isinstance(k, slice):
+            i = self._i
+            return tuple(col[i] for col in self._table.columns[k])
+        return self._table.columns[k][self._i]
+
+    def __len__(self):
+        return len(COLUMNS)
+
+    def __iter__(self):
+        i = self._i
+        return (col[i] for col in self._table.columns)
+
+    def as_tuple(self):
+        return tuple(self)
+
+    def __repr__(self):
+        return f"WorkerRow{self.as_tuple()!r}"
+
+
+class WorkerTable:
+    __slots__ = ("ids", "tab_numbers", "full_names", "positions", "salaries",
+                 "marital_statuses", "children_counts", "columns", "_index")
+
+    def __init__(self, ids, tab_numbers, full_names, positions, salaries, marital_statuses, children_counts):
+        self.ids = ids
+        self.tab_numbers = tab_numbers
+        self.full_names = full_names
+        self.positions = positions
+        self.salaries = salaries
+        self.marital_statuses = marital_statuses
+        self.children_counts = children_counts
+        # кортеж столбцов собирается один раз: по нему идёт позиционный доступ строк
+        self.columns = (ids, tab_numbers, full_names, positions, salaries, marital_statuses, children_counts)
+        self._index = None
+
+    @classmethod
+    def from_rows(cls, rows):
+        intern = sys.intern
+        ids, children = array("q"), array("q")
+        salaries = array("d")
+        tabs, names, positions, maritals = [], [], [], []
+        for wid, tab, name, pos, salary, marital, ch in rows:
+            ids.append(wid)
+            tabs.append(tab)
+            names.append(name)
+            positions.append(intern(pos))
+            salaries.append(salary)
+            maritals.append(intern(marital))
+            children.append(ch)
+        return cls(ids, tabs, names, positions, salaries, maritals, children)
+
+    def replace(self, **columns):
+        # копия таблицы с заменёнными столбцами; остальные столбцы общие
+        current = dict(zip(COLUMNS, self.columns))
+        for name, col in columns.items():
+            if name not in current:
+                raise KeyError(name)
+            current[name] = col
+        return WorkerTable(*(current[c] for c in COLUMNS))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self.ids)
+        if not 0 <= i < len(self.ids):
+            raise IndexError(i)
+        return WorkerRow(self, i)
+
+    def __iter__(self):
+        for i in range(len(self.ids)):
+            yield WorkerRow(self, i)
+
+    def index_of(self, worker_id):
+        if self._index is None:
+            self._index = {wid: i for i, wid in enumerate(self.ids)}
+        return self._index.get(worker_id)
+
+    def by_id(self, worker_id):
+        i = self.index_of(worker_id)
+        return None if i is None else WorkerRow(self, i)